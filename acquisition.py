@@ -0,0 +1,55 @@
+import queue
+import threading
+
+POLL_INTERVAL_MS = 50  # How often the Tk thread checks for finished jobs
+
+
+class AcquisitionWorker:
+    """Run serial and database jobs on a background thread so the Tk window never freezes.
+
+    Jobs are queued with submit() and executed one at a time, in the order they were
+    queued. Their results are handed back to the Tk thread by polling the result
+    queue with root.after, so the on_done/on_error callbacks may update widgets.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.commands = queue.Queue()
+        self.results = queue.Queue()
+        self.pending = 0  # Jobs queued or running; only touched on the Tk thread
+        self.thread = threading.Thread(target=self._run, name="acquisition-worker", daemon=True)
+        self.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, job, *args, on_done=None, on_error=None):
+        """Queue job(*args) on the worker thread; must be called from the Tk thread."""
+        self.pending += 1
+        self.commands.put((job, args, on_done, on_error))
+
+    def stop(self):
+        """Let the worker finish the jobs already queued and then exit."""
+        self.commands.put(None)
+
+    def _run(self):
+        while True:
+            item = self.commands.get()
+            if item is None:
+                return
+            job, args, on_done, on_error = item
+            try:
+                self.results.put((on_done, job(*args), None))
+            except Exception as e:
+                self.results.put((on_error, None, e))
+
+    def _poll(self):
+        try:
+            while True:
+                callback, result, error = self.results.get_nowait()
+                self.pending -= 1
+                if callback is not None:
+                    callback(error if error is not None else result)
+                elif error is not None:
+                    print(f"Background job failed: {error}")
+        except queue.Empty:
+            pass
+        self.root.after(POLL_INTERVAL_MS, self._poll)
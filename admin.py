@@ -2,34 +2,28 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 import sqlite3  # Use SQLite instead of pyodbc
 import os
-import sys  # Ensure sys is imported
-
-# Update database path to handle PyInstaller's temporary directory
-if getattr(sys, 'frozen', False):  # Check if running as a PyInstaller bundle
-    BASE_DIR = sys._MEIPASS  # Temporary directory created by PyInstaller
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-DB_PATH = os.path.join(BASE_DIR, "login.db")
+from db import get_connection, transaction
+from migrations import migrate
 
 try:
-    import serial.tools.list_ports  # Import for COM port detection
+    from port_registry import get_registry  # Needs pyserial for COM port detection
 except ModuleNotFoundError:
     messagebox.showerror("Module Error", "The 'pyserial' module is not installed. Please install it using 'pip install pyserial'.")
     exit()
 
-# DB config
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "login.db")
 
 def connect_db():
+    """Return the screen's long-lived database connection."""
     try:
-        con = sqlite3.connect(DB_PATH)
-        return con
+        return get_connection()
     except Exception as e:
         messagebox.showerror("Database Error", f"Connection failed: {e}")
         return None
 
+get_registry()  # Start enumerating COM ports in the background
+migrate()  # Bring the schema up to date if this screen was started without the login window
+
 # ---------- GUI ----------
 root = tk.Tk()
 root.title("Admin Dashboard - User Management")
@@ -160,7 +154,6 @@ def refresh_users():
         for idx, row in enumerate(cursor.fetchall()):
             tag = "evenrow" if idx % 2 == 0 else "oddrow"
             tree.insert("", "end", values=row, tags=(tag,))
-        con.close()
     # Only background is supported here
     tree.tag_configure("evenrow", background="#F3F6FA")
     tree.tag_configure("oddrow", background=WHITE)
@@ -175,19 +168,17 @@ def create_user():
         messagebox.showerror("Error", "All fields are required.")
         return
 
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        try:
-            cursor.execute("INSERT INTO users (username, password, name, employee_type) VALUES (?, ?, ?, ?)", 
-                           (uname, pwd, fname, role))
-            con.commit()
-            refresh_users()
-            clear_form()
-            messagebox.showinfo("Success", "User created successfully!")
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "Username already exists.")
-        con.close()
+    try:
+        with transaction() as con:
+            con.execute("INSERT INTO users (username, password, name, employee_type) VALUES (?, ?, ?, ?)",
+                        (uname, pwd, fname, role))
+        refresh_users()
+        clear_form()
+        messagebox.showinfo("Success", "User created successfully!")
+    except sqlite3.IntegrityError:
+        messagebox.showerror("Error", "Username already exists.")
+    except sqlite3.Error as e:
+        messagebox.showerror("Database Error", f"Error creating user: {e}")
 
 def edit_user():
     selected = tree.focus()
@@ -219,13 +210,13 @@ def save_user():
         messagebox.showerror("Error", "All fields are required.")
         return
 
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("UPDATE users SET username=?, password=?, name=?, employee_type=? WHERE id=?",
-                       (uname, pwd, fname, role, uid))
-        con.commit()
-        con.close()
+    try:
+        with transaction() as con:
+            con.execute("UPDATE users SET username=?, password=?, name=?, employee_type=? WHERE id=?",
+                        (uname, pwd, fname, role, uid))
+    except sqlite3.Error as e:
+        messagebox.showerror("Database Error", f"Error updating user: {e}")
+    else:
         refresh_users()
         clear_form()
         messagebox.showinfo("Success", "User updated successfully!")
@@ -242,12 +233,12 @@ def delete_user():
 
     confirm = messagebox.askyesno("Confirm", f"Are you sure you want to delete user ID {uid}?")
     if confirm:
-        con = connect_db()
-        if con:
-            cursor = con.cursor()
-            cursor.execute("DELETE FROM users WHERE id=?", (uid,))
-            con.commit()
-            con.close()
+        try:
+            with transaction() as con:
+                con.execute("DELETE FROM users WHERE id=?", (uid,))
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error deleting user: {e}")
+        else:
             refresh_users()
             clear_form()
             messagebox.showinfo("Deleted", "User deleted successfully!")
@@ -325,7 +316,6 @@ def refresh_users():
         for idx, row in enumerate(cursor.fetchall()):
             tag = "evenrow" if idx % 2 == 0 else "oddrow"
             tree.insert("", "end", values=row, tags=(tag,))
-        con.close()
     # Only background is supported here
     tree.tag_configure("evenrow", background="#F3F6FA")
     tree.tag_configure("oddrow", background=WHITE)
@@ -350,7 +340,7 @@ def open_baud_com_popup():
     """Open a popup window for Baud Rate and COM Port settings."""
     popup = tk.Toplevel(root)
     popup.title("Baud Rate and COM Port Settings")
-    popup.geometry("300x200")
+    popup.geometry("480x200")
     popup.config(bg=WHITE)
 
     tk.Label(popup, text="Enter Baud Rate:", bg=WHITE, fg=BLUE1, font=("Arial", 10)).grid(row=0, column=0, sticky="e", pady=10, padx=10)
@@ -360,16 +350,16 @@ def open_baud_com_popup():
 
     tk.Label(popup, text="Select COM Port:", bg=WHITE, fg=BLUE1, font=("Arial", 10)).grid(row=1, column=0, sticky="e", pady=10, padx=10)
     com_port_var = tk.StringVar(value="Select COM Port")
-    com_port_dropdown = ttk.Combobox(popup, textvariable=com_port_var, state="readonly", width=18)
+    com_port_dropdown = ttk.Combobox(popup, textvariable=com_port_var, state="readonly", width=40)
     com_port_dropdown.grid(row=1, column=1, padx=10)
     refresh_com_ports_dropdown(com_port_dropdown, com_port_var)
 
     tk.Button(popup, text="Save", bg=BLUE2, fg=WHITE, width=12, 
-              command=lambda: messagebox.showinfo("Info", f"Baud Rate: {baud_rate_var.get()}, COM Port: {com_port_var.get()}")).grid(row=2, column=0, columnspan=2, pady=20)
+              command=lambda: messagebox.showinfo("Info", f"Baud Rate: {baud_rate_var.get()}, COM Port: {get_registry().device_for(com_port_var.get())}")).grid(row=2, column=0, columnspan=2, pady=20)
 
 def refresh_com_ports_dropdown(dropdown, var):
-    """Refresh the COM port dropdown values dynamically."""
-    com_ports = [port.device for port in serial.tools.list_ports.comports()]
+    """Fill the COM port dropdown from the port registry cache (enumerated in the background)."""
+    com_ports = get_registry().labels()
     dropdown["values"] = com_ports
     if com_ports:
         var.set(com_ports[0])  # Set the first COM port as default
@@ -0,0 +1,248 @@
+"""Monthly archive databases for old measurements.
+
+Units older than a cutoff move out of login.db into archive/measurements_YYYY_MM.db,
+one file per month, with the same units/measurements tables. The operator screen,
+the dropdowns and the Main Database listing only ever read the live database;
+reports attach just the months their date range covers, one at a time.
+
+    python archive.py --keep-months 12       # archive everything before the last 12 months
+    python archive.py --before 2025-01-01    # archive everything dated before a day
+    python archive.py --list                 # show the archive files and their unit counts
+"""
+import argparse
+import datetime
+import glob
+import os
+import re
+import sys
+
+from db import DB_PATH, get_connection, transaction
+from migrations import MEASURED_AT_SQL, migrate
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(DB_PATH), "archive")
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_FILE = re.compile(r"measurements_(\d{4})_(\d{2})\.db$")
+# Copied by name, since older archive files gained measuredAt after their other columns. unitId is
+# not copied: the live ids start again at 1 once a month has moved out, so each file numbers its own
+UNIT_COLUMNS = "orderId, componentSerialNumber, componentName, partNumber, operatorName, date, time, isValid, measuredAt"
+
+
+def archive_dir(conn):
+    """The archive directory beside the connection's database file (ARCHIVE_DIR for login.db)."""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]  # (seq, name, file) of main
+    return os.path.join(os.path.dirname(path), "archive") if path else ARCHIVE_DIR
+
+
+def archive_path(month, directory=ARCHIVE_DIR):
+    """Archive file for a "YYYY-MM" month."""
+    return os.path.join(directory, f"measurements_{month.replace('-', '_')}.db")
+
+
+def archive_months(directory=ARCHIVE_DIR):
+    """Months that have an archive file, oldest first."""
+    months = []
+    for path in glob.glob(os.path.join(directory, "measurements_*.db")):
+        match = ARCHIVE_FILE.search(path)
+        if match:
+            months.append(f"{match.group(1)}-{match.group(2)}")
+    return sorted(months)
+
+
+def months_for_range(start_date="", end_date="", directory=ARCHIVE_DIR):
+    """Archived months that can hold units dated between start_date and end_date (empty = open)."""
+    return [
+        month for month in archive_months(directory)
+        if (not start_date or month >= start_date[:7]) and (not end_date or month <= end_date[:7])
+    ]
+
+
+def next_month(month):
+    year, number = map(int, month.split("-"))
+    return f"{year + number // 12}-{number % 12 + 1:02d}"
+
+
+def attach(conn, month):
+    """Attach a month's archive file (see archive_dir) as the "archive" schema, creating its tables if needed."""
+    directory = archive_dir(conn)
+    os.makedirs(directory, exist_ok=True)
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path(month, directory),))
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.units (
+            unitId INTEGER PRIMARY KEY,
+            orderId TEXT NOT NULL,
+            componentSerialNumber INTEGER NOT NULL,
+            componentName TEXT NOT NULL,
+            partNumber TEXT NOT NULL,
+            operatorName TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            isValid TEXT NOT NULL,
+            measuredAt INTEGER,
+            UNIQUE (orderId, componentSerialNumber)
+        )
+    """)
+    # Files archived before units.measuredAt existed
+    if "measuredAt" not in [row[1] for row in conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info(units)")]:
+        conn.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.units ADD COLUMN measuredAt INTEGER")
+        conn.execute(f"UPDATE {ARCHIVE_SCHEMA}.units SET measuredAt = {MEASURED_AT_SQL}")
+        conn.execute(f"DROP INDEX IF EXISTS {ARCHIVE_SCHEMA}.idx_units_date")
+        conn.execute(f"DROP INDEX IF EXISTS {ARCHIVE_SCHEMA}.idx_units_operator")
+        conn.execute(f"DROP INDEX IF EXISTS {ARCHIVE_SCHEMA}.idx_units_part")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.measurements (
+            unitId INTEGER NOT NULL REFERENCES units (unitId),
+            parameterName TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (unitId, parameterName)
+        ) WITHOUT ROWID
+    """)
+    # The report filters, as on the live units table
+    conn.execute(f"DROP INDEX IF EXISTS {ARCHIVE_SCHEMA}.idx_units_measured_at")  # Replaced as on the live table
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_units_report_order ON units (measuredAt)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_units_operator_time ON units (operatorName, measuredAt)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_units_part_time ON units (partNumber, measuredAt)")
+
+
+def detach(conn):
+    conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+def archive_before(cutoff, conn=None):
+    """Move every unit dated before cutoff ("YYYY-MM-DD") into its month's archive; returns {month: units}.
+
+    Each month is copied and deleted in one transaction. With WAL that commit is atomic
+    per file rather than across both, so the copy uses INSERT OR IGNORE on (orderId,
+    componentSerialNumber): if the job is interrupted, running it again finishes the
+    move without duplicating anything. Before deleting, every live reading is checked
+    against the archive; if any is missing the month is rolled back and RuntimeError
+    raised. Serial numbers keep coming from unitSequence, which stays in login.db.
+    """
+    conn = conn or get_connection()
+    months = [row[0] for row in conn.execute(
+        "SELECT DISTINCT substr(date, 1, 7) FROM units WHERE date < ? ORDER BY 1", (cutoff,)
+    )]
+    moved = {}
+    for month in months:
+        start, end = f"{month}-01", min(f"{next_month(month)}-01", cutoff)
+        attach(conn, month)
+        try:
+            with transaction(immediate=True, conn=conn):
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.units ({UNIT_COLUMNS})
+                    SELECT {UNIT_COLUMNS} FROM main.units WHERE date >= ? AND date < ?
+                """, (start, end))
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.measurements (unitId, parameterName, value)
+                    SELECT a.unitId, m.parameterName, m.value
+                    FROM main.units u
+                    JOIN main.measurements m ON m.unitId = u.unitId
+                    JOIN {ARCHIVE_SCHEMA}.units a ON a.orderId = u.orderId AND a.componentSerialNumber = u.componentSerialNumber
+                    WHERE u.date >= ? AND u.date < ?
+                """, (start, end))
+                missing = conn.execute(f"""
+                    SELECT COUNT(*) FROM main.units u
+                    LEFT JOIN main.measurements m ON m.unitId = u.unitId
+                    WHERE u.date >= ? AND u.date < ? AND NOT EXISTS (
+                        SELECT 1 FROM {ARCHIVE_SCHEMA}.units a
+                        LEFT JOIN {ARCHIVE_SCHEMA}.measurements am ON am.unitId = a.unitId AND am.parameterName = m.parameterName
+                        WHERE a.orderId = u.orderId AND a.componentSerialNumber = u.componentSerialNumber
+                          AND (m.parameterName IS NULL OR am.value IS m.value)
+                    )
+                """, (start, end)).fetchone()[0]
+                if missing:
+                    raise RuntimeError(
+                        f"{missing} readings from {month} did not match {archive_path(month, archive_dir(conn))}; nothing was moved."
+                    )
+                conn.execute("""
+                    DELETE FROM main.measurements
+                    WHERE unitId IN (SELECT unitId FROM main.units WHERE date >= ? AND date < ?)
+                """, (start, end))
+                moved[month] = conn.execute(
+                    "DELETE FROM main.units WHERE date >= ? AND date < ?", (start, end)
+                ).rowcount
+        finally:
+            detach(conn)
+    return moved
+
+
+def iter_report(build, start_date="", end_date="", conn=None, chunk_rows=None):
+    """Yield a report's rows in lists of up to chunk_rows (all at once if None), archive months first.
+
+    build(schema) returns the (sql, params) for one schema, e.g. pivot_query(..., schema=schema).
+    Archive months are disjoint and all older than the live rows, so concatenating the
+    per-source results keeps the date order. Months are attached one at a time, which
+    also keeps long ranges under SQLite's limit on attached databases.
+    """
+    conn = conn or get_connection()
+    for month in months_for_range(start_date, end_date, archive_dir(conn)):
+        attach(conn, month)
+        try:
+            yield from _fetch(conn, build(ARCHIVE_SCHEMA), chunk_rows)
+        finally:
+            detach(conn)
+    yield from _fetch(conn, build("main"), chunk_rows)
+
+
+def _fetch(conn, query, chunk_rows):
+    cursor = conn.execute(*query)
+    try:
+        if chunk_rows is None:
+            yield cursor.fetchall()
+            return
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()  # An open statement would keep the archive from detaching
+
+
+def report_rows(build, start_date="", end_date="", conn=None):
+    """Run a report over the archived months in its date range and then the live database."""
+    return [row for rows in iter_report(build, start_date, end_date, conn) for row in rows]
+
+
+def months_ago(months, today=None):
+    """First day of the month that is months before today's, as "YYYY-MM-DD"."""
+    today = today or datetime.date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return f"{index // 12}-{index % 12 + 1:02d}-01"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old measurements out of login.db into monthly archive files")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--before", metavar="YYYY-MM-DD", help="archive units dated before this day")
+    group.add_argument("--keep-months", type=int, metavar="N", help="keep the current month and the N before it live")
+    group.add_argument("--list", action="store_true", help="list the archive files")
+    parser.add_argument("--vacuum", action="store_true", help="shrink login.db afterwards (blocks the other screens while it runs)")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    migrate(conn)
+    directory = archive_dir(conn)
+    if args.list:
+        for month in archive_months(directory):
+            attach(conn, month)
+            try:
+                count = conn.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.units").fetchone()[0]
+            finally:
+                detach(conn)
+            print(f"{month}: {count} units  {archive_path(month, directory)}")
+        return
+
+    cutoff = args.before or months_ago(args.keep_months)
+    try:
+        moved = archive_before(cutoff, conn)
+    except RuntimeError as e:
+        sys.exit(f"Archiving stopped: {e}")
+    for month, count in moved.items():
+        print(f"{month}: archived {count} units to {archive_path(month, directory)}")
+    print(f"Archived {sum(moved.values())} units dated before {cutoff}.")
+    if args.vacuum and moved:
+        conn.execute("VACUUM")
+
+
+if __name__ == "__main__":
+    main()
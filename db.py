@@ -0,0 +1,76 @@
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+# Keep the database next to the executable when frozen (copied out of the bundle on first
+# run, since PyInstaller's temporary directory is read-only and wiped on exit)
+if getattr(sys, 'frozen', False):
+    DB_PATH = os.path.join(os.path.dirname(sys.executable), "login.db")
+    if not os.path.exists(DB_PATH):
+        shutil.copy(os.path.join(sys._MEIPASS, "login.db"), DB_PATH)
+else:
+    DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "login.db")
+
+BUSY_TIMEOUT_MS = 10000  # How long a writer waits for another screen's write before "database is locked"
+CACHE_SIZE_KB = 32768  # Page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024  # Let reads come straight from the OS page cache
+STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+
+_local = threading.local()
+
+
+def connect(path=DB_PATH, check_same_thread=True):
+    """Open a new tuned connection in autocommit mode; writes go through transaction().
+
+    WAL lets an operator submit while a supervisor report is reading, and
+    busy_timeout makes concurrent writers wait for each other instead of failing.
+    """
+    conn = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=check_same_thread
+    )
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+def get_connection():
+    """Return this thread's long-lived connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+@contextmanager
+def transaction(immediate=False, conn=None):
+    """Run the block in one transaction on this thread's connection (or conn); rolls back if it raises.
+
+    immediate=True takes the write lock up front (BEGIN IMMEDIATE), so a
+    read-then-write block cannot be overtaken by another writer. A transaction
+    opened inside another joins the outer one.
+    """
+    conn = conn or get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def close_connection():
+    """Close this thread's connection (e.g. when a worker thread or the screen exits)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
@@ -0,0 +1,149 @@
+"""Typed Parquet / Arrow IPC export of measurements for analysis in pandas.
+
+Rows are streamed from SQLite in chunks straight into the file, with dates as
+date32, times as time32, measuredAt as a UTC timestamp, serial numbers as int64
+and measured values as float64, instead of going through the Treeview and an
+xlsx. pyarrow is only needed here.
+
+    python export.py measurements.parquet                          # everything, live and archived
+    python export.py june.arrow --start 2025-06-01 --end 2025-06-30 --part P1
+"""
+import argparse
+import os
+
+from archive import iter_report
+from db import DB_PATH, connect
+from measurements import LONG_FORMAT_ORDER, UNIT_COLUMNS, pivot_query, unit_filters
+
+CHUNK_ROWS = 65536  # Rows fetched from SQLite and written per record batch
+PARQUET_COMPRESSION = "zstd"
+
+# Long format with the unit identity, one row per measured parameter
+EXPORT_COLUMNS = [
+    "orderId", "componentSerialNumber", "componentName", "partNumber", "operatorName",
+    "date", "time", "measuredAt", "isValid", "parameterName", "value",
+]
+EXPORT_TEMPLATE = """
+    SELECT u.orderId, u.componentSerialNumber, u.componentName, u.partNumber, u.operatorName,
+           u.date, u.time, u.measuredAt, u.isValid, m.parameterName, m.value
+    FROM {schema}.units u
+    JOIN {schema}.measurements m ON m.unitId = u.unitId
+"""
+
+FILE_TYPES = [("Parquet files", "*.parquet"), ("Arrow IPC files", "*.arrow"), ("All files", "*")]
+
+
+def arrow_schema(columns, numeric=("value",)):
+    """Arrow schema for the named columns; names in numeric are measured values (float64)."""
+    import pyarrow as pa
+
+    types = {
+        "date": pa.date32(), "time": pa.time32("s"), "measuredAt": pa.timestamp("s", tz="UTC"),
+        "componentSerialNumber": pa.int64(),
+    }
+    return pa.schema([
+        (column, pa.float64() if column in numeric else types.get(column, pa.string()))
+        for column in columns
+    ])
+
+
+def _column(values, type_):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if type_ == pa.date32():
+        # Unparseable dates become nulls rather than failing the whole export
+        parsed = pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d", unit="s", error_is_null=True)
+        return parsed.cast(pa.date32())
+    if type_ == pa.time32("s"):
+        stamped = pc.binary_join_element_wise("1970-01-01 ", pa.array(values, pa.string()), "")
+        return pc.strptime(stamped, format="%Y-%m-%d %H:%M:%S", unit="s", error_is_null=True).cast(type_)
+    if type_ == pa.string():
+        try:
+            return pa.array(values, pa.string())
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # orderId and friends are TEXT columns, but older rows may hold integers
+            return pa.array([None if value is None else str(value) for value in values], pa.string())
+    return pa.array(values, type_)
+
+
+def open_writer(path, schema, parquet):
+    """Parquet writer, or an Arrow IPC file writer if parquet is false."""
+    import pyarrow as pa
+
+    if parquet:
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+    return pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=PARQUET_COMPRESSION))
+
+
+def export_report(path, build, columns, numeric=("value",), start_date="", end_date="", conn=None,
+                  progress=None, cancel=None):
+    """Stream a report (see archive.iter_report) into path and return the number of rows written.
+
+    The file is written next to path and renamed into place at the end, so a failed
+    or cancelled export never leaves a truncated file behind. progress(count) is
+    called after every chunk and cancel (a threading.Event) checked as often,
+    raising xlsx_export.ExportCancelled. Raises ImportError without pyarrow.
+    """
+    import pyarrow as pa
+
+    schema = arrow_schema(columns, numeric)
+    partial = path + ".partial"
+    written = 0
+    # .parquet paths get Parquet, anything else (.arrow, .feather) Arrow IPC
+    writer = open_writer(partial, schema, path.lower().endswith(".parquet"))
+    try:
+        for rows in iter_report(build, start_date, end_date, conn, CHUNK_ROWS):
+            arrays = [_column(list(values), field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            written += len(rows)
+            if cancel is not None and cancel.is_set():
+                from xlsx_export import ExportCancelled
+                raise ExportCancelled()
+            if progress is not None:
+                progress(written)
+    except BaseException:
+        writer.close()
+        os.remove(partial)
+        raise
+    writer.close()
+    os.replace(partial, path)
+    return written
+
+
+def export_measurements(path, start_date="", end_date="", operator="", part_number="", conn=None,
+                        progress=None, cancel=None):
+    """Export the long-format measurements matching the report filters; returns the row count."""
+    where, params = unit_filters(start_date, end_date, operator, part_number)
+    return export_report(
+        path, lambda schema: (EXPORT_TEMPLATE.format(schema=schema) + where + LONG_FORMAT_ORDER, params),
+        EXPORT_COLUMNS, start_date=start_date, end_date=end_date, conn=conn, progress=progress, cancel=cancel
+    )
+
+
+def export_pivot(path, columns, where, params, start_date="", end_date="", conn=None, progress=None, cancel=None):
+    """Export a one-row-per-unit report (measurements.pivot_query) with parameter columns as float64."""
+    numeric = [column for column in columns if column not in UNIT_COLUMNS and column != "value"]
+    return export_report(
+        path, lambda schema: pivot_query(columns, where, params, schema),
+        columns, numeric, start_date, end_date, conn, progress, cancel
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export measurements to Parquet or Arrow IPC")
+    parser.add_argument("path", help="output file; .parquet for Parquet, anything else (.arrow) for Arrow IPC")
+    parser.add_argument("--start", default="", metavar="YYYY-MM-DD[ HH:MM]", help="first date (or local date and time) to include")
+    parser.add_argument("--end", default="", metavar="YYYY-MM-DD[ HH:MM]", help="last date (or local date and time) to include")
+    parser.add_argument("--operator", default="", help="only this operator's units")
+    parser.add_argument("--part", default="", help="only this part number")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default login.db)")
+    args = parser.parse_args()
+
+    count = export_measurements(args.path, args.start, args.end, args.operator, args.part, connect(args.db))
+    print(f"Exported {count} rows to {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instruments import measure
+from test import borrow_connection, DEFAULT_TIMEOUT
+
+
+class AsyncInstrument:
+    """One serial instrument driven from asyncio.
+
+    pyserial is blocking, so each exchange runs on the driver's thread pool while the
+    event loop waits on it; the per-port lock keeps two coroutines from talking to
+    the same instrument at once.
+    """
+
+    def __init__(self, port, baudrate, executor, timeout=DEFAULT_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.executor = executor
+        self.timeout = timeout
+        self.lock = asyncio.Lock()
+
+    async def measure(self, parameters, compound=True):
+        """Return {parameter: response}; raises TimeoutError if the whole exchange overruns.
+
+        The blocking exchange is given the same deadline, so a timed-out measurement
+        also stops on its worker thread and releases the port instead of holding it
+        while the next one waits.
+        """
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            budget = self.timeout * (len(parameters) + 1)
+            deadline = time.perf_counter() + budget
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.executor, self._measure_blocking, parameters, compound, deadline),
+                timeout=budget
+            )
+
+    def _measure_blocking(self, parameters, compound, deadline):
+        with borrow_connection(self.port, self.baudrate) as ser:
+            return measure(ser, parameters, timeout=self.timeout, compound=compound, deadline=deadline)
+
+
+class FixtureDriver:
+    """Measure several fixtures, each on its own COM port, in parallel.
+
+    The driver owns an event loop on a background thread for the life of the
+    process, so instruments and their locks are created once per port. measure()
+    blocks the calling thread (e.g. the acquisition worker) until every fixture has
+    answered or failed.
+    """
+
+    def __init__(self, max_workers=16):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fixture-io")
+        self.instruments = {}  # (port, baudrate) -> AsyncInstrument, only touched on the loop thread
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="fixture-driver", daemon=True)
+        self.thread.start()
+
+    def measure(self, ports, baudrate, parameters, compound=True):
+        """Measure every port concurrently; returns [(port, responses or the exception raised)]."""
+        future = asyncio.run_coroutine_threadsafe(self._measure(ports, int(baudrate), parameters, compound), self.loop)
+        return future.result()
+
+    async def _measure(self, ports, baudrate, parameters, compound):
+        instruments = [self._instrument(port, baudrate) for port in ports]
+        results = await asyncio.gather(
+            *(instrument.measure(parameters, compound) for instrument in instruments),
+            return_exceptions=True
+        )
+        return list(zip(ports, results))
+
+    def _instrument(self, port, baudrate):
+        key = (port, baudrate)
+        if key not in self.instruments:
+            self.instruments[key] = AsyncInstrument(port, baudrate, self.executor)
+        return self.instruments[key]
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,317 @@
+"""Single-writer ingest process for stations that share one login.db.
+
+The process owns every measurement write: stations send their submits over a local
+socket, the writer thread group-commits whatever has queued up in one transaction
+and only then acknowledges, so an acknowledged submit is on disk. Stations use it
+when INGEST_ADDRESS is set (e.g. localhost:6200); otherwise they write directly.
+
+Messages are JSON, never pickles. Listening on anything but loopback requires a
+shared key in INGEST_AUTHKEY on the ingest host and every station; there is no
+built-in default.
+
+    python ingest.py                       # serve on INGEST_ADDRESS (default localhost:6200)
+    python ingest.py --load-test 20        # 20 simulated stations against a scratch database
+"""
+import argparse
+import ipaddress
+import json
+import os
+import queue
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+
+from db import DB_PATH, connect, transaction
+from measurements import store_units
+from migrations import migrate
+
+DEFAULT_ADDRESS = "localhost:6200"
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024  # Largest submit accepted from a station
+BATCH_WINDOW_S = 0.02  # How long the writer waits for more submits before committing a group
+MAX_BATCH = 200  # Most submits committed in one transaction
+BACKLOG = 64  # Pending connections, so a shift starting all stations at once is not refused
+REQUEST_RETENTION_S = 30 * 24 * 3600  # How long a request id is remembered for de-duplicating resends
+PRUNE_INTERVAL_S = 3600
+
+
+def ingest_address():
+    """Return the (host, port) from INGEST_ADDRESS, or None if stations should write directly."""
+    address = os.environ.get("INGEST_ADDRESS")
+    return parse_address(address) if address else None
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "localhost", int(port)
+
+
+def authkey():
+    """The shared key from INGEST_AUTHKEY, or None if it is not set."""
+    key = os.environ.get("INGEST_AUTHKEY")
+    return key.encode() if key else None
+
+
+def is_loopback(host):
+    """True if host only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Any other host name may resolve to a reachable interface
+
+
+class GroupCommitWriter:
+    """One writer thread and connection; submit() blocks until the submit's group is committed.
+
+    Whatever queues up within batch_window is written in one transaction, so many
+    stations cost one fsync per group instead of one each.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_window=BATCH_WINDOW_S, max_batch=MAX_BATCH):
+        self.db_path = db_path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.requests = queue.Queue()  # (units, operator_name, date, time, request_id, reply) tuples
+        self.commits = 0
+        self.submits = 0
+        self.thread = threading.Thread(target=self._write, name="ingest-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, units, operator_name, date, time_, request_id=None):
+        """Queue a submit and return ("ok", serial numbers) once committed.
+
+        A submit that can never be stored (a non-numeric value, a missing field)
+        returns ("invalid", message); a database failure returns ("error", message).
+
+        A request_id seen before returns the serial numbers it was given then, so a
+        client can safely resend a submit whose acknowledgement it never received.
+        """
+        reply = queue.Queue(maxsize=1)
+        self.requests.put((units, operator_name, date, time_, request_id, reply))
+        return reply.get()
+
+    def _store(self, conn, units, operator_name, date, time_, request_id):
+        with transaction(immediate=True, conn=conn):
+            if request_id:
+                row = conn.execute("SELECT serialNumbers FROM ingestRequests WHERE requestId = ?", (request_id,)).fetchone()
+                if row:
+                    return json.loads(row[0])
+            serial_numbers = store_units(units, operator_name, date, time_, conn=conn)
+            if request_id:
+                conn.execute(
+                    "INSERT INTO ingestRequests (requestId, serialNumbers, receivedAt) VALUES (?, ?, ?)",
+                    (request_id, json.dumps(serial_numbers), int(time.time()))
+                )
+            return serial_numbers
+
+    def _prune(self, conn):
+        with transaction(immediate=True, conn=conn):
+            conn.execute("DELETE FROM ingestRequests WHERE receivedAt < ?", (int(time.time()) - REQUEST_RETENTION_S,))
+
+    def _write(self):
+        conn = connect(self.db_path)
+        conn.execute("PRAGMA synchronous = FULL")  # Acknowledge only what has been synced to disk
+        migrate(conn)
+        self._prune(conn)
+        pruned = time.monotonic()
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with transaction(immediate=True, conn=conn):
+                    results = [("ok", self._store(conn, *request[:5])) for request in batch]
+            except Exception:
+                # One bad submit must not fail the others: retry them one transaction each
+                results = []
+                for request in batch:
+                    try:
+                        results.append(("ok", self._store(conn, *request[:5])))
+                    except (ValueError, TypeError, KeyError, IndexError, sqlite3.IntegrityError) as e:
+                        results.append(("invalid", str(e)))
+                    except Exception as e:
+                        results.append(("error", str(e)))
+            self.commits += 1
+            self.submits += len(batch)
+            for request, result in zip(batch, results):
+                request[5].put(result)
+
+            if time.monotonic() - pruned > PRUNE_INTERVAL_S:
+                self._prune(conn)
+                pruned = time.monotonic()
+
+
+class IngestServer:
+    """Accept submits from many stations over multiprocessing connections and write them through one writer."""
+
+    def __init__(self, address, db_path=DB_PATH, batch_window=BATCH_WINDOW_S, max_batch=MAX_BATCH):
+        key = authkey()
+        if key is None and not is_loopback(address[0]):
+            raise ValueError(f"Set INGEST_AUTHKEY to listen on {address[0]}; without a key only loopback addresses are allowed")
+        self.writer = GroupCommitWriter(db_path, batch_window, max_batch)
+        self.listener = Listener(address, backlog=BACKLOG, authkey=key)
+        self.address = self.listener.address
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # Listener closed
+            except Exception as e:
+                print(f"Rejected ingest connection: {e}")
+                continue
+            threading.Thread(target=self._serve_station, args=(conn,), name="ingest-station", daemon=True).start()
+
+    def close(self):
+        self.listener.close()
+
+    def _serve_station(self, conn):
+        """Relay one station's submits to the writer and send back each acknowledgement."""
+        with conn:
+            while True:
+                try:
+                    message = conn.recv_bytes(MAX_MESSAGE_BYTES)
+                except (EOFError, OSError):
+                    return
+                try:
+                    units, operator_name, date, time_, *request_id = json.loads(message)
+                    result = self.writer.submit(units, operator_name, date, time_, *request_id[:1])
+                except (ValueError, TypeError) as e:
+                    result = ("error", f"Malformed submit: {e}")
+                try:
+                    conn.send_bytes(json.dumps(result).encode())
+                except OSError:
+                    return
+
+
+class IngestClient:
+    """A station's connection to the ingest process; submit() returns once the data is committed."""
+
+    def __init__(self, address):
+        self.address = address
+        self.conn = None
+
+    def submit(self, units, operator_name, date, time_):
+        """Send one submit (same arguments as measurements.store_units) and return its serial numbers.
+
+        Both attempts carry the same request id, so if the connection drops after the
+        server committed the first one, the resend gets the same serial numbers back
+        instead of storing the units twice.
+        """
+        request_id = uuid.uuid4().hex
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = Client(self.address, authkey=authkey())
+                self.conn.send_bytes(json.dumps([units, operator_name, date, time_, request_id]).encode())
+                status, result = json.loads(self.conn.recv_bytes(MAX_MESSAGE_BYTES))
+                break
+            except (EOFError, OSError) as e:
+                # The ingest process restarted: reconnect once, then give up
+                self.close()
+                if attempt:
+                    raise ConnectionError(f"Ingest process at {self.address[0]}:{self.address[1]} is not reachable: {e}") from e
+        if status != "ok":
+            raise RuntimeError(f"Ingest process rejected the submit: {result}")
+        return result
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def _station(address, station, submits, units_per_submit, results):
+    """Load-test station: submit as fast as acknowledgements come back and report latencies."""
+    client = IngestClient(address)
+    latencies = []
+    errors = 0
+    serial_numbers = []
+    for _ in range(submits):
+        units = [("LOAD", "Load Test", "LOAD", "Valid", [("voltage", "3.3"), ("resistance", "8.0")])] * units_per_submit
+        start = time.perf_counter()
+        try:
+            serial_numbers += client.submit(units, f"station{station}", time.strftime("%Y-%m-%d"), time.strftime("%H:%M:%S"))
+        except Exception as e:
+            errors += 1
+            print(f"station{station}: {e}")
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    results.send((latencies, errors, serial_numbers))
+
+
+def load_test(stations, submits=50, units_per_submit=5, db_path=None):
+    """Run simulated stations (one process each) against an in-process ingest server."""
+    # Spawn (as on Windows) rather than fork: forking while the server threads run can deadlock the child
+    context = multiprocessing.get_context("spawn")
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), "load_test.db")
+    server = IngestServer(("localhost", 0), db_path)
+    threading.Thread(target=server.serve_forever, name="ingest-accept", daemon=True).start()
+
+    pipes = [context.Pipe(duplex=False) for _ in range(stations)]
+    processes = [
+        context.Process(target=_station, args=(server.address, n, submits, units_per_submit, send))
+        for n, (_, send) in enumerate(pipes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [receive.recv() for receive, _ in pipes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    server.close()
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    errors = sum(outcome[1] for outcome in outcomes)
+    serial_numbers = [serial for outcome in outcomes for serial in outcome[2]]
+    print(f"{stations} stations x {submits} submits x {units_per_submit} units into {db_path}:")
+    print(f"  {len(latencies) / elapsed:.0f} submits/s, {len(serial_numbers) / elapsed:.0f} units/s, "
+          f"{server.writer.commits} commits ({server.writer.submits / max(server.writer.commits, 1):.1f} submits per commit)")
+    print(f"  ack latency mean {statistics.mean(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"  errors {errors}, duplicate serial numbers {len(serial_numbers) - len(set(serial_numbers))}")
+    return errors == 0 and len(serial_numbers) == len(set(serial_numbers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-writer ingest process for login.db")
+    parser.add_argument("--address", default=os.environ.get("INGEST_ADDRESS", DEFAULT_ADDRESS), help="host:port to listen on")
+    parser.add_argument("--db", default=None, help="database file (default login.db; a scratch file for --load-test)")
+    parser.add_argument("--load-test", type=int, metavar="STATIONS", help="run simulated stations against a scratch database and exit")
+    parser.add_argument("--submits", type=int, default=50, help="submits per station in the load test")
+    args = parser.parse_args()
+
+    if args.load_test:
+        sys.exit(0 if load_test(args.load_test, args.submits, db_path=args.db) else 1)
+
+    try:
+        server = IngestServer(parse_address(args.address), args.db or DB_PATH)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Ingest process writing {args.db or DB_PATH}, listening on {args.address} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
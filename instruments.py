@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+import threading
+import weakref
+
+from test import send_command, query_parameters, DEFAULT_TIMEOUT
+
+# Identified instruments survive restarts in this file, next to the executable when frozen
+if getattr(sys, 'frozen', False):
+    PROFILE_CACHE_PATH = os.path.join(os.path.dirname(sys.executable), "instrument_profiles.json")
+else:
+    PROFILE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instrument_profiles.json")
+
+
+class InstrumentProfile:
+    """What a family of instruments can measure and how to ask it.
+
+    commands maps a lower-case parameter name to its SCPI query. With
+    accepts_unknown=True any other parameter is tried as :MEAS:<PARAMETER>?;
+    otherwise it is rejected before anything is sent. setup holds commands sent once
+    on every new connection (e.g. to select the fastest integration time) and
+    compound says whether several queries may share one line.
+    """
+
+    def __init__(self, name, manufacturer, model, commands, compound=True, setup=(), accepts_unknown=False):
+        self.name = name
+        self.manufacturer = manufacturer  # Upper-case substrings matched against the *IDN? fields
+        self.model = model
+        self.commands = commands
+        self.compound = compound
+        self.setup = setup
+        self.accepts_unknown = accepts_unknown
+
+    def matches(self, manufacturer, model):
+        return self.manufacturer in manufacturer.upper() and self.model in model.upper()
+
+    def supports(self, parameter):
+        return self.accepts_unknown or parameter.lower() in self.commands
+
+    def command_for(self, parameter):
+        return self.commands.get(parameter.lower(), f":MEAS:{parameter.upper()}?")
+
+
+GENERIC = InstrumentProfile(
+    "Generic SCPI", "", "",
+    {"voltage": ":MEAS:VOLT?", "resistance": ":MEAS:RES?"},
+    accepts_unknown=True
+)
+
+PROFILES = [
+    InstrumentProfile(
+        "Keysight/Agilent 3446x", "", "3446",
+        {"voltage": ":MEAS:VOLT:DC?", "resistance": ":MEAS:RES?", "current": ":MEAS:CURR:DC?",
+         "frequency": ":MEAS:FREQ?", "capacitance": ":MEAS:CAP?", "temperature": ":MEAS:TEMP?"},
+        setup=("*CLS",)
+    ),
+    InstrumentProfile(
+        "InThink simulator", "INTHINK", "SIM-DMM",
+        {"voltage": ":MEAS:VOLT?", "resistance": ":MEAS:RES?"},
+        accepts_unknown=True
+    ),
+]
+
+_profiles_by_name = {profile.name: profile for profile in PROFILES + [GENERIC]}
+_cache = None  # {"ports": {port: {"serial": ..., "idn": ..., "profile": name}}}
+_cache_lock = threading.Lock()
+_identified = weakref.WeakKeyDictionary()  # Open handle -> profile, so each handle is set up once
+
+
+def profile_for_idn(idn):
+    """Pick the profile for an *IDN? response ("manufacturer,model,serial,firmware")."""
+    fields = [field.strip() for field in idn.split(",")]
+    manufacturer, model = (fields + ["", ""])[:2]
+    for profile in PROFILES:
+        if profile.matches(manufacturer, model):
+            return profile
+    return GENERIC
+
+
+def cached_profile(port):
+    """Return the profile cached for a port, or None if the instrument on it was never identified."""
+    entry = _load_cache()["ports"].get(port)
+    return _profiles_by_name.get(entry["profile"]) if entry else None
+
+
+def identify(ser, timeout=DEFAULT_TIMEOUT, deadline=None):
+    """Return the profile of the instrument on an open handle.
+
+    Every new handle sends one *IDN? and compares it with the identification cached
+    for the port, so a meter swapped for another model is never given the old
+    profile. Setup commands are sent once per handle.
+    """
+    profile = _identified.get(ser)
+    if profile is not None:
+        return profile
+
+    idn = send_command(ser, "*IDN?", timeout=timeout, deadline=deadline)
+    entry = _load_cache()["ports"].get(ser.port)
+    if entry and entry.get("idn") == idn and entry.get("profile") in _profiles_by_name:
+        profile = _profiles_by_name[entry["profile"]]
+    else:
+        profile = profile_for_idn(idn)
+        fields = [field.strip() for field in idn.split(",")]
+        serial_number = fields[2] if len(fields) > 2 else ""
+        print(f"Identified {ser.port} as {profile.name} ({idn}).")
+        with _cache_lock:
+            cache = _load_cache()
+            cache["ports"][ser.port] = {"serial": serial_number, "idn": idn, "profile": profile.name}
+            _save_cache(cache)
+
+    for command in profile.setup:
+        send_command(ser, command, timeout=timeout, deadline=deadline)
+    _identified[ser] = profile
+    return profile
+
+
+def forget(port):
+    """Drop the cached identification of a port so the next connection probes it again."""
+    with _cache_lock:
+        cache = _load_cache()
+        if cache["ports"].pop(port, None) is not None:
+            _save_cache(cache)
+
+
+def unsupported_parameters(profile, parameters):
+    return [parameter for parameter in parameters if not profile.supports(parameter)]
+
+
+def measure(ser, parameters, timeout=DEFAULT_TIMEOUT, compound=True, deadline=None):
+    """Identify the instrument, reject parameters it cannot measure, then query the rest in one go.
+
+    A deadline (a time.perf_counter() value) bounds identification and queries together.
+    """
+    profile = identify(ser, timeout=timeout, deadline=deadline)
+    unsupported = unsupported_parameters(profile, parameters)
+    if unsupported:
+        raise ValueError(f"{profile.name} on {ser.port} cannot measure: {', '.join(unsupported)}.")
+    try:
+        return query_parameters(ser, parameters, timeout=timeout, compound=compound, profile=profile, deadline=deadline)
+    except (TimeoutError, OSError):
+        # The instrument may have been swapped on a handle that stayed open: identify it again next time
+        _identified.pop(ser, None)
+        raise
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(PROFILE_CACHE_PATH) as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+        _cache.setdefault("ports", {})
+    return _cache
+
+
+def _save_cache(cache):
+    try:
+        temp_path = f"{PROFILE_CACHE_PATH}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(temp_path, PROFILE_CACHE_PATH)
+    except OSError as e:
+        print(f"Failed to save instrument profiles: {e}")
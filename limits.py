@@ -0,0 +1,49 @@
+import threading
+
+from db import DB_PATH, connect
+
+
+class LimitsCache:
+    """Spec limits per (componentName, partNumber), loaded once and kept in memory.
+
+    Every range check used to re-query orders and parametersDetails. The cache
+    keeps one connection open and reads limitsVersion before each lookup: triggers
+    bump it only when orders or parametersDetails change, so a limit edited on the
+    supervisor screen empties the cache while the stations' own submits do not.
+    Safe to use from the Tk thread and the acquisition worker at the same time.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.conn = connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.limits = {}  # (componentName, partNumber) -> {parameterName: (low, high)}, in parametersDetails order
+        self.version = None
+
+    def load(self, component, part_number):
+        """Return {parameter: (low, high)} for a part, reading the database only if the limits changed."""
+        with self.lock:
+            version = self.conn.execute("SELECT version FROM limitsVersion").fetchone()[0]
+            if version != self.version:
+                self.limits.clear()
+                self.version = version
+
+            key = (component, part_number)
+            if key not in self.limits:
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?", (component, part_number))
+                order_id = cursor.fetchone()
+                rows = []
+                if order_id:
+                    cursor.execute("SELECT parameterName, low, high FROM parametersDetails WHERE orderId = ? ORDER BY id", (order_id[0],))
+                    rows = cursor.fetchall()
+                self.limits[key] = {parameter: (low, high) for parameter, low, high in rows}
+            return self.limits[key]
+
+    def limits_for(self, component, part_number, parameters):
+        """Return {parameter: (low, high)} for the given parameters; (None, None) where no limits are set."""
+        limits = self.load(component, part_number)
+        return {parameter: limits.get(parameter, (None, None)) for parameter in parameters}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,22 +1,15 @@
 import tkinter as tk
 from tkinter import messagebox
 import subprocess
-import sqlite3  # Import SQLite library
 import os
 import sys  # Ensure sys is imported
-import shutil  # <-- Add this import
+from db import get_connection  # Shared database connection (copies login.db out of the bundle when frozen)
+from migrations import migrate
 
-# Update database path to handle PyInstaller's temporary directory
 if getattr(sys, 'frozen', False):  # Check if running as a PyInstaller bundle
     BASE_DIR = os.path.dirname(sys.executable)
-    DB_SRC = os.path.join(sys._MEIPASS, "login.db")
-    DB_PATH = os.path.join(BASE_DIR, "login.db")
-    # Copy login.db from temp to writable folder if not already present
-    if not os.path.exists(DB_PATH):
-        shutil.copy(DB_SRC, DB_PATH)
 else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DB_PATH = os.path.join(BASE_DIR, "login.db")
 
 # Main application window
 root = tk.Tk()
@@ -90,31 +83,12 @@ def launch_admin_screen():
 def launch_manufacturer_screen():
     subprocess.Popen(["python", os.path.join(BASE_DIR, "manufacturer.py")])
 
-# Initialize SQLite database
-def initialize_database():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            employee_type TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
 # Modified login function
 def login():
     username = username_entry.get()
     password = password_entry.get()
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT employee_type, name FROM users WHERE username = ? AND password = ?", (username, password))
+    cursor = get_connection().execute("SELECT employee_type, name FROM users WHERE username = ? AND password = ?", (username, password))
     result = cursor.fetchone()
-    conn.close()
     
     if result:
         employee_type, name = result
@@ -132,8 +106,8 @@ def login():
     else:
         messagebox.showerror("Login Failed", "Invalid username or password.")
 
-# Initialize database on application start
-initialize_database()
+# Create or upgrade the database schema on application start (a no-op once it is current)
+migrate()
 
 # Bind Enter key to login button
 root.bind("<Return>", lambda event: login())
@@ -3,25 +3,29 @@ from tkinter import ttk, messagebox
 from ttkbootstrap import Style
 import serial.tools.list_ports  # Import for fetching COM ports
 import serial  # Import pyserial for interaction with COM ports
+from port_registry import get_registry  # Cached COM port list with a background hot-plug watcher
 import os  # Import os for running external scripts
 import sqlite3  # Import SQLite for database operations
+from db import get_connection, transaction  # Shared long-lived connection
+from measurements import recent_range, UNIT_COLUMNS
+from reports import ReportFilter, filter_choices, open_report, parameter_names as measured_parameter_names
+from virtual_table import VirtualTable
+from xlsx_export import FILE_TYPES as XLSX_FILE_TYPES, ExportDialog, save_table
+from summary import GROUPINGS, yield_by, parameter_stats
+from export import FILE_TYPES as EXPORT_FILE_TYPES, export_measurements
+from migrations import migrate
 from tkinter import simpledialog, Toplevel  # Import for date selection dialog and custom date picker dialog
 import sys  # Ensure sys is imported
-import pandas as pd  # Add this import at the top
 
-# Update database path to handle PyInstaller's temporary directory
-if getattr(sys, 'frozen', False):  # Check if running as a PyInstaller bundle
-    BASE_DIR = sys._MEIPASS  # Temporary directory created by PyInstaller
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESCAN_DELAY_MS = 500  # Time given to the port watcher to re-enumerate after "Refresh Ports"
 
-DB_PATH = os.path.join(BASE_DIR, "login.db")
+get_registry()  # Start enumerating COM ports in the background
+migrate()  # Bring the schema up to date if this screen was started without the login window
 
 def connect_db():
-    """Connect to the SQLite database."""
+    """Return the screen's long-lived database connection."""
     try:
-        con = sqlite3.connect(DB_PATH)
-        return con
+        return get_connection()
     except Exception as e:
         messagebox.showerror("Database Error", f"Connection failed: {e}")
         return None
@@ -156,19 +160,16 @@ def add_user():
             messagebox.showerror("Error", "All fields are required.")
             return
 
-        con = connect_db()
-        if con:
-            cursor = con.cursor()
-            try:
-                cursor.execute("INSERT INTO users (username, password, name, employee_type) VALUES (?, ?, ?, ?)",
-                               (username, password, name, role))
-                con.commit()
-                messagebox.showinfo("Success", "User added successfully!")
-                refresh_users()  # Refresh the user table
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "Username already exists.")
-            finally:
-                con.close()
+        try:
+            with transaction() as con:
+                con.execute("INSERT INTO users (username, password, name, employee_type) VALUES (?, ?, ?, ?)",
+                            (username, password, name, role))
+            messagebox.showinfo("Success", "User added successfully!")
+            refresh_users()  # Refresh the user table
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", "Username already exists.")
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error adding user: {e}")
 
     tk.Button(add_user_window, text="Save", bg="#28A745", fg="white", font=("Arial", 10), command=save_user).grid(row=4, column=0, columnspan=2, pady=20)
 
@@ -200,7 +201,6 @@ def add_user():
             cursor.execute("SELECT id, username, name, employee_type FROM users")
             for row in cursor.fetchall():
                 user_tree.insert("", "end", values=row)
-            con.close()
 
     refresh_users()  # Populate the table initially
 
@@ -213,8 +213,8 @@ def set_baud_rate():
         messagebox.showerror("Error", "Invalid Baud Rate. Please enter a number.")
 
 def refresh_com_ports():
-    """Refresh the COM port dropdown values dynamically."""
-    com_ports = [port.device for port in serial.tools.list_ports.comports()]
+    """Fill the COM port dropdown from the port registry cache (enumerated in the background)."""
+    com_ports = get_registry().labels()
     com_port_dropdown["values"] = com_ports
     if (com_ports):
         com_port_var.set(com_ports[0])  # Set the first COM port as default
@@ -223,7 +223,7 @@ def refresh_com_ports():
 
 def connect_to_com_port():
     """Connect to the selected COM port and display a message."""
-    selected_port = com_port_var.get()
+    selected_port = get_registry().device_for(com_port_var.get())
     if (selected_port == "No COM Ports Available" or not selected_port):
         messagebox.showerror("Error", "No valid COM port selected.")
         return
@@ -249,12 +249,12 @@ def open_com_port_popup():
 
     tk.Label(popup, text="COM Port:", bg="white", font=("Arial", 10)).pack(pady=10)
     com_port_var = tk.StringVar(value="Select COM Port")
-    com_port_dropdown = ttk.Combobox(popup, textvariable=com_port_var, state="readonly", width=18)
+    com_port_dropdown = ttk.Combobox(popup, textvariable=com_port_var, state="readonly", width=45)
     com_port_dropdown.pack(pady=5)
 
     def refresh_com_ports():
-        """Refresh the COM port dropdown values dynamically."""
-        com_ports = [port.device for port in serial.tools.list_ports.comports()]
+        """Fill the COM port dropdown from the port registry cache (enumerated in the background)."""
+        com_ports = get_registry().labels()
         com_port_dropdown["values"] = com_ports
         if com_ports:
             com_port_var.set(com_ports[0])  # Set the first COM port as default
@@ -265,7 +265,7 @@ def open_com_port_popup():
 
     def connect_to_com_port():
         """Connect to the selected COM port and display a message."""
-        selected_port = com_port_var.get()
+        selected_port = get_registry().device_for(com_port_var.get())
         if selected_port == "No COM Ports Available" or not selected_port:
             messagebox.showerror("Error", "No valid COM port selected.")
             return
@@ -278,7 +278,12 @@ def open_com_port_popup():
             messagebox.showerror("Error", "Invalid Baud Rate. Please enter a valid number.")
 
     tk.Button(popup, text="Connect", bg="#28A745", fg="white", font=("Arial", 10), command=connect_to_com_port).pack(pady=10)
-    tk.Button(popup, text="Refresh Ports", bg="#007BFF", fg="white", font=("Arial", 10), command=refresh_com_ports).pack(pady=5)
+    def rescan_com_ports():
+        """Ask the watcher to re-enumerate now and refill the dropdown once it has."""
+        get_registry().refresh()
+        popup.after(RESCAN_DELAY_MS, refresh_com_ports)
+
+    tk.Button(popup, text="Refresh Ports", bg="#007BFF", fg="white", font=("Arial", 10), command=rescan_com_ports).pack(pady=5)
 
 # Add a button to open the popup in the sidebar
 tk.Button(
@@ -319,7 +324,7 @@ for text in ["User Logout", "Add User"]:
     ).pack(fill="x", padx=10, pady=8)
 
 def open_main_database():
-    """Open a window displaying all records from measuredValues with Excel-like headers."""
+    """Open a window displaying every measurement, one row per parameter, with Excel-like headers."""
     db_window = tk.Toplevel(root)
     db_window.title("Main Database")
     db_window.state("zoomed")  # Maximize the window
@@ -360,80 +365,50 @@ def open_main_database():
     style.configure("Excel.Treeview", bordercolor="#cccccc", borderwidth=1)
     style.configure("Treeview", bordercolor="#cccccc", borderwidth=1)
 
-    tree = ttk.Treeview(container, columns=data_columns, show="headings", style="Excel.Treeview")
-    for idx, col in enumerate(data_columns):
-        tree.heading(col, text=col)
-        tree.column(col, anchor="center", stretch=True)  # stretch True
-    tree.grid(row=1, column=0, sticky="nsew")
+    # Every live measurement in long format, paged in from the database as the user scrolls
+    try:
+        query = open_report(ReportFilter(), archives=False)
+    except sqlite3.Error as e:
+        messagebox.showerror("Database Error", f"Error fetching measurement data: {e}")
+        db_window.destroy()
+        return
+    table = VirtualTable(
+        container, data_columns, query, style="Excel.Treeview", bg="white",
+        values=lambda index, row: (index + 1,) + tuple(row),
+        tags=lambda index: ('evenrow' if index % 2 else 'oddrow',)
+    )
+    table.grid(row=1, column=0, sticky="nsew")
     container.grid_rowconfigure(1, weight=1)
     container.grid_columnconfigure(0, weight=1)
 
-    tree.tag_configure('evenrow', background='#F7F7F7')
-    tree.tag_configure('oddrow', background='#FFFFFF')
-
-    # Fetch and display all records from measuredValues table
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS measuredValues (
-                orderId TEXT NOT NULL,
-                componentSerialNumber INTEGER NOT NULL,
-                componentName TEXT NOT NULL,
-                partNumber TEXT NOT NULL,
-                parameterName TEXT NOT NULL,
-                operatorName TEXT NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                value REAL NOT NULL,
-                isValid TEXT NOT NULL,
-                PRIMARY KEY (orderId, componentSerialNumber, parameterName)
-            )
-        """)
-        cursor.execute("""
-            SELECT date, time, operatorName, partNumber, parameterName, value
-            FROM measuredValues
-            ORDER BY date, time, operatorName, partNumber, parameterName
-        """)
-        rows = cursor.fetchall()
-        for idx, row in enumerate(rows, start=1):
-            date, time_, operator, part_no, param_name, value = row
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            tree.insert("", "end", values=(idx, date, time_, operator, part_no, param_name, value), tags=(tag,))
-        con.close()
+    table.tree.tag_configure('evenrow', background='#F7F7F7')
+    table.tree.tag_configure('oddrow', background='#FFFFFF')
 
     # Add Save and Print buttons below the table
+    # Both stream the rows from the database into the workbook on a worker thread
     def save_to_excel():
-        data = []
-        for row_id in tree.get_children():
-            data.append(tree.item(row_id)['values'])
-        df = pd.DataFrame(data, columns=data_columns)
         from tkinter import filedialog
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx"), ("All files", "*")]
-        )
+        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=XLSX_FILE_TYPES)
         if file_path:
-            df.to_excel(file_path, index=False)
-            messagebox.showinfo("Exported", f"Data exported to {file_path}")
+            save_table(table, data_columns, file_path,
+                       on_done=lambda count: messagebox.showinfo("Exported", f"Data exported to {file_path}"))
 
     def print_table():
         import tempfile
         import os
-        data = []
-        for row_id in tree.get_children():
-            data.append(tree.item(row_id)['values'])
-        df = pd.DataFrame(data, columns=data_columns)
         with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-            df.to_excel(tmp.name, index=False)
             tmp_path = tmp.name
-        # Send the file to the default printer
-        if sys.platform == "win32":
-            # Windows: use the 'print' verb
-            os.startfile(tmp_path, "print")
-        else:
-            # macOS/Linux: try lpr
-            os.system(f"lpr '{tmp_path}'")
+
+        def send_to_printer(count):
+            # Send the file to the default printer
+            if sys.platform == "win32":
+                # Windows: use the 'print' verb
+                os.startfile(tmp_path, "print")
+            else:
+                # macOS/Linux: try lpr
+                os.system(f"lpr '{tmp_path}'")
+
+        save_table(table, data_columns, tmp_path, on_done=send_to_printer)
 
     btn_frame = tk.Frame(container, bg="white")
     btn_frame.grid(row=2, column=0, sticky="e", pady=8, padx=8)
@@ -455,32 +430,38 @@ def open_main_database():
     save_btn.pack(side="left", padx=10)
 
 def open_generate_report_popup():
-    """Open a popup to select filters and display filtered measuredValues."""
+    """Open a popup to select filters and display the filtered measurements."""
     popup = tk.Toplevel(root)
     popup.title("Generate Report")
-    popup.geometry("400x350")
+    popup.geometry("400x400")
     popup.config(bg="white")
 
     # --- Filter fields ---
-    tk.Label(popup, text="Start Date (YYYY-MM-DD):", bg="white").pack(pady=(15, 2))
+    tk.Label(popup, text="Start (YYYY-MM-DD or YYYY-MM-DD HH:MM):", bg="white").pack(pady=(15, 2))
     start_date_var = tk.StringVar()
     tk.Entry(popup, textvariable=start_date_var).pack()
 
-    tk.Label(popup, text="End Date (YYYY-MM-DD):", bg="white").pack(pady=(15, 2))
+    tk.Label(popup, text="End (YYYY-MM-DD or YYYY-MM-DD HH:MM):", bg="white").pack(pady=(15, 2))
     end_date_var = tk.StringVar()
     tk.Entry(popup, textvariable=end_date_var).pack()
 
+    # Quick sub-day ranges, e.g. for a shift report
+    def set_recent(hours):
+        start, end = recent_range(hours)
+        start_date_var.set(start)
+        end_date_var.set(end)
+
+    range_frame = tk.Frame(popup, bg="white")
+    range_frame.pack(pady=(8, 0))
+    tk.Button(range_frame, text="Last 2 h", command=lambda: set_recent(2)).pack(side="left", padx=5)
+    tk.Button(range_frame, text="Last 8 h", command=lambda: set_recent(8)).pack(side="left", padx=5)
+    tk.Button(range_frame, text="Last 24 h", command=lambda: set_recent(24)).pack(side="left", padx=5)
+
     # Fetch operator names and part numbers for dropdowns
-    con = connect_db()
-    operator_names = []
-    part_numbers = []
-    if con:
-        cursor = con.cursor()
-        cursor.execute("SELECT DISTINCT operatorName FROM measuredValues")
-        operator_names = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT partNumber FROM measuredValues")
-        part_numbers = [row[0] for row in cursor.fetchall()]
-        con.close()
+    try:
+        operator_names, part_numbers = filter_choices()
+    except sqlite3.Error:
+        operator_names, part_numbers = [], []
 
     tk.Label(popup, text="Operator Name:", bg="white").pack(pady=(15, 2))
     operator_var = tk.StringVar()
@@ -493,26 +474,16 @@ def open_generate_report_popup():
     partno_dropdown.pack()
 
     def show_report():
-        # Build SQL query based on selected filters
-        query = """
-            SELECT date, time, operatorName, partNumber, parameterName, value
-            FROM measuredValues
-            WHERE 1=1
-        """
-        params = []
-        if start_date_var.get():
-            query += " AND date >= ?"
-            params.append(start_date_var.get())
-        if end_date_var.get():
-            query += " AND date <= ?"
-            params.append(end_date_var.get())
-        if operator_var.get():
-            query += " AND operatorName = ?"
-            params.append(operator_var.get())
-        if partno_var.get():
-            query += " AND partNumber = ?"
-            params.append(partno_var.get())
-        query += " ORDER BY date, time, operatorName, partNumber, parameterName"
+        # Live rows plus only the archive months inside the date range; reopening the same report reuses it
+        filters = ReportFilter(start_date_var.get(), end_date_var.get(), operator_var.get(), partno_var.get())
+        try:
+            query = open_report(filters)
+        except ValueError as e:
+            messagebox.showerror("Invalid Date", str(e), parent=popup)
+            return
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error fetching report data: {e}", parent=popup)
+            return
 
         # Display results in a new window
         result_win = tk.Toplevel(root)
@@ -555,60 +526,44 @@ def open_generate_report_popup():
         style.configure("Excel.Treeview", bordercolor="#cccccc", borderwidth=1)
         style.configure("Treeview", bordercolor="#cccccc", borderwidth=1)
 
-        tree = ttk.Treeview(container, columns=data_columns, show="headings", style="Excel.Treeview")
-        for idx, col in enumerate(data_columns):
-            tree.heading(col, text=col)
-            tree.column(col, anchor="center", stretch=True)  # stretch True
-        tree.grid(row=1, column=0, sticky="nsew")
+        # Paged in as the user scrolls
+        table = VirtualTable(
+            container, data_columns, query, style="Excel.Treeview", bg="white",
+            values=lambda index, row: (index + 1,) + tuple(row),
+            tags=lambda index: ('evenrow' if index % 2 else 'oddrow',)
+        )
+        table.grid(row=1, column=0, sticky="nsew")
         container.grid_rowconfigure(1, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
-        tree.tag_configure('evenrow', background='#F7F7F7')
-        tree.tag_configure('oddrow', background='#FFFFFF')
-
-        con = connect_db()
-        if con:
-            cursor = con.cursor()
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            for idx, row in enumerate(rows, start=1):
-                date, time_, operator, part_no, param_name, value = row
-                tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-                tree.insert("", "end", values=(idx, date, time_, operator, part_no, param_name, value), tags=(tag,))
-            con.close()
+        table.tree.tag_configure('evenrow', background='#F7F7F7')
+        table.tree.tag_configure('oddrow', background='#FFFFFF')
 
         # Add Save and Print buttons below the table
+        # Both stream the rows from the database into the workbook on a worker thread
         def save_to_excel():
-            data = []
-            for row_id in tree.get_children():
-                data.append(tree.item(row_id)['values'])
-            df = pd.DataFrame(data, columns=data_columns)
             from tkinter import filedialog
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".xlsx",
-                filetypes=[("Excel files", "*.xlsx"), ("All files", "*")]
-            )
+            file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=XLSX_FILE_TYPES)
             if file_path:
-                df.to_excel(file_path, index=False)
-                messagebox.showinfo("Exported", f"Data exported to {file_path}")
+                save_table(table, data_columns, file_path,
+                           on_done=lambda count: messagebox.showinfo("Exported", f"Data exported to {file_path}"))
 
         def print_table():
             import tempfile
             import os
-            data = []
-            for row_id in tree.get_children():
-                data.append(tree.item(row_id)['values'])
-            df = pd.DataFrame(data, columns=data_columns)
             with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-                df.to_excel(tmp.name, index=False)
                 tmp_path = tmp.name
-            # Send the file to the default printer
-            if sys.platform == "win32":
-                # Windows: use the 'print' verb
-                os.startfile(tmp_path, "print")
-            else:
-                # macOS/Linux: try lpr
-                os.system(f"lpr '{tmp_path}'")
+
+            def send_to_printer(count):
+                # Send the file to the default printer
+                if sys.platform == "win32":
+                    # Windows: use the 'print' verb
+                    os.startfile(tmp_path, "print")
+                else:
+                    # macOS/Linux: try lpr
+                    os.system(f"lpr '{tmp_path}'")
+
+            save_table(table, data_columns, tmp_path, on_done=send_to_printer)
 
         btn_frame = tk.Frame(container, bg="white")
         btn_frame.grid(row=2, column=0, sticky="e", pady=8, padx=8)
@@ -629,52 +584,90 @@ def open_generate_report_popup():
             )
         save_btn.pack(side="left", padx=10)
 
+        def export_parquet():
+            """Stream the filtered measurements, with their types, straight from the database."""
+            from tkinter import filedialog
+            file_path = filedialog.asksaveasfilename(defaultextension=".parquet", filetypes=EXPORT_FILE_TYPES)
+            if not file_path:
+                return
+            ExportDialog(
+                table, lambda conn, progress, cancel: export_measurements(file_path, *filters, conn, progress, cancel),
+                table.query.total, on_done=lambda count: messagebox.showinfo("Exported", f"{count} rows exported to {file_path}"),
+                title="Exporting Parquet File"
+            )
+
+        export_btn = tk.Button(
+                btn_frame, text="Export Parquet", bg="#6C757D", fg="white", font=("Arial", 11),
+                command=export_parquet
+            )
+        export_btn.pack(side="left", padx=10)
+
         popup.destroy()
 
     tk.Button(popup, text="Show Report", bg="#28A745", fg="white", font=("Arial", 11), command=show_report).pack(pady=25)
      
 
-# Right-side buttons
-# ttk.Button(menubar, text="User Database", bootstyle='primary', padding=(15, 10)).pack(side='right', padx=10, pady=10)
-ttk.Button(menubar, text="Main Database", bootstyle='secondary', padding=(15, 10), command=open_main_database).pack(side='right', padx=10, pady=10)
-ttk.Button(menubar, text="Generate Report", bootstyle='success', padding=(15, 10), command=open_generate_report_popup).pack(side='right', padx=10, pady=10)
+def open_yield_dashboard():
+    """Open a yield and throughput overview that reads only the summary tables."""
+    dash = tk.Toplevel(root)
+    dash.title("Yield Dashboard")
+    dash.geometry("1000x600")
+    dash.config(bg="white")
 
-def create_orders_table():
-    """Create the orders table in the database if it doesn't exist."""
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                orderId INTEGER PRIMARY KEY AUTOINCREMENT,
-                componentName TEXT NOT NULL,
-                partNumber TEXT NOT NULL
-            )
-        """)  # Added partNumber column
-        con.commit()
-        con.close()
+    filter_frame = tk.Frame(dash, bg="white")
+    filter_frame.pack(fill="x", padx=10, pady=10)
+    tk.Label(filter_frame, text="Start Date (YYYY-MM-DD):", bg="white").pack(side="left")
+    start_date_var = tk.StringVar()
+    tk.Entry(filter_frame, textvariable=start_date_var, width=12).pack(side="left", padx=(5, 15))
+    tk.Label(filter_frame, text="End Date (YYYY-MM-DD):", bg="white").pack(side="left")
+    end_date_var = tk.StringVar()
+    tk.Entry(filter_frame, textvariable=end_date_var, width=12).pack(side="left", padx=(5, 15))
 
-create_orders_table()  # Ensure the table exists
+    notebook = ttk.Notebook(dash)
+    notebook.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
-def create_parameters_table():
-    """Create the parametersDetails table in the database if it doesn't exist."""
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS parametersDetails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                orderId INTEGER NOT NULL,
-                parameterName TEXT NOT NULL,
-                low REAL,
-                high REAL,
-                FOREIGN KEY (orderId) REFERENCES orders(orderId)
-            )
-        """)
-        con.commit()
-        con.close()
+    def add_tab(title, columns):
+        frame = tk.Frame(notebook, bg="white")
+        notebook.add(frame, text=title)
+        tree = ttk.Treeview(frame, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, anchor="center", width=110)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        tree.pack(fill="both", expand=True)
+        return tree
+
+    yield_trees = [
+        (column, add_tab(f"By {label}", [label, "Units", "Passed", "Yield %"])) for label, column in GROUPINGS
+    ]
+    parameter_tree = add_tab("Parameters", ["Part No.", "Parameter", "Count", "Pass %", "Min", "Max", "Mean", "Std Dev"])
+
+    def refresh():
+        start_date, end_date = start_date_var.get().strip(), end_date_var.get().strip()
+        try:
+            for column, tree in yield_trees:
+                tree.delete(*tree.get_children())
+                for key, units, passed, percent in yield_by(column, start_date, end_date):
+                    tree.insert("", "end", values=(key, units, passed, f"{percent:.1f}"))
+            parameter_tree.delete(*parameter_tree.get_children())
+            for part, parameter, count, percent, low, high, mean, std in parameter_stats(start_date, end_date):
+                parameter_tree.insert("", "end", values=(
+                    part, parameter, count, f"{percent:.1f}", f"{low:g}", f"{high:g}", f"{mean:.4g}", f"{std:.4g}"
+                ))
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load the summaries: {e}")
+
+    ttk.Button(filter_frame, text="Refresh", bootstyle='primary', command=refresh).pack(side="left")
+    refresh()
 
-create_parameters_table()  # Ensure the table exists
+
+# Right-side buttons
+# ttk.Button(menubar, text="User Database", bootstyle='primary', padding=(15, 10)).pack(side='right', padx=10, pady=10)
+ttk.Button(menubar, text="Main Database", bootstyle='secondary', padding=(15, 10), command=open_main_database).pack(side='right', padx=10, pady=10)
+ttk.Button(menubar, text="Generate Report", bootstyle='success', padding=(15, 10), command=open_generate_report_popup).pack(side='right', padx=10, pady=10)
+ttk.Button(menubar, text="Yield Dashboard", bootstyle='info', padding=(15, 10), command=open_yield_dashboard).pack(side='right', padx=10, pady=10)
 
 def submit_order_and_save_parameters():
     """Submit a new order and save associated parameters."""
@@ -685,49 +678,33 @@ def submit_order_and_save_parameters():
         messagebox.showerror("Error", "Component Name and Part Number are required.")
         return
 
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("""
-            INSERT INTO orders (componentName, partNumber)
-            VALUES (?, ?)
-        """, (component_name, part_number))  # Save part number
-        con.commit()
-
-        # Fetch the order ID of the newly inserted component
-        cursor.execute("SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?", (component_name, part_number))
-        order = cursor.fetchone()
-        if not order:
-            messagebox.showerror("Error", "Failed to retrieve the order ID.")
-            con.close()
-            return
-
-        order_id = order[0]
-
-        # Save parameters associated with the component
-        for parameter_name_entry in parameter_entries:
-            parameter_name = parameter_name_entry[0].get().strip()
-
-            if not parameter_name:
-                messagebox.showerror("Error", "Parameter Name is required.")
-                con.close()
-                return
+    parameter_names = [parameter_name_entry[0].get().strip() for parameter_name_entry in parameter_entries]
+    if not all(parameter_names):
+        messagebox.showerror("Error", "Parameter Name is required.")
+        return
 
-            try:
-                cursor.execute("""
-                    INSERT INTO parametersDetails (orderId, parameterName)
-                    VALUES (?, ?)
-                """, (order_id, parameter_name))
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save parameter: {e}")
-                con.close()
-                return
+    # The order and its parameters are saved together or not at all
+    try:
+        with transaction() as con:
+            cursor = con.cursor()
+            cursor.execute("""
+                INSERT INTO orders (componentName, partNumber)
+                VALUES (?, ?)
+            """, (component_name, part_number))  # Save part number
+            order_id = cursor.lastrowid
+
+            # Save parameters associated with the component
+            cursor.executemany("""
+                INSERT INTO parametersDetails (orderId, parameterName)
+                VALUES (?, ?)
+            """, [(order_id, parameter_name) for parameter_name in parameter_names])
+    except sqlite3.Error as e:
+        messagebox.showerror("Error", f"Failed to save parameter: {e}")
+        return
 
-        con.commit()
-        con.close()
-        messagebox.showinfo("Success", "Component, part number, and parameters saved successfully!")
-        refresh_orders()
-        clear_order_form()
+    messagebox.showinfo("Success", "Component, part number, and parameters saved successfully!")
+    refresh_orders()
+    clear_order_form()
 
 def clear_order_form():
     """Clear the order input form."""
@@ -763,7 +740,6 @@ def refresh_orders():
             # Insert the row with parameters into the table, with alternating row tags
             tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
             orders_tree.insert("", "end", values=(serial_number, component_name, part_number, parameters_list), tags=(tag,))
-        con.close()
 
 def add_parameter_row():
     """Add a new row for parameter input."""
@@ -872,7 +848,6 @@ def populate_fields(event):
             WHERE orderId = ?
         """, (order_details[0],))  # Assuming column 0 is Serial Number
         parameters = cursor.fetchall()
-        con.close()
 
         for parameter_name, low, high in parameters:
             add_parameter_row()
@@ -893,22 +868,6 @@ root.bind('<Configure>', on_resize)
 
 # --- Place these definitions and button creation BEFORE root.mainloop() ---
 
-def create_user_database_table():
-    """Create the user_database table if it doesn't exist."""
-    con = connect_db()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_database (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                column_name TEXT NOT NULL
-            )
-        """)
-        con.commit()
-        con.close()
-
-create_user_database_table()
-
 def open_user_database_window():
     """Open a window to select columns for the user database."""
     win = tk.Toplevel(root)
@@ -916,23 +875,12 @@ def open_user_database_window():
     win.geometry("500x600")
     win.config(bg="white")
 
-    # Fetch measuredValues columns
-    con = connect_db()
-    columns = []
-    parameter_names = set()
-    if con:
-        cursor = con.cursor()
-        cursor.execute("PRAGMA table_info(measuredValues)")
-        columns = [row[1] for row in cursor.fetchall() if row[1] != "parameterName"]
-        # Fetch all parameterName values
-        cursor.execute("SELECT DISTINCT parameterName FROM measuredValues")
-        for row in cursor.fetchall():
-            # Split comma-separated parameter names
-            for pname in row[0].split(","):
-                pname = pname.strip()
-                if pname:
-                    parameter_names.add(pname)
-        con.close()
+    # Unit columns, plus every parameter name that has been measured
+    columns = list(UNIT_COLUMNS)
+    try:
+        parameter_names = measured_parameter_names()
+    except sqlite3.Error:
+        parameter_names = []
 
     # Frame for checkboxes
     frame = tk.Frame(win, bg="white")
@@ -943,7 +891,7 @@ def open_user_database_window():
     # Dict to hold checkbox variables
     checkbox_vars = {}
 
-    # Add checkboxes for measuredValues columns (excluding parameterName)
+    # Add checkboxes for the unit columns
     for col in columns:
         var = tk.BooleanVar()
         cb = tk.Checkbutton(frame, text=col, variable=var, bg="white", anchor="w")
@@ -965,14 +913,11 @@ def open_user_database_window():
         if not selected:
             messagebox.showerror("Error", "Please select at least one column.")
             return
-        con = connect_db()
-        if con:
+        with transaction() as con:
             cursor = con.cursor()
             cursor.execute("DELETE FROM user_database")  # Clear previous selections
             for col in selected:
                 cursor.execute("INSERT INTO user_database (column_name) VALUES (?)", (col,))
-            con.commit()
-            con.close()
         messagebox.showinfo("Success", "Selected columns saved to user_database.")
         win.destroy()
 
@@ -0,0 +1,190 @@
+"""Queries and writes for the normalised measurement tables.
+
+units holds one row per DUT (order, serial number, operator, date...) and
+measurements one typed row per (unit, parameter). measuredValues is a read-only
+view over both with the old comma-joined parameterName/value columns, for
+readers that have not moved yet.
+
+units.measuredAt is the submit time as UTC epoch seconds, converted from the
+station's local date and time; reports filter and sort on it so sub-day ranges
+are index range scans.
+"""
+import datetime
+
+from db import transaction
+
+# Columns of units that reports and the user database window can show directly
+UNIT_COLUMNS = ("orderId", "componentSerialNumber", "componentName", "partNumber", "operatorName", "date", "time", "isValid")
+
+# Long format, one row per measured parameter, in report order
+LONG_FORMAT_SELECT = "SELECT u.date, u.time, u.operatorName, u.partNumber, m.parameterName, m.value"
+LONG_FORMAT_FROM = """
+    FROM {schema}.units u
+    JOIN {schema}.measurements m ON m.unitId = u.unitId
+"""
+LONG_FORMAT_TEMPLATE = LONG_FORMAT_SELECT + LONG_FORMAT_FROM
+LONG_FORMAT_QUERY = LONG_FORMAT_TEMPLATE.format(schema="main")
+
+# Report order; unique, so a page can continue after the previous page's last key (keyset pagination)
+UNIT_KEY = ("u.measuredAt", "u.unitId")
+LONG_FORMAT_KEY = UNIT_KEY + ("m.parameterName",)
+LONG_FORMAT_ORDER = f" ORDER BY {', '.join(LONG_FORMAT_KEY)}"
+
+# Accepted in the report popups' start and end fields
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+
+def to_epoch(date, time):
+    """UTC epoch seconds for a local "YYYY-MM-DD" date and "HH:MM:SS" time (the date's midnight if time is malformed)."""
+    try:
+        moment = datetime.datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        moment = datetime.datetime.strptime(date, "%Y-%m-%d")
+    return int(moment.timestamp())  # Naive datetimes are taken as local time, as the stations record them
+
+
+def parse_datetime(text, end=False):
+    """UTC epoch seconds for a local date or date-time typed in a report popup.
+
+    A bare date is the start of that day, or with end=True its last second, so
+    "2025-06-01" to "2025-06-01" still covers the whole day. Likewise an end time
+    without seconds covers its whole minute ("10:30" ends at 10:30:59), which
+    includes units stored during the current minute of a recent_range.
+    Raises ValueError.
+    """
+    for fmt in DATETIME_FORMATS:
+        try:
+            moment = datetime.datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            continue
+        if end and fmt == "%Y-%m-%d":
+            moment += datetime.timedelta(days=1, seconds=-1)
+        elif end and fmt == "%Y-%m-%d %H:%M":
+            moment += datetime.timedelta(seconds=59)
+        return int(moment.timestamp())
+    raise ValueError(f'"{text}" is not a date (YYYY-MM-DD) or date and time (YYYY-MM-DD HH:MM)')
+
+
+def recent_range(hours, now=None):
+    """(start, end) popup strings covering the last hours, e.g. for a shift report."""
+    now = now or datetime.datetime.now()
+    return (now - datetime.timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M"), now.strftime("%Y-%m-%d %H:%M")
+
+
+def unit_filters(start_date="", end_date="", operator="", part_number=""):
+    """Return (where, params) for the report popups' filters; empty filters are skipped.
+
+    start_date and end_date are local dates or date-times (see parse_datetime) and
+    become a range on units.measuredAt. Raises ValueError if they cannot be parsed.
+    """
+    where = " WHERE 1=1"
+    params = []
+    if start_date:
+        where += " AND u.measuredAt >= ?"
+        params.append(parse_datetime(start_date))
+    if end_date:
+        where += " AND u.measuredAt <= ?"
+        params.append(parse_datetime(end_date, end=True))
+    if operator:
+        where += " AND u.operatorName = ?"
+        params.append(operator)
+    if part_number:
+        where += " AND u.partNumber = ?"
+        params.append(part_number)
+    return where, params
+
+
+def pivot_query(columns, where=" WHERE 1=1", params=(), schema="main"):
+    """Return (sql, params) selecting one row per unit with one column per entry of columns.
+
+    Unit columns are selected as they are; "value" gives the unit's comma-joined values
+    as the old table did, and anything else is taken as a parameter name whose value is
+    looked up through the measurements primary key (case-insensitive, NULL if missing).
+    schema selects an attached archive database instead of the live tables.
+    """
+    select, pivot_params = pivot_select(columns, schema)
+    sql = f"{select} FROM {schema}.units u{where} ORDER BY {', '.join(UNIT_KEY)}"
+    return sql, pivot_params + list(params)
+
+
+def pivot_select(columns, schema="main"):
+    """Return (select, params): the SELECT list of pivot_query, for callers that add their own FROM."""
+    select = []
+    pivot_params = []
+    for column in columns:
+        if column in UNIT_COLUMNS:
+            select.append(f'u."{column}"')
+        elif column == "value":
+            select.append(f"(SELECT group_concat(m.value, ',') FROM {schema}.measurements m WHERE m.unitId = u.unitId)")
+        else:
+            select.append(f"(SELECT m.value FROM {schema}.measurements m WHERE m.unitId = u.unitId AND m.parameterName = ? COLLATE NOCASE)")
+            pivot_params.append(column)
+    return f"SELECT {', '.join(select)}", pivot_params
+
+
+def previous_entries_query(part_number, component, parameters):
+    """Return (sql, params) for the operator screen's previously fetched entries.
+
+    One row per unit of the part that has a value for every selected parameter,
+    newest serial number first, with the names and values comma-joined in the
+    order given, as the old measuredValues rows held them.
+    """
+    values = " || ',' || ".join(
+        "(SELECT m.value FROM measurements m WHERE m.unitId = u.unitId AND m.parameterName = ?)" for _ in parameters
+    )
+    sql = f"""
+        SELECT orderId, componentSerialNumber, componentName, parameterName, value FROM (
+            SELECT u.orderId, u.componentSerialNumber, u.componentName, ? AS parameterName, {values} AS value
+            FROM units u
+            WHERE u.partNumber = ? AND u.componentName = ?
+        )
+        WHERE value IS NOT NULL
+        ORDER BY componentSerialNumber DESC
+    """
+    return sql, [",".join(parameters)] + list(parameters) + [part_number, component]
+
+
+def allocate_serial_numbers(cursor, order_id, count):
+    """Reserve count consecutive componentSerialNumbers for an order and return them.
+
+    Must run inside a BEGIN IMMEDIATE transaction: the write lock is held from the
+    UPDATE to the commit, so two stations can never be handed the same numbers.
+    """
+    cursor.execute("INSERT OR IGNORE INTO unitSequence (orderId, lastSerialNumber) VALUES (?, 0)", (order_id,))
+    cursor.execute("UPDATE unitSequence SET lastSerialNumber = lastSerialNumber + ? WHERE orderId = ?", (count, order_id))
+    last = cursor.execute("SELECT lastSerialNumber FROM unitSequence WHERE orderId = ?", (order_id,)).fetchone()[0]
+    return list(range(last - count + 1, last + 1))
+
+
+def store_units(units, operator_name, date, time, conn=None):
+    """Store a batch of DUTs in one BEGIN IMMEDIATE transaction and return their serial numbers.
+
+    units is [(orderId, componentName, partNumber, isValid, [(parameterName, value)])].
+    Serial numbers come from unitSequence, and units and measurements are each
+    written with a single executemany, so the cost does not grow with the table.
+    """
+    measured_at = to_epoch(date, time)
+    with transaction(immediate=True, conn=conn) as conn:
+        cursor = conn.cursor()
+        counts = {}
+        for unit in units:
+            counts[unit[0]] = counts.get(unit[0], 0) + 1
+        allocated = {order_id: iter(allocate_serial_numbers(cursor, order_id, count)) for order_id, count in counts.items()}
+        serial_numbers = [next(allocated[unit[0]]) for unit in units]
+
+        cursor.executemany("""
+            INSERT INTO units (orderId, componentSerialNumber, componentName, partNumber, operatorName, date, time, isValid, measuredAt)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (order_id, serial_number, component, part_number, operator_name, date, time, is_valid, measured_at)
+            for (order_id, component, part_number, is_valid, _), serial_number in zip(units, serial_numbers)
+        ])
+        cursor.executemany("""
+            INSERT INTO measurements (unitId, parameterName, value)
+            VALUES ((SELECT unitId FROM units WHERE orderId = ? AND componentSerialNumber = ?), ?, ?)
+        """, [
+            (unit[0], serial_number, name, float(value))
+            for unit, serial_number in zip(units, serial_numbers)
+            for name, value in unit[4]
+        ])
+    return serial_numbers
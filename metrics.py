@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket catches everything slower
+HISTOGRAM_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+WINDOW = 500  # Most recent exchanges kept per (port, command)
+FLUSH_INTERVAL_S = 30
+
+# Keep the metrics file next to the executable when frozen, like login.db
+if getattr(sys, 'frozen', False):
+    METRICS_PATH = os.path.join(os.path.dirname(sys.executable), "acquisition_metrics.json")
+else:
+    METRICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "acquisition_metrics.json")
+
+OPEN = "<open>"  # Command name used for port-open timings
+
+_samples = {}  # (port, command) -> deque of (write_s, first_byte_s, total_s, bytes_written, bytes_read, error)
+_lock = threading.Lock()
+
+
+def record_command(port, command, write_s, first_byte_s, total_s, bytes_written, bytes_read, error=False):
+    """Record the timings of one command exchange (all durations in seconds)."""
+    with _lock:
+        window = _samples.get((port, command))
+        if window is None:
+            window = _samples[(port, command)] = deque(maxlen=WINDOW)
+        window.append((write_s, first_byte_s, total_s, bytes_written, bytes_read, error))
+
+
+def record_open(port, open_s, error=False):
+    """Record how long opening a port took."""
+    record_command(port, OPEN, 0.0, 0.0, open_s, 0, 0, error)
+
+
+def snapshot():
+    """Summarise the rolling window of every (port, command) as a list of dicts, slowest first."""
+    with _lock:
+        windows = {key: list(window) for key, window in _samples.items()}
+
+    rows = []
+    for (port, command), samples in windows.items():
+        totals = sorted(sample[2] * 1000 for sample in samples)
+        histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for total in totals:
+            histogram[next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if total <= bound), -1)] += 1
+        rows.append({
+            "port": port,
+            "command": command,
+            "count": len(samples),
+            "errors": sum(1 for sample in samples if sample[5]),
+            "mean_ms": sum(totals) / len(totals),
+            "p50_ms": totals[len(totals) // 2],
+            "p95_ms": totals[max(0, int(len(totals) * 0.95) - 1)],
+            "max_ms": totals[-1],
+            "write_ms": sum(sample[0] for sample in samples) * 1000 / len(samples),
+            "first_byte_ms": sum(sample[1] for sample in samples) * 1000 / len(samples),
+            "bytes_written": sum(sample[3] for sample in samples),
+            "bytes_read": sum(sample[4] for sample in samples),
+            "histogram": dict(zip([f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + ["slower"], histogram)),
+        })
+    rows.sort(key=lambda row: row["p95_ms"], reverse=True)
+    return rows
+
+
+def flush(path=METRICS_PATH):
+    """Write the current snapshot to a JSON file (replaced atomically)."""
+    data = {"written_at": time.strftime("%Y-%m-%d %H:%M:%S"), "commands": snapshot()}
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+
+class MetricsFlusher:
+    """Flush the metrics file every interval seconds on a background thread."""
+
+    def __init__(self, path=METRICS_PATH, interval=FLUSH_INTERVAL_S):
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self._flush()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._flush()
+
+    def _flush(self):
+        if not _samples:
+            return
+        try:
+            flush(self.path)
+        except OSError as e:
+            print(f"Failed to write metrics file: {e}")
@@ -0,0 +1,440 @@
+"""Schema migrations for login.db, applied in order and recorded in PRAGMA user_version.
+
+    python migrations.py                  # bring login.db up to date
+    python migrations.py --check-plans    # fail if a hot query would scan a table or sort without an index
+"""
+import argparse
+import sys
+
+from db import get_connection, transaction
+from measurements import LONG_FORMAT_QUERY, LONG_FORMAT_ORDER, pivot_query, previous_entries_query
+
+# units.measuredAt from the stored local date and time, falling back to the date's midnight
+MEASURED_AT_SQL = """COALESCE(
+    CAST(strftime('%s', date || ' ' || time, 'utc') AS INTEGER),
+    CAST(strftime('%s', date, 'utc') AS INTEGER)
+)"""
+
+
+def create_measured_values_indexes(conn):
+    """Covering indexes for the previous-entries lookup, the report filters and the dropdowns."""
+    # The table is normally created by the first submit; create it here so the indexes always exist
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS measuredValues (
+            orderId TEXT NOT NULL,
+            componentSerialNumber INTEGER NOT NULL,
+            componentName TEXT NOT NULL,
+            partNumber TEXT NOT NULL,
+            parameterName TEXT NOT NULL,
+            operatorName TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            value REAL NOT NULL,
+            isValid TEXT NOT NULL,
+            PRIMARY KEY (orderId, componentSerialNumber)
+        )
+    """)
+    # Operator screen: WHERE partNumber, componentName, parameterName ORDER BY componentSerialNumber DESC
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_measuredValues_previous
+        ON measuredValues (partNumber, componentName, parameterName, componentSerialNumber, orderId, value)
+    """)
+    # Reports by date range, and the Main Database listing in report order
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_measuredValues_date
+        ON measuredValues (date, time, operatorName, partNumber, parameterName, value)
+    """)
+    # Reports by operator (optionally with part number) and SELECT DISTINCT operatorName
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_measuredValues_operator
+        ON measuredValues (operatorName, date, time, partNumber, parameterName, value)
+    """)
+    # Reports by part number and SELECT DISTINCT partNumber
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_measuredValues_part
+        ON measuredValues (partNumber, date, time, operatorName, parameterName, value)
+    """)
+    conn.execute("ANALYZE measuredValues")
+
+
+def normalise_measured_values(conn):
+    """Move the comma-joined measuredValues rows into units + measurements and leave a view behind."""
+    conn.execute("""
+        CREATE TABLE units (
+            unitId INTEGER PRIMARY KEY,
+            orderId TEXT NOT NULL,
+            componentSerialNumber INTEGER NOT NULL,
+            componentName TEXT NOT NULL,
+            partNumber TEXT NOT NULL,
+            operatorName TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            isValid TEXT NOT NULL,
+            UNIQUE (orderId, componentSerialNumber)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE measurements (
+            unitId INTEGER NOT NULL REFERENCES units (unitId),
+            parameterName TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (unitId, parameterName)
+        ) WITHOUT ROWID
+    """)
+    # Same access paths as the measuredValues indexes, now on units
+    conn.execute("CREATE INDEX idx_units_previous ON units (partNumber, componentName, componentSerialNumber)")
+    conn.execute("CREATE INDEX idx_units_date ON units (date, time, operatorName, partNumber)")
+    conn.execute("CREATE INDEX idx_units_operator ON units (operatorName, date, time)")
+    conn.execute("CREATE INDEX idx_units_part ON units (partNumber, date, time)")
+    # Per-parameter statistics and filters, and SELECT DISTINCT parameterName
+    conn.execute("CREATE INDEX idx_measurements_parameter ON measurements (parameterName, value)")
+
+    skipped = 0
+    rows = conn.execute("""
+        SELECT orderId, componentSerialNumber, componentName, partNumber, parameterName,
+               operatorName, date, time, value, isValid
+        FROM measuredValues
+    """).fetchall()
+    for order_id, serial_number, component, part_number, names, operator, date, time, values, is_valid in rows:
+        # Older databases keyed measuredValues on (orderId, serial, parameterName): merge those into one unit
+        conn.execute("""
+            INSERT OR IGNORE INTO units (orderId, componentSerialNumber, componentName, partNumber, operatorName, date, time, isValid)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (order_id, serial_number, component, part_number, operator, date, time, is_valid))
+        unit_id = conn.execute(
+            "SELECT unitId FROM units WHERE orderId = ? AND componentSerialNumber = ?", (order_id, serial_number)
+        ).fetchone()[0]
+        for name, value in zip(str(names).split(","), str(values).split(",")):
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO measurements (unitId, parameterName, value) VALUES (?, ?, ?)",
+                    (unit_id, name.strip(), float(value))
+                )
+            except ValueError:
+                skipped += 1
+    if skipped:
+        print(f"Skipped {skipped} non-numeric values while migrating measuredValues.")
+
+    conn.execute("DROP TABLE measuredValues")
+    conn.execute("""
+        CREATE VIEW measuredValues AS
+        SELECT u.orderId, u.componentSerialNumber, u.componentName, u.partNumber,
+               (SELECT group_concat(m.parameterName, ',') FROM measurements m WHERE m.unitId = u.unitId) AS parameterName,
+               u.operatorName, u.date, u.time,
+               (SELECT group_concat(m.value, ',') FROM measurements m WHERE m.unitId = u.unitId) AS value,
+               u.isValid
+        FROM units u
+    """)
+    conn.execute("ANALYZE")
+
+
+def create_base_tables(conn):
+    """Tables that each screen used to create on start-up (kept IF NOT EXISTS for existing databases)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            employee_type TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            orderId INTEGER PRIMARY KEY AUTOINCREMENT,
+            componentName TEXT NOT NULL,
+            partNumber TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS parametersDetails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            orderId INTEGER NOT NULL,
+            parameterName TEXT NOT NULL,
+            low REAL,
+            high REAL,
+            FOREIGN KEY (orderId) REFERENCES orders(orderId)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_database (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            column_name TEXT NOT NULL
+        )
+    """)
+    # Dropdowns and limit lookups select orders by component and part number
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_component ON orders (componentName, partNumber)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_parametersDetails_order ON parametersDetails (orderId, parameterName)")
+
+
+def create_unit_sequence(conn):
+    """Per-order serial number counters, so a submit no longer scans units for MAX(componentSerialNumber)."""
+    conn.execute("""
+        CREATE TABLE unitSequence (
+            orderId TEXT PRIMARY KEY,
+            lastSerialNumber INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO unitSequence (orderId, lastSerialNumber)
+        SELECT orderId, MAX(componentSerialNumber) FROM units GROUP BY orderId
+    """)
+
+
+def create_summary_tables(conn):
+    """Per-day yield and parameter statistics, kept current by triggers on every insert.
+
+    Archiving deletes from units and measurements but not from the summaries, so the
+    dashboard keeps covering archived months. Existing rows, live and archived, are
+    backfilled here.
+    """
+    conn.execute("""
+        CREATE TABLE unitSummary (
+            date TEXT NOT NULL,
+            partNumber TEXT NOT NULL,
+            operatorName TEXT NOT NULL,
+            units INTEGER NOT NULL,
+            passUnits INTEGER NOT NULL,
+            PRIMARY KEY (date, partNumber, operatorName)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE measurementSummary (
+            date TEXT NOT NULL,
+            partNumber TEXT NOT NULL,
+            parameterName TEXT NOT NULL,
+            operatorName TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            passCount INTEGER NOT NULL,
+            minValue REAL NOT NULL,
+            maxValue REAL NOT NULL,
+            sumValue REAL NOT NULL,
+            sumSquares REAL NOT NULL,
+            PRIMARY KEY (date, partNumber, parameterName, operatorName)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER trg_units_summary AFTER INSERT ON units
+        BEGIN
+            INSERT INTO unitSummary (date, partNumber, operatorName, units, passUnits)
+            VALUES (NEW.date, NEW.partNumber, NEW.operatorName, 1, NEW.isValid = 'Valid')
+            ON CONFLICT (date, partNumber, operatorName) DO UPDATE SET
+                units = units + 1,
+                passUnits = passUnits + excluded.passUnits;
+        END
+    """)
+    # store_units inserts the unit before its measurements, so the unit row is there to join
+    conn.execute("""
+        CREATE TRIGGER trg_measurements_summary AFTER INSERT ON measurements
+        BEGIN
+            INSERT INTO measurementSummary (date, partNumber, parameterName, operatorName,
+                                            count, passCount, minValue, maxValue, sumValue, sumSquares)
+            SELECT u.date, u.partNumber, NEW.parameterName, u.operatorName,
+                   1, u.isValid = 'Valid', NEW.value, NEW.value, NEW.value, NEW.value * NEW.value
+            FROM units u WHERE u.unitId = NEW.unitId
+            ON CONFLICT (date, partNumber, parameterName, operatorName) DO UPDATE SET
+                count = count + 1,
+                passCount = passCount + excluded.passCount,
+                minValue = min(minValue, excluded.minValue),
+                maxValue = max(maxValue, excluded.maxValue),
+                sumValue = sumValue + excluded.sumValue,
+                sumSquares = sumSquares + excluded.sumSquares;
+        END
+    """)
+
+    # archive imports this module, so import it here; each month file is read through its own
+    # connection because ATTACH is not allowed inside the migration's transaction
+    import sqlite3
+    from archive import archive_months, archive_path
+
+    sources = [conn] + [sqlite3.connect(archive_path(month)) for month in archive_months()]
+    for source in sources:
+        conn.executemany(
+            """INSERT INTO unitSummary VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (date, partNumber, operatorName) DO UPDATE SET
+                   units = units + excluded.units, passUnits = passUnits + excluded.passUnits""",
+            source.execute("""
+                SELECT date, partNumber, operatorName, COUNT(*), SUM(isValid = 'Valid')
+                FROM units GROUP BY date, partNumber, operatorName
+            """).fetchall()
+        )
+        conn.executemany(
+            """INSERT INTO measurementSummary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (date, partNumber, parameterName, operatorName) DO UPDATE SET
+                   count = count + excluded.count, passCount = passCount + excluded.passCount,
+                   minValue = min(minValue, excluded.minValue), maxValue = max(maxValue, excluded.maxValue),
+                   sumValue = sumValue + excluded.sumValue, sumSquares = sumSquares + excluded.sumSquares""",
+            source.execute("""
+                SELECT u.date, u.partNumber, m.parameterName, u.operatorName, COUNT(*), SUM(u.isValid = 'Valid'),
+                       MIN(m.value), MAX(m.value), SUM(m.value), SUM(m.value * m.value)
+                FROM units u JOIN measurements m ON m.unitId = u.unitId
+                GROUP BY u.date, u.partNumber, m.parameterName, u.operatorName
+            """).fetchall()
+        )
+        if source is not conn:
+            source.close()
+
+
+def add_measured_at(conn):
+    """Add units.measuredAt (UTC epoch seconds) so reports can range-scan sub-day periods."""
+    conn.execute("ALTER TABLE units ADD COLUMN measuredAt INTEGER")
+    # 'utc' takes the stored wall-clock time as local time, as measurements.to_epoch does
+    conn.execute(f"UPDATE units SET measuredAt = {MEASURED_AT_SQL}")
+    # Report filters are now ranges on measuredAt (alone, by operator or by part) ordered by it
+    conn.execute("DROP INDEX idx_units_operator")
+    conn.execute("DROP INDEX idx_units_part")
+    conn.execute("CREATE INDEX idx_units_measured_at ON units (measuredAt, operatorName, partNumber)")
+    conn.execute("CREATE INDEX idx_units_operator_time ON units (operatorName, measuredAt)")
+    conn.execute("CREATE INDEX idx_units_part_time ON units (partNumber, measuredAt)")
+    conn.execute("ANALYZE units")
+
+
+def create_ingest_requests(conn):
+    """Request ids the ingest writer has committed, so a resent submit is not stored twice."""
+    conn.execute("""
+        CREATE TABLE ingestRequests (
+            requestId TEXT PRIMARY KEY,
+            serialNumbers TEXT NOT NULL,
+            receivedAt INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_ingestRequests_received ON ingestRequests (receivedAt)")
+
+
+def index_report_order(conn):
+    """Index units in report order (measuredAt, then unitId as tie-break) for keyset-paged tables."""
+    # An index on measuredAt alone ends in the rowid, i.e. is ordered by (measuredAt, unitId)
+    conn.execute("DROP INDEX idx_units_measured_at")
+    conn.execute("CREATE INDEX idx_units_report_order ON units (measuredAt)")
+    # Keyset comparisons skip NULL keys; the to_epoch fallback has always filled it, so this only hits odd rows
+    conn.execute("UPDATE units SET measuredAt = 0 WHERE measuredAt IS NULL")
+    conn.execute("ANALYZE units")
+
+
+def create_limits_version(conn):
+    """A counter bumped by triggers whenever orders or parametersDetails change, so cached limits outlive DUT submits."""
+    conn.execute("CREATE TABLE limitsVersion (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO limitsVersion (id, version) VALUES (1, 0)")
+    for table in ("orders", "parametersDetails"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER trg_{table}_{event.lower()}_limits_version AFTER {event} ON {table}
+                BEGIN
+                    UPDATE limitsVersion SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+
+def create_measurements_unparsed(conn):
+    """Readings that could not be stored in measurements, kept as text with the reason.
+
+    Keyed on the unit's order and serial number rather than unitId so the rows
+    outlive archiving. normalise_measured_values (migration 2) is released and
+    drops unparseable legacy readings, printing how many, so this only gives every
+    database the same table, whichever version it was migrated from.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS measurementsUnparsed (
+            orderId TEXT NOT NULL,
+            componentSerialNumber INTEGER NOT NULL,
+            parameterName TEXT,
+            rawValue TEXT,
+            reason TEXT NOT NULL
+        )
+    """)
+
+
+# The whole schema lives here: screens never run DDL themselves, they call migrate() on start-up.
+# Never reorder or edit a released migration; append a new one instead.
+MIGRATIONS = [
+    create_measured_values_indexes,
+    normalise_measured_values,
+    create_base_tables,
+    create_unit_sequence,
+    create_summary_tables,
+    add_measured_at,
+    create_ingest_requests,
+    index_report_order,
+    create_limits_version,
+    create_measurements_unparsed,
+]
+
+
+def migrate(conn=None):
+    """Apply every migration newer than the database's user_version; returns the resulting version.
+
+    On an up-to-date database this is a single PRAGMA read. Each migration runs in
+    its own BEGIN IMMEDIATE transaction together with the user_version bump, so a
+    failure leaves the database at the previous version and two screens starting
+    at once cannot apply the same migration twice. The last migration is only
+    committed if every hot query still uses an index (check_query_plans);
+    otherwise it is rolled back and RuntimeError lists the plans that scan.
+    """
+    conn = conn or get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(MIGRATIONS):
+        print(f"Database schema version {version} is newer than this program ({len(MIGRATIONS)}); please update it.")
+    while version < len(MIGRATIONS):
+        with transaction(immediate=True, conn=conn):
+            # Re-read under the write lock in case another screen migrated meanwhile
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < len(MIGRATIONS):
+                MIGRATIONS[version](conn)
+                version += 1
+                conn.execute(f"PRAGMA user_version = {version}")
+                if version == len(MIGRATIONS):
+                    # The hot queries are written against the final schema, so check it before it is committed
+                    failures = check_query_plans(conn)
+                    if failures:
+                        raise RuntimeError("Migration would leave hot queries without an index:\n" + "\n".join(
+                            f"{name}: {'; '.join(plan)}" for name, plan in failures
+                        ))
+    return version
+
+
+# The queries behind the operator and report screens, with sample parameters, as (name, sql, params)
+HOT_QUERIES = [
+    ("previous entries", *previous_entries_query("P1", "C1", ["voltage", "resistance"])),
+    ("operator dropdown", "SELECT DISTINCT operatorName FROM units", ()),
+    ("part number dropdown", "SELECT DISTINCT partNumber FROM units", ()),
+    ("parameter names", "SELECT DISTINCT parameterName FROM measurements", ()),
+    ("report by time range", f"{LONG_FORMAT_QUERY} WHERE u.measuredAt >= ? AND u.measuredAt <= ? {LONG_FORMAT_ORDER}", (1735689600, 1735718400)),
+    ("report by operator", f"{LONG_FORMAT_QUERY} WHERE u.operatorName = ? {LONG_FORMAT_ORDER}", ("op",)),
+    ("report by part", f"{LONG_FORMAT_QUERY} WHERE u.partNumber = ? {LONG_FORMAT_ORDER}", ("P1",)),
+    ("report by operator and part", f"{LONG_FORMAT_QUERY} WHERE u.operatorName = ? AND u.partNumber = ? {LONG_FORMAT_ORDER}", ("op", "P1")),
+    ("shift report by operator", f"{LONG_FORMAT_QUERY} WHERE u.measuredAt >= ? AND u.measuredAt <= ? AND u.operatorName = ? {LONG_FORMAT_ORDER}", (1735689600, 1735718400, "op")),
+    ("pivot report by time range", *pivot_query(["date", "operatorName", "voltage", "resistance"], " WHERE u.measuredAt >= ?", [1735689600])),
+    ("main database", f"{LONG_FORMAT_QUERY} {LONG_FORMAT_ORDER}", ()),
+]
+
+def check_query_plans(conn=None):
+    """Return [(name, plan)] for every hot query whose EXPLAIN QUERY PLAN scans a table or sorts without an index."""
+    conn = conn or get_connection()
+    failures = []
+    for name, sql, params in HOT_QUERIES:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        # The plan names the alias ("SCAN u"), so any SCAN counts; "SCAN u USING COVERING INDEX ..." is fine.
+        # Keyset-paged queries must also come out of an index in order rather than be sorted whole.
+        if any((line.startswith("SCAN ") and "INDEX" not in line) or line == "USE TEMP B-TREE FOR ORDER BY"
+               for line in plan):
+            failures.append((name, plan))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply login.db schema migrations")
+    parser.add_argument("--check-plans", action="store_true", help="also check that no hot query scans a table or sorts without an index")
+    args = parser.parse_args()
+
+    print(f"Schema version {migrate()}.")
+    if args.check_plans:
+        failures = check_query_plans()
+        for name, plan in failures:
+            print(f"FULL SCAN in {name}: {'; '.join(plan)}")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(HOT_QUERIES)} hot queries use an index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,34 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sys
-import sqlite3  # Add this import for database interaction
-import os
-from test import list_ports, connect_serial, send_command  # Import serial functions
-import datetime  # <-- Add this line
-
-# Update database path to handle PyInstaller's temporary directory
-if getattr(sys, 'frozen', False):  # Check if running as a PyInstaller bundle
-    BASE_DIR = sys._MEIPASS  # Temporary directory created by PyInstaller
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-DB_PATH = os.path.join(BASE_DIR, "login.db")
 
+# Only a dependency check: test, fixtures and port_registry below need pyserial, so a missing install gets a message
 try:
-    import serial.tools.list_ports
+    import serial
 except ModuleNotFoundError:
     messagebox.showerror("Module Error", "The 'pyserial' module is not installed. Please install it using 'pip install pyserial'.")
     exit()
 
+import sys
+import os
+from db import get_connection as get_db_connection  # test.py has its own get_connection for serial ports
+from measurements import previous_entries_query, store_units
+from migrations import migrate
+from acquisition import AcquisitionWorker
+from streaming import StreamCapture, DEFAULT_RATE_HZ
+from fixtures import FixtureDriver
+from port_registry import get_registry
+from metrics import MetricsFlusher, snapshot as metrics_snapshot
+from test import list_ports, borrow_connection, close_connection, close_all_connections, reset_compound  # Import serial functions
+from limits import LimitsCache
+from ingest import IngestClient, ingest_address
+from service import ServiceClient, RemoteLimits, service_url
+from instruments import cached_profile, unsupported_parameters, measure as measure_instrument
+import datetime  # <-- Add this line
+
+STREAM_REFRESH_MS = 200  # Refresh interval of the streaming statistics table
+DIAGNOSTICS_REFRESH_MS = 1000  # Refresh interval of the serial diagnostics table
+SPOOL_RETRY_MS = 30000  # How often submits spooled while the ingest service was down are resent
+
 class OperatorApp:
     def __init__(self, root, username, name):
         self.root = root
@@ -30,6 +39,35 @@ class OperatorApp:
         self.operator_name = name  # Store operator name
         self.selected_com_port = None  # Store selected COM port
         self.selected_baud_rate = None  # Store selected baud rate
+        self.port_registry = get_registry()  # Start enumerating COM ports in the background now
+        self.compound_queries_var = tk.BooleanVar(value=True)  # Batch all parameters into one SCPI query
+
+        # Serial reads and database writes run on this worker so the window never freezes
+        self.worker = AcquisitionWorker(self.root)
+        self.pending_reads = 0  # Measurements queued or in progress
+        self.submitting = False  # A submit is being written to the database
+
+        # Parallel fixtures: one instrument per COM port, measured concurrently
+        self.fixture_ports = []
+        self.fixture_driver = FixtureDriver()
+
+        # Serial timings are flushed to acquisition_metrics.json for cross-station comparison
+        self.metrics_flusher = MetricsFlusher()
+
+        # With INGEST_URL set the station works through the HTTP ingest service (spooling submits
+        # locally while it is down); with INGEST_ADDRESS set, submits go through the shared ingest
+        # process; otherwise everything goes straight to login.db
+        url = service_url()
+        self.service = ServiceClient(url) if url else None
+        address = ingest_address()
+        self.ingest = IngestClient(address) if address and not self.service else None
+        if self.service:
+            self.spool_pending = True  # Resend, and report, whatever an earlier session left in the spool
+            self.reported_failures = 0  # Rejected spooled submits the operator has been warned about
+            self.root.after(SPOOL_RETRY_MS, self.retry_spool)
+
+        # Spec limits are read once per part and reloaded only when the database changes
+        self.limits_cache = RemoteLimits(self.service) if self.service else LimitsCache()
 
         # === Top Bar with Username ===
         self.topbar = tk.Frame(self.root, height=50, bg="#0047AB")  # Updated color
@@ -52,6 +90,14 @@ class OperatorApp:
         )
         self.com_baud_button.pack(fill="x", padx=10, pady=8)
 
+        # Diagnostics Button in Sidebar (serial latency per port and command)
+        self.diagnostics_button = tk.Button(
+            self.sidebar, text="Diagnostics", font=("Arial", 10, "bold"),
+            bg="#5597F3", fg="white", relief="flat", height=2, 
+            command=self.open_diagnostics_popup
+        )
+        self.diagnostics_button.pack(fill="x", padx=10, pady=8)
+
         # Help and Support Button in Sidebar
         self.help_support_button = tk.Button(
             self.sidebar, text="Help and Support", font=("Arial", 10, "bold"),
@@ -114,6 +160,13 @@ class OperatorApp:
         )
         self.read_button.pack(side="left", padx=10)
 
+        # Read Fixtures Button (all configured fixtures in parallel)
+        self.fixtures_button = tk.Button(
+            self.fields_frame, text="Read Fixtures", font=("Arial", 12, "bold"),
+            bg="#0047ab", fg="white", command=self.read_fixtures
+        )
+        self.fixtures_button.pack(side="left", padx=5)
+
         # Random Button
         self.random_button = tk.Button(
             self.fields_frame, text="Random", font=("Arial", 12, "bold"),
@@ -121,6 +174,13 @@ class OperatorApp:
         )
         self.random_button.pack(side="left", padx=5)
 
+        # Stream Button (continuous capture for burn-in and drift tests)
+        self.stream_button = tk.Button(
+            self.fields_frame, text="Stream", font=("Arial", 12, "bold"),
+            bg="#6c757d", fg="white", command=self.open_stream_popup
+        )
+        self.stream_button.pack(side="left", padx=5)
+
         self.populate_components()  # Populate components on initialization
 
         # === Table Area ===
@@ -183,6 +243,15 @@ class OperatorApp:
     def logout_user(self):
         confirm = messagebox.askyesno("Logout", "Are you sure you want to log out?")
         if confirm:
+            self.worker.stop()
+            self.fixture_driver.close()
+            self.metrics_flusher.stop()
+            self.limits_cache.close()
+            if self.ingest:
+                self.ingest.close()
+            if self.service:
+                self.service.close()
+            close_all_connections()  # Release the pooled serial ports
             self.root.destroy()
             os.system("python d:\\Engineering\\Manish\\manish\\login.py")  # Open login.py after logout
 
@@ -190,13 +259,14 @@ class OperatorApp:
         """Open a popup window for COM Port and Baud Rate settings."""
         popup = tk.Toplevel(self.root)
         popup.title("COM Port and Baud Rate Settings")
-        popup.geometry("400x300")
+        popup.geometry("500x520")
         popup.configure(bg="white")
 
         # COM Port Selection
         tk.Label(popup, text="COM Port:", font=("Arial", 12), bg="white").pack(pady=10)
         self.com_port_var = tk.StringVar(value="Select COM Port")
-        self.com_port_dropdown = ttk.Combobox(popup, textvariable=self.com_port_var, state="readonly", width=30)
+        # Editable so a simulator port (/dev/pts/N or socket://host:port) can be typed in
+        self.com_port_dropdown = ttk.Combobox(popup, textvariable=self.com_port_var, width=45)
         self.com_port_dropdown.pack(pady=5)
         self.refresh_com_ports()
 
@@ -206,6 +276,21 @@ class OperatorApp:
         self.baud_rate_entry = tk.Entry(popup, textvariable=self.baud_rate_var, width=30)
         self.baud_rate_entry.pack(pady=5)
 
+        # Fixture Ports (multi-select) for measuring several DUTs in parallel
+        tk.Label(popup, text="Fixture Ports (for Read Fixtures):", font=("Arial", 12), bg="white").pack(pady=(10, 5))
+        self.fixture_listbox = tk.Listbox(popup, selectmode="multiple", exportselection=False, height=6, width=45)
+        self.fixture_listbox.pack(pady=5)
+        for index, label in enumerate(self.com_port_dropdown["values"]):
+            self.fixture_listbox.insert("end", label)
+            if self.port_registry.device_for(label) in self.fixture_ports:
+                self.fixture_listbox.selection_set(index)
+
+        # Compound query toggle (turn off for meters that only accept one query per line)
+        tk.Checkbutton(
+            popup, text="Batch parameters into one query", variable=self.compound_queries_var,
+            font=("Arial", 11), bg="white"
+        ).pack(pady=5)
+
         # Save Button
         tk.Button(
             popup, text="Save", font=("Arial", 12, "bold"),
@@ -214,22 +299,35 @@ class OperatorApp:
 
     def save_com_baud_settings(self, popup):
         """Save the selected COM Port and Baud Rate settings."""
-        selected_com_port = self.com_port_var.get()
+        selected_com_port = self.port_registry.device_for(self.com_port_var.get())
         selected_baud_rate = self.baud_rate_var.get()
 
-        if selected_com_port == "Select COM Port" or not selected_baud_rate:
+        if selected_com_port in ("Select COM Port", "No COM Ports Available") or not selected_baud_rate:
             messagebox.showerror("Error", "Please select a valid COM Port and enter a Baud Rate.")
             return
 
+        # Drop the pooled handle for the old settings so the port is not held open
+        if self.selected_com_port and self.selected_baud_rate and \
+           (self.selected_com_port, self.selected_baud_rate) != (selected_com_port, selected_baud_rate):
+            close_connection(self.selected_com_port, self.selected_baud_rate)
+        reset_compound()  # The instruments behind the ports may have changed too
+
         self.selected_com_port = selected_com_port
         self.selected_baud_rate = selected_baud_rate
-
-        messagebox.showinfo("Success", f"Settings saved:\nCOM Port: {selected_com_port}\nBaud Rate: {selected_baud_rate}")
+        self.fixture_ports = [
+            self.port_registry.device_for(self.fixture_listbox.get(index)) for index in self.fixture_listbox.curselection()
+        ]
+
+        messagebox.showinfo(
+            "Success",
+            f"Settings saved:\nCOM Port: {selected_com_port}\nBaud Rate: {selected_baud_rate}\n"
+            f"Fixture Ports: {', '.join(self.fixture_ports) or 'None'}"
+        )
         popup.destroy()
 
     def refresh_com_ports(self):
-        """Refresh the COM port dropdown values dynamically."""
-        com_ports = [port.device for port in serial.tools.list_ports.comports()]
+        """Fill the COM port dropdown from the port registry cache (enumerated in the background)."""
+        com_ports = self.port_registry.labels()
         self.com_port_dropdown["values"] = com_ports
         if com_ports:
             self.com_port_var.set(com_ports[0])  # Set the first COM port as default
@@ -237,7 +335,7 @@ class OperatorApp:
             self.com_port_var.set("No COM Ports Available")
 
     def read_values(self):
-        """Read values from the serial port and add a row to the new entries table for all selected parameters."""
+        """Queue a measurement of all selected parameters; the row is added when the worker finishes."""
         part_number = self.part_number_var.get()
         component = self.component_name_var.get()
         selected_parameters = [param for param, var in self.parameter_vars.items() if var.get() == 1]
@@ -251,67 +349,128 @@ class OperatorApp:
             messagebox.showerror("Error", "Please set Communication and Baud Rate settings first.")
             return
 
+        # Refuse parameters the identified meter cannot measure before the DUT is connected
+        if not self.check_capabilities([self.selected_com_port], selected_parameters):
+            return
+
         # Determine the starting componentSerialNumber
         if self.tree_prev.get_children() and self.latest_serial_number == 0:
             self.latest_serial_number = int(self.tree_prev.item(self.tree_prev.get_children()[0], "values")[1])
 
         self.latest_serial_number += 1
+        serial_number = self.latest_serial_number
+        com_port, baud_rate = self.selected_com_port, self.selected_baud_rate
+
+        # The serial read and limit lookup run on the worker; the next DUT can be queued meanwhile
+        self.pending_reads += 1
+        self.update_progress()
+        self.worker.submit(
+            self.acquire_values, com_port, baud_rate, component, part_number, selected_parameters,
+            self.compound_queries_var.get(),
+            on_done=lambda result: self.finish_read(result, part_number, serial_number, component, selected_parameters),
+            on_error=lambda error: self.fail_read(error, part_number, selected_parameters, com_port, baud_rate)
+        )
 
-        # Open serial connection
-        try:
-            ser = connect_serial(self.selected_com_port, int(self.selected_baud_rate))
-            if not ser:
+    def read_fixtures(self):
+        """Measure every configured fixture in parallel and add one row per fixture."""
+        part_number = self.part_number_var.get()
+        component = self.component_name_var.get()
+        selected_parameters = [param for param, var in self.parameter_vars.items() if var.get() == 1]
+
+        if part_number == "Select Part Number" or component == "Select Component Name" or not selected_parameters:
+            messagebox.showerror("Error", "Please select valid Part Number, Component, and at least one Parameter.")
+            return
+
+        if not self.fixture_ports or not self.selected_baud_rate:
+            messagebox.showerror("Error", "Please select the fixture COM ports and Baud Rate in Communication settings first.")
+            return
+
+        if not self.check_capabilities(self.fixture_ports, selected_parameters):
+            return
+
+        # Determine the starting componentSerialNumber; each fixture gets its own DUT number
+        if self.tree_prev.get_children() and self.latest_serial_number == 0:
+            self.latest_serial_number = int(self.tree_prev.item(self.tree_prev.get_children()[0], "values")[1])
+
+        serial_numbers = {}
+        for port in self.fixture_ports:
+            self.latest_serial_number += 1
+            serial_numbers[port] = self.latest_serial_number
+        ports, baud_rate = list(self.fixture_ports), self.selected_baud_rate
+
+        self.pending_reads += 1
+        self.update_progress()
+        self.worker.submit(
+            self.acquire_fixtures, ports, baud_rate, component, part_number, selected_parameters,
+            self.compound_queries_var.get(),
+            on_done=lambda result: self.finish_fixtures(result, part_number, serial_numbers, component, selected_parameters, baud_rate),
+            on_error=lambda error: self.fail_read(error, part_number, selected_parameters, ", ".join(ports), baud_rate)
+        )
+
+    def check_capabilities(self, ports, parameters):
+        """Return False (after telling the operator) if an already identified meter cannot measure a parameter."""
+        for port in ports:
+            profile = cached_profile(port)
+            unsupported = unsupported_parameters(profile, parameters) if profile else []
+            if unsupported:
+                messagebox.showerror(
+                    "Unsupported Parameter",
+                    f"The {profile.name} on {port} cannot measure: {', '.join(unsupported)}. Untick them before reading."
+                )
+                return False
+        return True
+
+    def acquire_fixtures(self, ports, baud_rate, component, part_number, parameters, compound):
+        """Worker thread: measure all fixtures concurrently and look up the limits once."""
+        results = self.fixture_driver.measure(ports, baud_rate, parameters, compound=compound)
+        limits = self.limits_cache.limits_for(component, part_number, parameters)
+        return results, limits
+
+    def finish_fixtures(self, result, part_number, serial_numbers, component, selected_parameters, baud_rate):
+        """Tk thread: add a row for every fixture that answered and report the ones that failed."""
+        self.pending_reads -= 1
+        self.update_progress()
+        results, limits = result
+        for port, responses in results:
+            if isinstance(responses, Exception):
                 self.show_serial_error_popup(
-                    "Failed to connect to the serial port.",
-                    part_number, ", ".join(selected_parameters), self.selected_com_port, self.selected_baud_rate
+                    f"Error reading from serial port: {responses or 'timed out'}",
+                    part_number, ", ".join(selected_parameters), port, baud_rate
                 )
-                return
+                continue
+            self.add_measured_row(responses, limits, part_number, serial_numbers[port], component, selected_parameters, fixture=port)
+
+    def acquire_values(self, com_port, baud_rate, component, part_number, parameters, compound):
+        """Worker thread: read the instrument and look up the limits for each parameter."""
+        # Borrow the pooled serial connection (opened once, reused across DUTs); it raises if the port cannot be opened
+        try:
+            with borrow_connection(com_port, baud_rate) as ser:
+                # One query for all checked parameters, in the identified instrument's own commands
+                responses = measure_instrument(ser, parameters, compound=compound)
+        except ValueError:
+            raise  # A parameter the instrument cannot measure; nothing was read
         except Exception as e:
-            self.show_serial_error_popup(
-                f"Error opening serial port: {e}",
-                part_number, ", ".join(selected_parameters), self.selected_com_port, self.selected_baud_rate
-            )
-            return
+            raise RuntimeError(f"Error reading from serial port: {e}") from e
+
+        limits = self.limits_cache.limits_for(component, part_number, parameters)
+        return responses, limits
 
+    def finish_read(self, result, part_number, serial_number, component, selected_parameters):
+        """Tk thread: range-check a finished measurement and add it to the new entries table."""
+        self.pending_reads -= 1
+        self.update_progress()
+        responses, limits = result
+        self.add_measured_row(responses, limits, part_number, serial_number, component, selected_parameters)
+
+    def add_measured_row(self, responses, limits, part_number, serial_number, component, selected_parameters, fixture=""):
+        """Range-check one DUT's responses and, if all are in range, add its row to the new entries table."""
+        source = f" on {fixture}" if fixture else ""
         param_names = []
         param_values = []
         param_ranges = []
         for parameter in selected_parameters:
-            try:
-                if parameter.lower() == "voltage":
-                    response = send_command(ser, ":MEAS:VOLT?")
-                    value = response
-                elif parameter.lower() == "resistance":
-                    response = send_command(ser, ":MEAS:RES?")
-                    value = response
-                else:
-                    response = send_command(ser, f":MEAS:{parameter.upper()}?")
-                    value = response
-            except Exception as e:
-                self.show_serial_error_popup(
-                    f"Error reading from serial port: {e}",
-                    part_number, parameter, self.selected_com_port, self.selected_baud_rate
-                )
-                ser.close()
-                return
-
-            # --- Range check logic ---
-            min_val, max_val = None, None
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?", (component, part_number))
-                order_id_row = cursor.fetchone()
-                if order_id_row:
-                    order_id = order_id_row[0]
-                    # Use correct column names for your schema: low, high
-                    cursor.execute("SELECT low, high FROM parametersDetails WHERE orderId = ? AND parameterName = ?", (order_id, parameter))
-                    range_row = cursor.fetchone()
-                    if range_row:
-                        min_val, max_val = range_row
-                conn.close()
-            except Exception:
-                pass
+            value = responses[parameter]
+            min_val, max_val = limits[parameter]
 
             # Format range for display
             if min_val is not None and max_val is not None:
@@ -327,30 +486,25 @@ class OperatorApp:
             try:
                 measured_val = float(value)
                 if min_val is not None and measured_val < float(min_val):
-                    messagebox.showerror("Out of Range", f"Measured value {measured_val} for {parameter} is below minimum allowed {min_val}. Entry not added.")
-                    ser.close()
+                    messagebox.showerror("Out of Range", f"Measured value {measured_val} for {parameter}{source} is below minimum allowed {min_val}. Entry not added.")
                     return
                 if max_val is not None and measured_val > float(max_val):
-                    messagebox.showerror("Out of Range", f"Measured value {measured_val} for {parameter} is above maximum allowed {max_val}. Entry not added.")
-                    ser.close()
+                    messagebox.showerror("Out of Range", f"Measured value {measured_val} for {parameter}{source} is above maximum allowed {max_val}. Entry not added.")
                     return
             except Exception:
-                messagebox.showerror("Value Error", f"Could not convert measured value '{value}' for {parameter} to float for range checking. Entry not added.")
-                ser.close()
+                messagebox.showerror("Value Error", f"Could not convert measured value '{value}' for {parameter}{source} to float for range checking. Entry not added.")
                 return
 
             param_names.append(parameter)
             param_values.append(str(value))
 
-        ser.close()  # Close serial connection
-
         if param_names and param_values:
             # Add a single row with comma-separated parameter names, values, and ranges
             self.tree_new.insert(
                 "", 0,
                 values=(
                     part_number,
-                    self.latest_serial_number,
+                    serial_number,
                     component,
                     ",".join(param_names),
                     ",".join(param_values),
@@ -358,6 +512,23 @@ class OperatorApp:
                 )
             )
 
+    def fail_read(self, error, part_number, selected_parameters, com_port, baud_rate):
+        """Tk thread: report a measurement that failed on the worker."""
+        self.pending_reads -= 1
+        self.update_progress()
+        self.show_serial_error_popup(str(error), part_number, ", ".join(selected_parameters), com_port, baud_rate)
+
+    def update_progress(self):
+        """Show queued work on the Read and Submit buttons instead of freezing the window."""
+        if self.pending_reads:
+            self.read_button.config(text=f"Reading... ({self.pending_reads} queued)")
+        else:
+            self.read_button.config(text="Read Values")
+        if self.submitting:
+            self.submit_button.config(text="Submitting...", state="disabled")
+        else:
+            self.submit_button.config(text="Submit", state="normal")
+
     def show_serial_error_popup(self, error_message, part_number, parameter, com_port, baud_rate):
         """Show a popup with error details and selected values."""
         popup = tk.Toplevel(self.root)
@@ -394,57 +565,58 @@ class OperatorApp:
         part_number = self.part_number_var.get()
         component = self.component_name_var.get()  # Corrected variable name
 
-        # For checkboxes, get selected parameters as a comma-separated string
+        # For checkboxes, get the selected parameters
         selected_parameters = [param for param, var in self.parameter_vars.items() if var.get() == 1]
-        if selected_parameters:
-            parameter = ",".join(selected_parameters)
-        else:
-            parameter = ""
 
         # Avoid showing error during dropdown population
         if part_number in ["Select Part Number", "No Part Numbers Available"] or \
            component in ["Select Component Name", "No Components Available"] or \
-           not parameter:
+           not selected_parameters:
             return  # Do nothing if invalid values are selected
 
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-
-            # Fetch previous entries for the selected part number, component, and parameter
-            cursor.execute("""
-                SELECT orderId, componentSerialNumber, componentName, parameterName, value
-                FROM measuredValues
-                WHERE partNumber = ? AND componentName = ? AND parameterName = ?
-                ORDER BY componentSerialNumber DESC
-            """, (part_number, component, parameter))
-            rows = cursor.fetchall()
-            conn.close()
-
-            # Clear the previously fetched entries table and populate with previous entries
-            self.tree_prev.delete(*self.tree_prev.get_children())
-            for row in rows:
-                self.tree_prev.insert("", "end", values=row)
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error fetching previous entries: {e}")
+        self.worker.submit(
+            self.fetch_previous_entries, part_number, component, selected_parameters,
+            on_done=self.show_previous_entries,
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error fetching previous entries: {e}")
+        )
+
+    def fetch_previous_entries(self, part_number, component, parameters):
+        """Worker thread: fetch previous entries for the selected part number, component, and parameters."""
+        if self.service:
+            return self.service.previous_entries(part_number, component, parameters)
+        cursor = get_db_connection().cursor()
+        cursor.execute(*previous_entries_query(part_number, component, parameters))
+        rows = cursor.fetchall()
+        return rows
+
+    def show_previous_entries(self, rows):
+        """Tk thread: clear the previously fetched entries table and populate with previous entries."""
+        self.tree_prev.delete(*self.tree_prev.get_children())
+        for row in rows:
+            self.tree_prev.insert("", "end", values=row)
 
     def populate_components(self):
-        """Populate the Component Name dropdown."""
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT DISTINCT componentName FROM orders")
-            components = cursor.fetchall()
-            conn.close()
-
-            if components:
-                self.component_name_dropdown["values"] = [component[0] for component in components]
-                self.component_name_var.set("Select Component Name")
-            else:
-                self.component_name_dropdown["values"] = []
-                self.component_name_var.set("No Components Available")
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error fetching components: {e}")
+        """Populate the Component Name dropdown (looked up on the worker, as the service may be slow)."""
+        self.worker.submit(
+            self.fetch_components,
+            on_done=self.show_components,
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error fetching components: {e}")
+        )
+
+    def fetch_components(self):
+        """Worker thread: the component names that have orders."""
+        if self.service:
+            return self.service.components()
+        return [row[0] for row in get_db_connection().execute("SELECT DISTINCT componentName FROM orders")]
+
+    def show_components(self, components):
+        """Tk thread: fill the Component Name dropdown."""
+        if components:
+            self.component_name_dropdown["values"] = components
+            self.component_name_var.set("Select Component Name")
+        else:
+            self.component_name_dropdown["values"] = []
+            self.component_name_var.set("No Components Available")
 
     def display_part_number(self, event=None):
         """Populate the Part Number dropdown for the selected Component Name."""
@@ -454,21 +626,30 @@ class OperatorApp:
             self.part_number_var.set("Select Part Number")
             return
 
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT DISTINCT partNumber FROM orders WHERE componentName = ?", (component_name,))
-            part_numbers = cursor.fetchall()
-            conn.close()
-
-            if part_numbers:
-                self.part_number_dropdown["values"] = [part[0] for part in part_numbers]
-                self.part_number_var.set("Select Part Number")
-            else:
-                self.part_number_dropdown["values"] = []
-                self.part_number_var.set("No Part Numbers Available")
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error fetching part numbers: {e}")
+        self.worker.submit(
+            self.fetch_part_numbers, component_name,
+            on_done=lambda part_numbers: self.show_part_numbers(component_name, part_numbers),
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error fetching part numbers: {e}")
+        )
+
+    def fetch_part_numbers(self, component_name):
+        """Worker thread: the part numbers ordered for a component."""
+        if self.service:
+            return self.service.part_numbers(component_name)
+        return [row[0] for row in get_db_connection().execute(
+            "SELECT DISTINCT partNumber FROM orders WHERE componentName = ?", (component_name,)
+        )]
+
+    def show_part_numbers(self, component_name, part_numbers):
+        """Tk thread: fill the Part Number dropdown, unless another component was picked meanwhile."""
+        if self.component_name_var.get() != component_name:
+            return
+        if part_numbers:
+            self.part_number_dropdown["values"] = part_numbers
+            self.part_number_var.set("Select Part Number")
+        else:
+            self.part_number_dropdown["values"] = []
+            self.part_number_var.set("No Part Numbers Available")
 
     def populate_parameters(self, event=None):
         """Populate the Parameter checkboxes based on the selected Component Name and Part Number."""
@@ -484,34 +665,25 @@ class OperatorApp:
            part_number in ["Select Part Number", "No Part Numbers Available"]:
             return
 
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-
-            # Fetch the orderId based on the selected componentName and partNumber
-            cursor.execute("SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?", (component_name, part_number))
-            order_id = cursor.fetchone()
-
-            if not order_id:
-                conn.close()
-                return
+        # Loads the part's limits into the cache, so every read of this part is a dict lookup
+        self.worker.submit(
+            self.limits_cache.load, component_name, part_number,
+            on_done=lambda limits: self.show_parameters(component_name, part_number, list(limits)),
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error fetching parameters: {e}")
+        )
 
-            # Fetch parameters from parametersDetails table using the orderId
-            cursor.execute("SELECT parameterName FROM parametersDetails WHERE orderId = ?", (order_id[0],))
-            parameters = [row[0] for row in cursor.fetchall()]
-            conn.close()
-
-            if parameters:
-                for param in parameters:
-                    var = tk.IntVar()
-                    cb = tk.Checkbutton(self.parameter_checkboxes_frame, text=param, variable=var, bg="white")
-                    cb.pack(side="left", padx=2)
-                    self.parameter_vars[param] = var
-            else:
-                # No parameters available
-                pass
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error fetching parameters: {e}")
+    def show_parameters(self, component_name, part_number, parameters):
+        """Tk thread: add a checkbox per parameter, unless the selection changed meanwhile."""
+        if (self.component_name_var.get(), self.part_number_var.get()) != (component_name, part_number):
+            return
+        for widget in self.parameter_checkboxes_frame.winfo_children():
+            widget.destroy()
+        self.parameter_vars.clear()
+        for param in parameters:
+            var = tk.IntVar()
+            cb = tk.Checkbutton(self.parameter_checkboxes_frame, text=param, variable=var, bg="white")
+            cb.pack(side="left", padx=2)
+            self.parameter_vars[param] = var
 
         # After parameters are populated, refresh previous entries when any checkbox is selected
         # (Optional: you may want to trigger on checkbox click, or keep as manual after read)
@@ -525,79 +697,88 @@ class OperatorApp:
         if not messagebox.askyesno("Confirmation", "Are you sure you want to submit the new data?"):
             return
 
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-
-            # Create the table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS measuredValues (
-                    orderId TEXT NOT NULL,
-                    componentSerialNumber INTEGER NOT NULL,
-                    componentName TEXT NOT NULL,
-                    partNumber TEXT NOT NULL,
-                    parameterName TEXT NOT NULL,
-                    operatorName TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    time TEXT NOT NULL,
-                    value REAL NOT NULL,
-                    isValid TEXT NOT NULL,
-                    PRIMARY KEY (orderId, componentSerialNumber)
-                )
-            """)
-
-            # Fetch the maximum componentSerialNumber for each orderId
-            cursor.execute("""
-                SELECT orderId, MAX(componentSerialNumber) 
-                FROM measuredValues 
-                GROUP BY orderId
-            """)
-            max_serial_numbers = {row[0]: row[1] for row in cursor.fetchall()}
-
-            # Insert only rows from the new entries table
-            for row in self.tree_new.get_children():
-                values = self.tree_new.item(row, "values")
-                # Unpack only the first 5 columns (ignore the "Range" column)
-                order, _, component, parameter_names, measured_values = values[:5]
-
-                # Determine the next componentSerialNumber for the order
-                next_serial_number = max_serial_numbers.get(order, 0) + 1
-                max_serial_numbers[order] = next_serial_number
-
-                # Placeholder logic for validity (replace with actual logic based on uploaded image)
-                try:
-                    is_valid = "Valid" if all(float(val) > 0.5 for val in measured_values.split(",")) else "Invalid"
-                except Exception:
-                    is_valid = "Invalid"
-
-                # Insert the row into the database (parameterName and value as comma-separated)
-                cursor.execute("""
-                    INSERT INTO measuredValues (orderId, componentSerialNumber, componentName, partNumber, parameterName, operatorName, date, time, value, isValid)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    order,
-                    next_serial_number,
-                    component,
-                    self.part_number_var.get(),  # Store the part number properly
-                    parameter_names,
-                    self.operator_name,
-                    datetime.date.today().strftime("%Y-%m-%d"),
-                    datetime.datetime.now().strftime("%H:%M:%S"),
-                    measured_values,
-                    is_valid
-                ))
-
-            conn.commit()
-            conn.close()
+        # Snapshot the rows now; rows read while the submit is running stay in the table
+        items = self.tree_new.get_children()
+        rows = [self.tree_new.item(item, "values") for item in items]
 
-            messagebox.showinfo("Success", "New data submitted successfully.")
-            self.tree_new.delete(*self.tree_new.get_children())  # Clear the new entries table after submission
+        self.submitting = True
+        self.update_progress()
+        self.worker.submit(
+            self.store_rows, rows, self.part_number_var.get(), self.operator_name,
+            on_done=lambda serial_numbers: self.finish_submit(items, serial_numbers),
+            on_error=self.fail_submit
+        )
 
-            # Call populate_previous_entries to refresh the previously fetched entries table
-            self.populate_previous_entries()
+    def store_rows(self, rows, part_number, operator_name):
+        """Worker thread: store the submitted rows as units with one measurement per parameter."""
+        units = []
+        for values in rows:
+            # Unpack only the first 5 columns (ignore the "Range" column)
+            order, _, component, parameter_names, measured_values = values[:5]
 
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error submitting data: {e}")
+            # Placeholder logic for validity (replace with actual logic based on uploaded image)
+            try:
+                is_valid = "Valid" if all(float(val) > 0.5 for val in measured_values.split(",")) else "Invalid"
+            except Exception:
+                is_valid = "Invalid"
+
+            units.append((order, component, part_number, is_valid, list(zip(parameter_names.split(","), measured_values.split(",")))))
+
+        # Serial numbers are allocated atomically in the same transaction as the inserts
+        date = datetime.date.today().strftime("%Y-%m-%d")
+        time = datetime.datetime.now().strftime("%H:%M:%S")
+        if self.service:
+            return self.service.submit(units, operator_name, date, time)  # None if spooled for later
+        if self.ingest:
+            return self.ingest.submit(units, operator_name, date, time)
+        return store_units(units, operator_name, date, time)
+
+    def finish_submit(self, items, serial_numbers):
+        """Tk thread: clear the submitted rows once the worker has committed (or spooled) them."""
+        self.submitting = False
+        self.update_progress()
+        if serial_numbers is None:
+            self.spool_pending = True
+            messagebox.showwarning(
+                "Saved Locally",
+                "The ingest service is not reachable or could not store the data right now. "
+                "The data was saved on this station and will be sent automatically."
+            )
+        else:
+            messagebox.showinfo("Success", "New data submitted successfully.")
+        self.tree_new.delete(*[item for item in items if self.tree_new.exists(item)])
+
+        # Call populate_previous_entries to refresh the previously fetched entries table
+        self.populate_previous_entries()
+
+    def retry_spool(self):
+        """Tk thread: every SPOOL_RETRY_MS, resend submits spooled while the ingest service was down."""
+        if self.spool_pending:
+            self.worker.submit(
+                lambda: (self.service.flush(), self.service.failed()),
+                on_done=self.finish_retry_spool,
+                on_error=lambda e: print(f"Resending spooled submits failed: {e}")
+            )
+        self.root.after(SPOOL_RETRY_MS, self.retry_spool)
+
+    def finish_retry_spool(self, result):
+        """Tk thread: warn once about every spooled submit the service rejected; those are never resent."""
+        pending, failed = result
+        self.spool_pending = pending > 0
+        if len(failed) > self.reported_failures:
+            self.reported_failures = len(failed)
+            messagebox.showwarning(
+                "Submits Not Saved",
+                f"{len(failed)} submit(s) saved on this station were rejected by the ingest service "
+                f"and have not been stored:\n{failed[-1][1]}\n\n"
+                f"They are kept in {self.service.spool_path}. Please contact your supervisor."
+            )
+
+    def fail_submit(self, error):
+        """Tk thread: report a submit that failed on the worker."""
+        self.submitting = False
+        self.update_progress()
+        messagebox.showerror("Database Error", f"Error submitting data: {error}")
 
     def toggle_sidebar(self):
         """Toggle the visibility of the sidebar."""
@@ -610,6 +791,40 @@ class OperatorApp:
             # self.toggle_sidebar_button.config(text="←")  # Optionally change icon if you want
             # Do not move the toggle button, keep it at (0,0)
 
+    def open_diagnostics_popup(self):
+        """Open a popup showing rolling serial latency statistics per port and command."""
+        popup = tk.Toplevel(self.root)
+        popup.title("Serial Diagnostics")
+        popup.geometry("1200x400")
+        popup.configure(bg="white")
+
+        columns = ["Port", "Command", "Count", "Errors", "Mean ms", "P50 ms", "P95 ms", "Max ms",
+                   "Write ms", "First Byte ms", "Bytes Out", "Bytes In", "Histogram"]
+        tree = ttk.Treeview(popup, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=80, anchor="center")
+        tree.column("Command", width=200)
+        tree.column("Histogram", width=260, anchor="w")
+        tree.tag_configure("errors", foreground="red")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def refresh():
+            if not popup.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for row in metrics_snapshot():
+                histogram = " ".join(f"{bucket}:{count}" for bucket, count in row["histogram"].items() if count)
+                tree.insert("", "end", values=(
+                    row["port"], row["command"], row["count"], row["errors"],
+                    f"{row['mean_ms']:.1f}", f"{row['p50_ms']:.1f}", f"{row['p95_ms']:.1f}", f"{row['max_ms']:.1f}",
+                    f"{row['write_ms']:.2f}", f"{row['first_byte_ms']:.1f}", row["bytes_written"], row["bytes_read"],
+                    histogram
+                ), tags=("errors",) if row["errors"] else ())
+            popup.after(DIAGNOSTICS_REFRESH_MS, refresh)
+
+        refresh()
+
     def open_help_support(self):
         """Open a popup window for Help and Support."""
         popup = tk.Toplevel(self.root)
@@ -629,8 +844,6 @@ class OperatorApp:
 
     def generate_random_values(self):
         """Generate random values for all selected parameters and add a row to the new entries table."""
-        import random
-
         part_number = self.part_number_var.get()
         component = self.component_name_var.get()
         selected_parameters = [param for param, var in self.parameter_vars.items() if var.get() == 1]
@@ -644,27 +857,23 @@ class OperatorApp:
             self.latest_serial_number = int(self.tree_prev.item(self.tree_prev.get_children()[0], "values")[1])
 
         self.latest_serial_number += 1
+        serial_number = self.latest_serial_number
+
+        # Limits are looked up on the worker so the window stays responsive
+        self.worker.submit(
+            self.limits_cache.limits_for, component, part_number, selected_parameters,
+            on_done=lambda limits: self.finish_random(limits, part_number, serial_number, component, selected_parameters)
+        )
+
+    def finish_random(self, limits, part_number, serial_number, component, selected_parameters):
+        """Tk thread: generate the random values once the limits are known."""
+        import random
 
         param_names = []
         param_values = []
         param_ranges = []
         for parameter in selected_parameters:
-            min_val, max_val = None, None
-            # Use correct column names for your schema: low, high
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?", (component, part_number))
-                order_id_row = cursor.fetchone()
-                if order_id_row:
-                    order_id = order_id_row[0]
-                    cursor.execute("SELECT low, high FROM parametersDetails WHERE orderId = ? AND parameterName = ?", (order_id, parameter))
-                    range_row = cursor.fetchone()
-                    if range_row:
-                        min_val, max_val = range_row
-                conn.close()
-            except Exception:
-                pass
+            min_val, max_val = limits[parameter]
 
             # Format range for display
             if min_val is not None and max_val is not None:
@@ -695,7 +904,7 @@ class OperatorApp:
                 "", 0,
                 values=(
                     part_number,
-                    self.latest_serial_number,
+                    serial_number,
                     component,
                     ",".join(param_names),
                     ",".join(param_values),
@@ -703,6 +912,152 @@ class OperatorApp:
                 )
             )
 
+    def open_stream_popup(self):
+        """Open a popup that samples the selected parameters continuously (burn-in and drift tests)."""
+        part_number = self.part_number_var.get()
+        component = self.component_name_var.get()
+        selected_parameters = [param for param, var in self.parameter_vars.items() if var.get() == 1]
+
+        if part_number == "Select Part Number" or component == "Select Component Name" or not selected_parameters:
+            messagebox.showerror("Error", "Please select valid Part Number, Component, and at least one Parameter.")
+            return
+
+        if not self.selected_com_port or not self.selected_baud_rate:
+            messagebox.showerror("Error", "Please set Communication and Baud Rate settings first.")
+            return
+
+        popup = tk.Toplevel(self.root)
+        popup.title("Streaming Capture")
+        popup.geometry("1000x400")
+        popup.configure(bg="white")
+
+        controls = tk.Frame(popup, bg="white")
+        controls.pack(fill="x", padx=10, pady=10)
+        tk.Label(controls, text="Rate (samples/s):", font=("Arial", 12), bg="white").pack(side="left", padx=5)
+        rate_var = tk.StringVar(value=str(DEFAULT_RATE_HZ))
+        tk.Entry(controls, textvariable=rate_var, width=8).pack(side="left", padx=5)
+        start_button = tk.Button(controls, text="Start", font=("Arial", 12, "bold"), bg="#28a745", fg="white")
+        start_button.pack(side="left", padx=10)
+        summary_button = tk.Button(
+            controls, text="Add Summary Row", font=("Arial", 12, "bold"), bg="#0047ab", fg="white", state="disabled"
+        )
+        summary_button.pack(side="left", padx=10)
+        status_label = tk.Label(controls, text="Stopped", font=("Arial", 11), bg="white")
+        status_label.pack(side="left", padx=10)
+
+        columns = ["Parameter", "Last", "Mean", "Window Mean", "Min", "Max", "Std Dev", "Samples", "Violations"]
+        tree = ttk.Treeview(popup, columns=columns, show="headings", height=len(selected_parameters))
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=100, anchor="center")
+        tree.tag_configure("violation", foreground="red")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        rows = {parameter: tree.insert("", "end", values=(parameter,)) for parameter in selected_parameters}
+
+        state = {"capture": None, "limits": {}}
+
+        def refresh():
+            capture = state["capture"]
+            if capture is None or not popup.winfo_exists():
+                return
+            for parameter, stats in capture.snapshot().items():
+                if not stats["count"]:
+                    continue
+                tree.item(rows[parameter], values=(
+                    parameter, stats["last"], f"{stats['mean']:.6g}", f"{stats['window_mean']:.6g}",
+                    stats["min"], stats["max"], f"{stats['std_dev']:.4g}", stats["count"], stats["violations"]
+                ), tags=("violation",) if stats["violations"] else ())
+            if capture.running:
+                status_label.config(text=f"Running at {capture.achieved_rate():.1f} samples/s", fg="black")
+                popup.after(STREAM_REFRESH_MS, refresh)
+            else:
+                start_button.config(text="Start", bg="#28a745", command=start)
+                summary_button.config(state="normal")
+                if capture.error is not None:
+                    status_label.config(text=f"Stopped: {capture.error}", fg="red")
+                else:
+                    status_label.config(text="Stopped", fg="black")
+
+        def begin(limits):
+            try:
+                rate = float(rate_var.get())
+                if rate <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "Please enter a sample rate greater than zero.", parent=popup)
+                start_button.config(state="normal")
+                return
+            state["limits"] = limits
+            state["capture"] = StreamCapture(
+                self.selected_com_port, self.selected_baud_rate, selected_parameters, limits,
+                rate_hz=rate, compound=self.compound_queries_var.get()
+            )
+            state["capture"].start()
+            start_button.config(text="Stop", bg="#dc3545", state="normal", command=stop)
+            summary_button.config(state="disabled")
+            refresh()
+
+        def start():
+            # Limits come from the database, so look them up on the worker first
+            start_button.config(state="disabled")
+            self.worker.submit(
+                self.limits_cache.limits_for, component, part_number, selected_parameters,
+                on_done=begin, on_error=fail_limits
+            )
+
+        def fail_limits(error):
+            start_button.config(state="normal")
+            messagebox.showerror("Error", f"Could not load the limits for {part_number}:\n{error}", parent=popup)
+
+        def stop():
+            if state["capture"] is not None:
+                state["capture"].stop()
+
+        def add_summary_row():
+            """Add the mean of each parameter as one row; only this summary is committed on Submit."""
+            capture = state["capture"]
+            snapshot = capture.snapshot()
+            if not all(stats["count"] for stats in snapshot.values()):
+                messagebox.showerror("Error", "No samples were captured.", parent=popup)
+                return
+
+            param_ranges = []
+            for parameter in selected_parameters:
+                min_val, max_val = state["limits"].get(parameter, (None, None))
+                if min_val is not None and max_val is not None:
+                    param_ranges.append(f"{min_val} - {max_val}")
+                elif min_val is not None:
+                    param_ranges.append(f"{min_val} - ")
+                elif max_val is not None:
+                    param_ranges.append(f" - {max_val}")
+                else:
+                    param_ranges.append("")
+
+            if self.tree_prev.get_children() and self.latest_serial_number == 0:
+                self.latest_serial_number = int(self.tree_prev.item(self.tree_prev.get_children()[0], "values")[1])
+            self.latest_serial_number += 1
+
+            self.tree_new.insert(
+                "", 0,
+                values=(
+                    part_number,
+                    self.latest_serial_number,
+                    component,
+                    ",".join(selected_parameters),
+                    ",".join(f"{snapshot[parameter]['mean']:.6g}" for parameter in selected_parameters),
+                    ",".join(param_ranges)
+                )
+            )
+            summary_button.config(state="disabled")
+
+        def close():
+            stop()
+            popup.destroy()
+
+        start_button.config(command=start)
+        summary_button.config(command=add_summary_row)
+        popup.protocol("WM_DELETE_WINDOW", close)
+
 if __name__ == "__main__":
     # Fetch username and name from command-line arguments
     logged_in_user = "Shiv"
@@ -715,7 +1070,8 @@ if __name__ == "__main__":
     else:
         logged_in_user = sys.argv[1]
         logged_in_name = sys.argv[2]
-    
+
+    migrate()  # Bring the schema up to date if this screen was started without the login window
     root = tk.Tk()
     app = OperatorApp(root, logged_in_user, logged_in_name)
     root.mainloop()
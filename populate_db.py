@@ -1,40 +1,21 @@
-import sqlite3
-import os
-import sys  # Ensure sys is imported
+from db import transaction
+from migrations import migrate
 
-# Update database path to handle PyInstaller's temporary directory
-if getattr(sys, 'frozen', False):  # Check if running as a PyInstaller bundle
-    BASE_DIR = sys._MEIPASS  # Temporary directory created by PyInstaller
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Create the tables if this is a new database
+migrate()
 
-DB_PATH = os.path.join(BASE_DIR, "login.db")
+# Connect to the database; everything below is written in one transaction
+with transaction() as conn:
+    cursor = conn.cursor()
 
-# Connect to the database
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
+    # Insert initial user data
+    users = [
+        ("Admin User", "admin", "admin123", "admin"),
+        ("Supervisor User", "supervisor", "supervisor123", "supervisor"),
+        ("Manufacturer User", "manufacturer", "manufacturer123", "manufacturer"),
+        ("Operator User", "operator", "operator123", "operator"),
+    ]
 
-# Create the users table if it doesn't exist
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        employee_type TEXT NOT NULL
-    )
-""")
-
-# Insert initial user data
-users = [
-    ("Admin User", "admin", "admin123", "admin"),
-    ("Supervisor User", "supervisor", "supervisor123", "supervisor"),
-    ("Manufacturer User", "manufacturer", "manufacturer123", "manufacturer"),
-    ("Operator User", "operator", "operator123", "operator"),
-]
-
-cursor.executemany("INSERT OR IGNORE INTO users (name, username, password, employee_type) VALUES (?, ?, ?, ?)", users)
-conn.commit()
-conn.close()
+    cursor.executemany("INSERT OR IGNORE INTO users (name, username, password, employee_type) VALUES (?, ?, ?, ?)", users)
 
 print("Database populated successfully.")
@@ -0,0 +1,90 @@
+import threading
+
+import serial.tools.list_ports
+
+POLL_INTERVAL_S = 2.0  # How often the watcher re-enumerates to catch plug and unplug events
+FIRST_SCAN_WAIT_S = 3.0  # Longest a popup waits if it opens before the first enumeration finishes
+
+
+class PortRegistry:
+    """Cache of the machine's serial ports, kept current by a background hot-plug watcher.
+
+    comports() can take a second or more on machines with many virtual ports, so it
+    only ever runs on the watcher thread; popups read the cached list instantly.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL_S):
+        self.interval = interval
+        self._ports = []  # serial.tools.list_ports ListPortInfo objects, sorted by device
+        self._lock = threading.Lock()
+        self._scanned = threading.Event()
+        self._wake = threading.Event()
+        self.thread = threading.Thread(target=self._watch, name="port-watcher", daemon=True)
+        self.thread.start()
+
+    def ports(self):
+        """Return the cached ports (waits only if the very first scan is still running)."""
+        self._scanned.wait(FIRST_SCAN_WAIT_S)
+        with self._lock:
+            return list(self._ports)
+
+    def devices(self):
+        return [port.device for port in self.ports()]
+
+    def labels(self):
+        """Return display labels with description and USB VID:PID, e.g. 'COM3 - USB Serial Port [VID:PID 0403:6001]'."""
+        return [port_label(port) for port in self.ports()]
+
+    def device_for(self, label):
+        """Map a label from labels() back to its device name; anything else (a typed port or URL) is returned as is."""
+        for port in self.ports():
+            if port_label(port) == label:
+                return port.device
+        return label
+
+    def refresh(self):
+        """Ask the watcher to re-enumerate now instead of at its next interval."""
+        self._wake.set()
+
+    def _watch(self):
+        while True:
+            try:
+                ports = sorted(serial.tools.list_ports.comports(), key=lambda port: port.device)
+            except Exception as e:
+                print(f"Failed to enumerate COM ports: {e}")
+                ports = None
+            if ports is not None:
+                with self._lock:
+                    previous = {port.device for port in self._ports}
+                    self._ports = ports
+                current = {port.device for port in ports}
+                if self._scanned.is_set() and current != previous:
+                    for device in sorted(current - previous):
+                        print(f"COM port plugged in: {device}")
+                    for device in sorted(previous - current):
+                        print(f"COM port unplugged: {device}")
+            self._scanned.set()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def port_label(port):
+    label = port.device
+    if port.description and port.description != "n/a" and port.description != port.device:
+        label += f" - {port.description}"
+    if port.vid is not None and port.pid is not None:
+        label += f" [VID:PID {port.vid:04X}:{port.pid:04X}]"
+    return label
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide registry, starting its watcher on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PortRegistry()
+        return _registry
@@ -0,0 +1,134 @@
+"""One report engine for the manufacturer and supervisor screens.
+
+A report is a ReportFilter (the report popups' start, end, operator and part
+number fields) and a projection: the long format, one row per measured
+parameter, or a list of columns pivoted to one row per unit. open_report builds
+the SQL for either and keeps the resulting PagedQuery, with its row count, page
+bookmarks and cached rows, until the database changes, so reopening a report or
+saving it again does not repeat work that has already been done.
+"""
+from collections import OrderedDict, namedtuple
+
+from archive import archive_dir, months_for_range
+from db import get_connection
+from measurements import LONG_FORMAT_FROM, LONG_FORMAT_KEY, LONG_FORMAT_SELECT, UNIT_KEY, pivot_select, unit_filters
+from virtual_table import PagedQuery
+
+REPORT_CACHE_SIZE = 8  # Reports kept per connection (most recently opened)
+
+# The report popups' filter fields; empty fields are not applied
+ReportFilter = namedtuple("ReportFilter", ["start_date", "end_date", "operator", "part_number"], defaults=("", "", "", ""))
+
+LONG_FORMAT = None  # Projection of one row per measured parameter (measurements.LONG_FORMAT_SELECT)
+
+
+def data_version(conn):
+    """Changes whenever the database does.
+
+    PRAGMA data_version changes when another connection commits and total_changes
+    when this one writes, e.g. the manufacturer saving the user database columns.
+    """
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+class ReportCache:
+    """A connection's open reports and lookups, emptied as soon as the database changes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.version = None
+        self.reports = OrderedDict()  # Report key -> PagedQuery
+        self.user_columns = None
+        self.choices = None
+        self.parameters = None
+
+    def check(self):
+        version = data_version(self.conn)
+        if version != self.version:
+            self.reports.clear()
+            self.user_columns = None
+            self.choices = None
+            self.parameters = None
+            self.version = version
+        return self
+
+
+_caches = {}  # Connection -> ReportCache
+
+
+def _cache(conn):
+    if conn not in _caches:
+        _caches[conn] = ReportCache(conn)
+    return _caches[conn].check()
+
+
+def report_sql(spec, columns=LONG_FORMAT):
+    """Return (select, select_params, source, where, params, key) for a report, with {schema} placeholders.
+
+    Raises ValueError if the filter's dates cannot be parsed (see measurements.parse_datetime).
+    """
+    where, params = unit_filters(*spec)
+    if columns is LONG_FORMAT:
+        return LONG_FORMAT_SELECT, [], LONG_FORMAT_FROM, where, params, LONG_FORMAT_KEY
+    select, select_params = pivot_select(columns, "{schema}")
+    return select, select_params, " FROM {schema}.units u", where, params, UNIT_KEY
+
+
+def open_report(spec, columns=LONG_FORMAT, archives=True, conn=None):
+    """Return the PagedQuery for a report, reusing the one opened before if nothing has changed since.
+
+    With archives=False only the live tables are read, as in the database windows.
+    Raises ValueError for unparseable dates and sqlite3.Error if the count fails.
+    """
+    conn = conn or get_connection()
+    cache = _cache(conn)
+    select, select_params, source, where, params, key = report_sql(spec, columns)
+    months = months_for_range(spec.start_date, spec.end_date, archive_dir(conn)) if archives else []
+    # Keyed on the parsed filters, so "2025-06-01" and "2025-06-01 00:00" share a report
+    report_key = (select, tuple(select_params), source, where, tuple(params), tuple(months))
+    if report_key in cache.reports:
+        cache.reports.move_to_end(report_key)
+        return cache.reports[report_key]
+
+    query = PagedQuery(
+        select, source, where, params, key, select_params=select_params,
+        start_date=spec.start_date, end_date=spec.end_date, archives=archives, conn=conn
+    )
+    cache.reports[report_key] = query
+    if len(cache.reports) > REPORT_CACHE_SIZE:
+        cache.reports.popitem(last=False)
+    return query
+
+
+def user_columns(conn=None):
+    """The columns picked in the manufacturer's User Database window."""
+    conn = conn or get_connection()
+    cache = _cache(conn)
+    if cache.user_columns is None:
+        cache.user_columns = [row[0] for row in conn.execute("SELECT column_name FROM user_database")]
+    return cache.user_columns
+
+
+def filter_choices(conn=None):
+    """Return (operator names, part numbers) for the report popups' dropdowns.
+
+    Read from unitSummary, which is a few rows per day rather than one per unit and
+    also covers the archived months a report can reach.
+    """
+    conn = conn or get_connection()
+    cache = _cache(conn)
+    if cache.choices is None:
+        cache.choices = (
+            [row[0] for row in conn.execute("SELECT DISTINCT operatorName FROM unitSummary ORDER BY 1")],
+            [row[0] for row in conn.execute("SELECT DISTINCT partNumber FROM unitSummary ORDER BY 1")],
+        )
+    return cache.choices
+
+
+def parameter_names(conn=None):
+    """Every parameter name that has been measured, live or archived, for the User Database window."""
+    conn = conn or get_connection()
+    cache = _cache(conn)
+    if cache.parameters is None:
+        cache.parameters = [row[0] for row in conn.execute("SELECT DISTINCT parameterName FROM measurementSummary ORDER BY 1")]
+    return cache.parameters
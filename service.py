@@ -0,0 +1,414 @@
+"""HTTP/JSON ingest service for stations that cannot share login.db directly.
+
+The service owns the database: it group-commits measurement batches through the
+ingest writer and serves the dropdowns, spec limits and previous entries back.
+Stations use it when INGEST_URL is set (e.g. http://server:6280); if it cannot be
+reached, their submits go to a local spool file and are resent, oldest first,
+as soon as it answers again. Each submit carries a request id, so a resend of
+a batch that was committed but never acknowledged is not stored twice.
+
+The service listens on 127.0.0.1 unless --host says otherwise. Any other host
+needs a shared token in INGEST_TOKEN on the server and every station; requests
+without it are refused.
+
+    python service.py                          # serve login.db on 127.0.0.1:6280
+    INGEST_TOKEN=... python service.py --host 0.0.0.0   # serve the line's stations
+    python service.py --load-test 8            # 8 client processes, with an outage, on one machine
+"""
+import argparse
+import hmac
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from db import DB_PATH, connect
+from ingest import GroupCommitWriter, is_loopback
+from limits import LimitsCache
+from measurements import previous_entries_query
+from migrations import migrate
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 6280
+TOKEN_HEADER = "X-Ingest-Token"
+REQUEST_TIMEOUT_S = 5  # A station gives up on the service and spools after this long
+LIMITS_TTL_S = 10  # How long a station reuses limits fetched from the service
+SPOOL_PATH = os.path.join(os.path.dirname(DB_PATH), "ingest_spool.db")
+
+
+def service_url():
+    """Return INGEST_URL, or None if stations should not use the service."""
+    return os.environ.get("INGEST_URL") or None
+
+
+def service_token():
+    """The shared token from INGEST_TOKEN, or None if it is not set."""
+    return os.environ.get("INGEST_TOKEN") or None
+
+
+class ServiceError(Exception):
+    """The service answered but refused the request.
+
+    status is the HTTP status: 4xx for a request that will never succeed (bad
+    data, wrong token), 5xx for a database failure that may pass if retried.
+    """
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so a station reuses one connection
+
+    def authorized(self):
+        """Check the shared token, if the server has one; replies 401 and returns False otherwise."""
+        token = self.server.token
+        if token is None or hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode(), token.encode()):
+            return True
+        self.reply(401, {"error": "Missing or wrong ingest token"})
+        return False
+
+    def previous_entries(self, query):
+        # The station sends the selected parameters comma-joined, as the old measuredValues rows held them
+        sql, params = previous_entries_query(query["partNumber"], query["component"], query["parameter"].split(","))
+        return self.server.read_rows(sql, *params)
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        routes = {
+            "/health": lambda: {"status": "ok"},
+            "/components": lambda: {"components": self.server.read(
+                "SELECT DISTINCT componentName FROM orders")},
+            "/part-numbers": lambda: {"partNumbers": self.server.read(
+                "SELECT DISTINCT partNumber FROM orders WHERE componentName = ?", query["component"])},
+            "/limits": lambda: {"limits": [
+                [parameter, low, high] for parameter, (low, high)
+                in self.server.limits.load(query["component"], query["partNumber"]).items()
+            ]},
+            "/previous": lambda: {"rows": self.previous_entries(query)},
+        }
+        if url.path not in routes:
+            self.reply(404, {"error": f"Unknown path {url.path}"})
+            return
+        try:
+            self.reply(200, routes[url.path]())
+        except KeyError as e:
+            self.reply(400, {"error": f"Missing query parameter {e}"})
+        except sqlite3.Error as e:
+            self.reply(500, {"error": str(e)})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if self.path != "/submit":
+            self.reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            units = [(order, component, part, valid, [tuple(pair) for pair in values])
+                     for order, component, part, valid, values in body["units"]]
+            args = (units, body["operatorName"], body["date"], body["time"], body.get("requestId"))
+        except (ValueError, KeyError, TypeError) as e:
+            self.reply(400, {"error": f"Malformed submit: {e}"})
+            return
+        status, result = self.server.writer.submit(*args)
+        if status == "ok":
+            self.reply(200, {"serialNumbers": result})
+        elif status == "invalid":
+            self.reply(422, {"error": result})  # The batch itself is bad; resending it cannot help
+        else:
+            self.reply(503, {"error": result})  # Database locked, disk full...; the station retries
+
+    def reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per submit would drown the console
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64  # A whole shift of stations reconnecting at once
+
+    def __init__(self, address, db_path=DB_PATH, token=None):
+        if token is None and not is_loopback(address[0]):
+            raise ValueError(f"Set INGEST_TOKEN to listen on {address[0]}; without a token only loopback addresses are allowed")
+        super().__init__(address, ServiceHandler)
+        self.token = token
+        self.writer = GroupCommitWriter(db_path)
+        self.limits = LimitsCache(db_path)
+        self.reader = connect(db_path, check_same_thread=False)
+        self.reader_lock = threading.Lock()
+
+    def read_rows(self, sql, *params):
+        with self.reader_lock:
+            return [list(row) for row in self.reader.execute(sql, params).fetchall()]
+
+    def read(self, sql, *params):
+        return [row[0] for row in self.read_rows(sql, *params)]
+
+
+class ServiceClient:
+    """A station's connection to the service, with a local spool for submits made while it is down."""
+
+    def __init__(self, url, spool_path=SPOOL_PATH, timeout=REQUEST_TIMEOUT_S, token=None):
+        url = urlparse(url)
+        self.host, self.port = url.hostname, url.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        token = token or service_token()
+        if token:
+            self.headers[TOKEN_HEADER] = token
+        self.lock = threading.Lock()  # One request at a time on the keep-alive connection
+        self.http = None
+        self.spool_path = spool_path
+        self.spool = sqlite3.connect(spool_path, check_same_thread=False, isolation_level=None)
+        self.spool.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY,
+                requestId TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                error TEXT
+            )
+        """)
+        self.cache = {}  # GET path -> last answer, for dropdowns and limits while offline
+
+    def request(self, method, path, payload=None):
+        """Send one request and return the decoded answer.
+
+        Raises ConnectionError if the service cannot be reached and ServiceError
+        if it refused the request.
+        """
+        body = json.dumps(payload).encode() if payload is not None else None
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.http is None:
+                        self.http = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                    self.http.request(method, path, body, self.headers)
+                    response = self.http.getresponse()
+                    answer = json.loads(response.read())
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    # A dropped keep-alive connection is retried once on a fresh one
+                    self.http.close()
+                    self.http = None
+                    if attempt:
+                        raise ConnectionError(f"Ingest service at {self.host}:{self.port} is not reachable: {e}") from e
+        if response.status != 200:
+            raise ServiceError(answer.get("error", f"HTTP {response.status}"), response.status)
+        return answer
+
+    def get(self, path, **query):
+        """GET with the last good answer as fallback while the service is unreachable."""
+        path = f"{path}?{urlencode(query)}" if query else path
+        try:
+            self.cache[path] = self.request("GET", path)
+        except ConnectionError:
+            if path not in self.cache:
+                raise
+        return self.cache[path]
+
+    def submit(self, units, operator_name, date, time_):
+        """Send a submit (as measurements.store_units takes it) and return its serial numbers.
+
+        Returns None if the service is unreachable, failed to store the submit (5xx)
+        or still has older spooled submits to catch up on; the submit is then spooled
+        and sent later by flush(). Raises ServiceError if the service rejected it (4xx).
+        """
+        payload = {
+            "requestId": uuid.uuid4().hex, "units": units,
+            "operatorName": operator_name, "date": date, "time": time_,
+        }
+        if self.flush() == 0:
+            try:
+                return self.request("POST", "/submit", payload)["serialNumbers"]
+            except ConnectionError:
+                pass
+            except ServiceError as e:
+                if e.status < 500:
+                    raise
+        self.spool.execute(
+            "INSERT INTO spool (requestId, payload) VALUES (?, ?)", (payload["requestId"], json.dumps(payload))
+        )
+        return None
+
+    def flush(self):
+        """Resend spooled submits oldest first; returns how many are still waiting to be sent.
+
+        A database failure on the service (5xx) stops the round like an outage, and the
+        submit is tried again next time. A submit the service rejects (4xx) is kept with
+        its error and skipped, so one bad batch does not hold up the rest; see failed().
+        """
+        for spool_id, payload in self.spool.execute("SELECT id, payload FROM spool WHERE error IS NULL ORDER BY id").fetchall():
+            try:
+                self.request("POST", "/submit", json.loads(payload))
+            except ConnectionError:
+                break
+            except ServiceError as e:
+                if e.status >= 500:
+                    break
+                self.spool.execute("UPDATE spool SET error = ? WHERE id = ?", (str(e), spool_id))
+                continue
+            self.spool.execute("DELETE FROM spool WHERE id = ?", (spool_id,))
+        return self.pending()
+
+    def pending(self):
+        return self.spool.execute("SELECT COUNT(*) FROM spool WHERE error IS NULL").fetchone()[0]
+
+    def failed(self):
+        """Spooled submits the service rejected, as [(id, error)]; they stay in the spool file."""
+        return self.spool.execute("SELECT id, error FROM spool WHERE error IS NOT NULL ORDER BY id").fetchall()
+
+    def components(self):
+        return self.get("/components")["components"]
+
+    def part_numbers(self, component):
+        return self.get("/part-numbers", component=component)["partNumbers"]
+
+    def previous_entries(self, part_number, component, parameters):
+        rows = self.get("/previous", partNumber=part_number, component=component, parameter=",".join(parameters))["rows"]
+        return [tuple(row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            if self.http is not None:
+                self.http.close()
+                self.http = None
+        self.spool.close()
+
+
+class RemoteLimits:
+    """LimitsCache look-alike that reads spec limits from the service, reusing them for LIMITS_TTL_S."""
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.limits = {}  # (componentName, partNumber) -> (fetched at, {parameterName: (low, high)})
+
+    def load(self, component, part_number):
+        key = (component, part_number)
+        with self.lock:
+            fetched = self.limits.get(key)
+        if fetched and time.monotonic() - fetched[0] < LIMITS_TTL_S:
+            return fetched[1]
+        rows = self.client.get("/limits", component=component, partNumber=part_number)["limits"]
+        limits = {parameter: (low, high) for parameter, low, high in rows}
+        with self.lock:
+            self.limits[key] = (time.monotonic(), limits)
+        return limits
+
+    def limits_for(self, component, part_number, parameters):
+        limits = self.load(component, part_number)
+        return {parameter: limits.get(parameter, (None, None)) for parameter in parameters}
+
+    def close(self):
+        pass
+
+
+def _station(url, spool_path, station, submits, units_per_submit, results):
+    """Load-test station: submit every 10 ms, spooling through the outage, then drain the spool."""
+    client = ServiceClient(url, spool_path, timeout=1)
+    acknowledged = spooled = 0
+    for _ in range(submits):
+        units = [("LOAD", "Load Test", "LOAD", "Valid", [("voltage", 3.3), ("resistance", 8.0)])] * units_per_submit
+        if client.submit(units, f"station{station}", time.strftime("%Y-%m-%d"), time.strftime("%H:%M:%S")) is None:
+            spooled += 1
+        else:
+            acknowledged += 1
+        time.sleep(0.01)
+    deadline = time.monotonic() + 30
+    while client.flush() and time.monotonic() < deadline:
+        time.sleep(0.2)
+    errors = client.spool.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+    client.close()
+    results.send((acknowledged, spooled, errors))
+
+
+def load_test(stations, submits=100, units_per_submit=5, outage=1.0):
+    """Run client processes against a scratch database, with the service down for the first outage seconds."""
+    context = multiprocessing.get_context("spawn")  # As on Windows, and safe with the server threads
+    work_dir = tempfile.mkdtemp()
+    db_path = os.path.join(work_dir, "load_test.db")
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        port = probe.getsockname()[1]
+    url = f"http://localhost:{port}"
+
+    pipes = [context.Pipe(duplex=False) for _ in range(stations)]
+    processes = [
+        context.Process(target=_station, args=(
+            url, os.path.join(work_dir, f"spool{n}.db"), n, submits, units_per_submit, send
+        ))
+        for n, (_, send) in enumerate(pipes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    time.sleep(outage)
+    server = ServiceServer(("localhost", port), db_path)
+    threading.Thread(target=server.serve_forever, name="service", daemon=True).start()
+    outcomes = [receive.recv() for receive, _ in pipes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    server.shutdown()
+
+    conn = connect(db_path)
+    stored, distinct = conn.execute("SELECT COUNT(*), COUNT(DISTINCT componentSerialNumber) FROM units").fetchone()
+    expected = stations * submits * units_per_submit
+    acknowledged = sum(outcome[0] for outcome in outcomes)
+    spooled = sum(outcome[1] for outcome in outcomes)
+    errors = sum(outcome[2] for outcome in outcomes)
+    print(f"{stations} stations x {submits} submits x {units_per_submit} units, service down for the first {outage:g} s:")
+    print(f"  {acknowledged} acknowledged at once, {spooled} spooled and resent, {errors} left in spools")
+    print(f"  {stored} units stored of {expected} expected, {stored - distinct} duplicate serial numbers, "
+          f"{server.writer.commits} commits, {elapsed:.1f} s")
+    return errors == 0 and stored == expected == distinct
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON ingest service for login.db")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="interface to listen on (anything but loopback needs INGEST_TOKEN)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=DB_PATH, help="database file (default login.db)")
+    parser.add_argument("--load-test", type=int, metavar="STATIONS", help="run client processes against a scratch database and exit")
+    parser.add_argument("--submits", type=int, default=100, help="submits per station in the load test")
+    parser.add_argument("--outage", type=float, default=1.0, help="seconds the service stays down at the start of the load test")
+    args = parser.parse_args()
+
+    if args.load_test:
+        sys.exit(0 if load_test(args.load_test, args.submits, outage=args.outage) else 1)
+
+    migrate(connect(args.db))
+    try:
+        server = ServiceServer((args.host, args.port), args.db, service_token())
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Ingest service writing {args.db}, listening on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Simulated SCPI instrument for testing and benchmarking the acquisition path off the line.
+
+Run it and point the operator screen (or test.connect_serial) at the port it prints:
+
+    python simulator.py                    # pseudo-terminal, e.g. /dev/pts/5 (Linux/macOS)
+    python simulator.py --tcp 5025         # socket://localhost:5025 (any platform)
+    python simulator.py --latency 0.05 --jitter 0.01 --error-rate 0.02 --dist VOLT=3.3,0.05
+    python simulator.py --bench 500        # time 500 read cycles through the real serial layer
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+
+# Default (mean, standard deviation) of the simulated reading for each :MEAS:<X>? keyword
+DEFAULT_DISTRIBUTIONS = {
+    "VOLT": (3.3, 0.05),
+    "RES": (8.0, 0.2),
+}
+FALLBACK_DISTRIBUTION = (1.0, 0.1)  # Any other :MEAS:<X>? keyword
+
+
+class SimulatedInstrument:
+    """Answer SCPI command lines the way a bench meter would.
+
+    latency/jitter delay every response (seconds, jitter is the standard deviation);
+    error_rate replies with a SCPI error instead of the reading and drop_rate sends
+    no reply at all, so the caller's timeout handling can be exercised. With
+    compound=False only the first query of a compound line is answered, like meters
+    that do not support them.
+    """
+
+    def __init__(self, distributions=None, latency=0.005, jitter=0.0, error_rate=0.0, drop_rate=0.0,
+                 compound=True, idn="InThink,SIM-DMM,SIM0001,1.0", seed=None):
+        self.distributions = dict(DEFAULT_DISTRIBUTIONS)
+        self.distributions.update(distributions or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.compound = compound
+        self.idn = idn
+        self.random = random.Random(seed)
+
+    def respond(self, line):
+        """Return the response frame for one command line, or None if nothing should be sent."""
+        queries = [part.strip() for part in line.split(";") if part.strip().endswith("?")]
+        if not queries:
+            return None
+        if not self.compound:
+            queries = queries[:1]
+
+        delay = self.latency + (self.random.gauss(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.random.random() < self.drop_rate:
+            return None
+        return ";".join(self._answer(query) for query in queries)
+
+    def _answer(self, query):
+        command = query.upper()
+        if command == "*IDN?":
+            return self.idn
+        if command == "*OPC?":
+            return "1"
+        if self.random.random() < self.error_rate:
+            return '-222,"Data out of range"'
+        if command.startswith(":MEAS:"):
+            keyword = command[len(":MEAS:"):-1]
+            mean, std_dev = self.distributions.get(keyword, FALLBACK_DISTRIBUTION)
+            return f"{self.random.gauss(mean, std_dev):.6g}"
+        return '-113,"Undefined header"'
+
+    def handle_stream(self, read_chunk, write):
+        """Serve command lines from read_chunk() until it returns b"" (connection closed)."""
+        buffer = b""
+        while True:
+            try:
+                chunk = read_chunk()
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                response = self.respond(line.decode(errors="replace").strip())
+                if response is not None:
+                    write(f"{response}\r\n".encode())
+
+
+def serve_pty(instrument):
+    """Serve the instrument on a new pseudo-terminal and return its device name (POSIX only)."""
+    import pty
+    import tty
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    thread = threading.Thread(
+        target=instrument.handle_stream,
+        args=(lambda: os.read(master, 1024), lambda data: os.write(master, data)),
+        name="simulator-pty", daemon=True
+    )
+    thread.start()
+    return os.ttyname(slave)
+
+
+def serve_tcp(instrument, port=0, host="localhost"):
+    """Serve the instrument on a TCP port and return its pyserial URL (socket://host:port)."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen()
+
+    def accept_loop():
+        while True:
+            client, _ = server.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(
+                target=instrument.handle_stream, args=(lambda: client.recv(1024), client.sendall),
+                name="simulator-client", daemon=True
+            ).start()
+
+    threading.Thread(target=accept_loop, name="simulator-tcp", daemon=True).start()
+    return f"socket://{host}:{server.getsockname()[1]}"
+
+
+def benchmark(port, cycles, parameters=("voltage", "resistance"), baudrate=115200, compound=True):
+    """Time read cycles through the pooled connection and query_parameters, as read_values does."""
+    from test import borrow_connection, query_parameters, close_all_connections
+
+    timings = []
+    errors = 0
+    for _ in range(cycles):
+        start = time.perf_counter()
+        try:
+            with borrow_connection(port, baudrate) as ser:
+                query_parameters(ser, list(parameters), compound=compound)
+        except Exception:
+            errors += 1
+        timings.append(time.perf_counter() - start)
+    close_all_connections()
+
+    timings.sort()
+    print(f"{cycles} cycles of {', '.join(parameters)} on {port}:")
+    print(f"  mean {statistics.mean(timings) * 1000:.1f} ms, median {timings[len(timings) // 2] * 1000:.1f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.1f} ms, errors {errors}")
+
+
+def parse_distribution(text):
+    keyword, _, spec = text.partition("=")
+    mean, _, std_dev = spec.partition(",")
+    return keyword.upper(), (float(mean), float(std_dev or 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated SCPI instrument")
+    parser.add_argument("--tcp", type=int, metavar="PORT", help="serve on socket://localhost:PORT instead of a pty")
+    parser.add_argument("--latency", type=float, default=0.005, help="response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of readings answered with a SCPI error")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of commands left unanswered")
+    parser.add_argument("--no-compound", action="store_true", help="answer only the first query of a compound line")
+    parser.add_argument("--dist", action="append", default=[], type=parse_distribution, metavar="KEYWORD=MEAN,STD",
+                        help="distribution of :MEAS:<KEYWORD>? readings, e.g. VOLT=3.3,0.05")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable runs")
+    parser.add_argument("--bench", type=int, metavar="CYCLES", help="benchmark the serial layer against the simulator and exit")
+    args = parser.parse_args()
+
+    instrument = SimulatedInstrument(
+        distributions=dict(args.dist), latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, drop_rate=args.drop_rate, compound=not args.no_compound, seed=args.seed
+    )
+    if args.tcp is not None or sys.platform == "win32":
+        port = serve_tcp(instrument, args.tcp or 0)
+    else:
+        port = serve_pty(instrument)
+
+    if args.bench:
+        benchmark(port, args.bench)
+        return
+
+    print(f"Simulated instrument listening on {port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
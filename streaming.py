@@ -0,0 +1,162 @@
+import math
+import threading
+import time
+from array import array
+
+from instruments import measure
+from test import borrow_connection
+
+DEFAULT_RATE_HZ = 10.0
+DEFAULT_CAPACITY = 3000  # Samples kept per parameter (one minute at 50 samples/s)
+
+
+class RingBuffer:
+    """Fixed-size buffer of (timestamp, value) samples; once full the oldest sample is overwritten."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.total = 0  # Samples appended since the buffer was created
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp, value):
+        index = self.total % self.capacity
+        self.times[index] = timestamp
+        self.values[index] = value
+        self.total += 1
+
+    def samples(self):
+        """Return the buffered (timestamps, values) arrays, oldest first."""
+        if self.total <= self.capacity:
+            return self.times[:self.total], self.values[:self.total]
+        start = self.total % self.capacity
+        return self.times[start:] + self.times[:start], self.values[start:] + self.values[:start]
+
+
+class ParameterStats:
+    """Running statistics over every sample of one parameter (Welford's algorithm, constant memory)."""
+
+    def __init__(self, low=None, high=None):
+        self.low = None if low is None else float(low)
+        self.high = None if high is None else float(high)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.last = None
+        self.violations = 0
+
+    def add(self, value):
+        """Add a sample and return True if it is outside the limits."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.last = value
+        out_of_range = self.is_out_of_range(value)
+        if out_of_range:
+            self.violations += 1
+        return out_of_range
+
+    def is_out_of_range(self, value):
+        return (self.low is not None and value < self.low) or (self.high is not None and value > self.high)
+
+    @property
+    def std_dev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class StreamCapture:
+    """Trigger the instrument repeatedly at a fixed rate and keep the samples in ring buffers.
+
+    The capture runs on its own thread and borrows the pooled serial connection for
+    each sample, so single reads queued by the operator can still interleave.
+    limits maps each parameter to its (low, high) pair from parametersDetails.
+    """
+
+    def __init__(self, port, baudrate, parameters, limits, rate_hz=DEFAULT_RATE_HZ,
+                 capacity=DEFAULT_CAPACITY, compound=True):
+        self.port = port
+        self.baudrate = baudrate
+        self.parameters = list(parameters)
+        self.period = 1.0 / rate_hz
+        self.compound = compound
+        self.buffers = {parameter: RingBuffer(capacity) for parameter in self.parameters}
+        self.stats = {parameter: ParameterStats(*limits.get(parameter, (None, None))) for parameter in self.parameters}
+        self.error = None  # Set if the capture stopped because of a serial or conversion error
+        self.started_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stream-capture", daemon=True)
+
+    def start(self):
+        self.started_at = time.time()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    def achieved_rate(self):
+        """Samples per second actually sustained since the capture started."""
+        if not self.started_at or not self.parameters:
+            return 0.0
+        elapsed = time.time() - self.started_at
+        return self.stats[self.parameters[0]].count / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        """Return a {parameter: dict} copy of the statistics for display.
+
+        window_mean covers only the samples still in the ring buffer, which shows drift
+        against the mean over the whole capture.
+        """
+        with self.lock:
+            result = {}
+            for parameter in self.parameters:
+                stats = self.stats[parameter]
+                values = self.buffers[parameter].samples()[1]
+                result[parameter] = {
+                    "last": stats.last,
+                    "mean": stats.mean,
+                    "window_mean": sum(values) / len(values) if values else None,
+                    "min": stats.minimum,
+                    "max": stats.maximum,
+                    "std_dev": stats.std_dev,
+                    "count": stats.count,
+                    "violations": stats.violations,
+                    "out_of_range": stats.last is not None and stats.is_out_of_range(stats.last),
+                }
+            return result
+
+    def _run(self):
+        next_sample = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                with borrow_connection(self.port, self.baudrate) as ser:
+                    responses = measure(ser, self.parameters, compound=self.compound)
+                timestamp = time.time()
+                with self.lock:
+                    for parameter in self.parameters:
+                        value = float(responses[parameter])
+                        self.buffers[parameter].append(timestamp, value)
+                        self.stats[parameter].add(value)
+            except Exception as e:
+                self.error = e
+                return
+
+            # Pace to the requested rate; if the instrument is slower, sample as fast as it allows
+            next_sample += self.period
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_sample = time.monotonic()
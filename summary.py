@@ -0,0 +1,60 @@
+"""Yield and throughput queries over the trigger-maintained summary tables.
+
+unitSummary and measurementSummary hold one row per day, part number, operator
+(and parameter), so the dashboard reads a few thousand rows however many months
+of units and measurements sit underneath, archived ones included.
+"""
+import math
+
+from db import get_connection
+
+# Dashboard groupings of unitSummary: (label, column)
+GROUPINGS = [("Part Number", "partNumber"), ("Operator", "operatorName"), ("Date", "date")]
+
+
+def _date_filter(start_date, end_date):
+    where = " WHERE 1=1"
+    params = []
+    if start_date:
+        where += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        where += " AND date <= ?"
+        params.append(end_date)
+    return where, params
+
+
+def yield_by(column, start_date="", end_date="", conn=None):
+    """Return [(key, units, passUnits, yield %)] grouped by a unitSummary column (see GROUPINGS)."""
+    if column not in [grouping[1] for grouping in GROUPINGS]:
+        raise ValueError(f"Cannot group the yield summary by {column}")
+    conn = conn or get_connection()
+    where, params = _date_filter(start_date, end_date)
+    rows = conn.execute(f"""
+        SELECT {column}, SUM(units), SUM(passUnits)
+        FROM unitSummary{where}
+        GROUP BY {column} ORDER BY {column}
+    """, params).fetchall()
+    return [(key, units, passed, 100.0 * passed / units if units else 0.0) for key, units, passed in rows]
+
+
+def parameter_stats(start_date="", end_date="", part_number="", conn=None):
+    """Return [(partNumber, parameterName, count, pass %, min, max, mean, std dev)] from measurementSummary."""
+    conn = conn or get_connection()
+    where, params = _date_filter(start_date, end_date)
+    if part_number:
+        where += " AND partNumber = ?"
+        params.append(part_number)
+    rows = conn.execute(f"""
+        SELECT partNumber, parameterName, SUM(count), SUM(passCount), MIN(minValue), MAX(maxValue),
+               SUM(sumValue), SUM(sumSquares)
+        FROM measurementSummary{where}
+        GROUP BY partNumber, parameterName ORDER BY partNumber, parameterName
+    """, params).fetchall()
+    stats = []
+    for part, parameter, count, passed, low, high, total, squares in rows:
+        mean = total / count
+        # Population standard deviation from the running sums; clamp rounding noise below zero
+        std = math.sqrt(max(squares / count - mean * mean, 0.0))
+        stats.append((part, parameter, count, 100.0 * passed / count, low, high, mean, std))
+    return stats
@@ -4,15 +4,19 @@ import subprocess
 import sqlite3  # Add this import for database interaction
 import os
 import sys  # Ensure sys is imported
+from db import get_connection, transaction
+from measurements import recent_range
+from reports import ReportFilter, filter_choices, open_report, user_columns
+from virtual_table import VirtualTable
+from xlsx_export import FILE_TYPES as XLSX_FILE_TYPES, ExportDialog, save_table
+from export import FILE_TYPES as EXPORT_FILE_TYPES, export_pivot
+from migrations import migrate
 
-# Update database path to handle PyInstaller's temporary directory
 if getattr(sys, 'frozen', False):  # Check if running as a PyInstaller bundle
     BASE_DIR = sys._MEIPASS  # Temporary directory created by PyInstaller
 else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DB_PATH = os.path.join(BASE_DIR, "login.db")
-
 class HamburgerMenuApp:
     def __init__(self, root):
         self.root = root
@@ -52,6 +56,13 @@ class HamburgerMenuApp:
         self.populate_orders()  # Populate orders on page load
         self.populate_table()  # Populate table on page load
 
+        # Start enumerating COM ports in the background so the Communication popup opens instantly
+        try:
+            from port_registry import get_registry
+            get_registry()
+        except ModuleNotFoundError:
+            pass
+
     def setup_menu_content(self):
         self.menu_inner = tk.Frame(self.menu_frame, bg="#003d99")
         self.menu_inner.pack(padx=10, pady=20, fill='both', expand=True)
@@ -86,11 +97,7 @@ class HamburgerMenuApp:
 
         # Fetch selected columns from user_database table
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT column_name FROM user_database")
-            columns = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            columns = user_columns()
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Error fetching user database columns: {e}")
             win.destroy()
@@ -100,65 +107,25 @@ class HamburgerMenuApp:
             tk.Label(win, text="No columns selected in user_database.", bg="white", fg="red", font=("Arial", 12)).pack(pady=20)
             return
 
-        # Treeview for data
-        tree = ttk.Treeview(win, columns=columns, show="headings")
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, anchor="center", width=140)
-        tree.pack(fill="both", expand=True, padx=10, pady=10)
-
-        # Fetch and display data from measuredValues table for selected columns
+        # One row per live unit; parameter columns are pivoted out of measurements by SQLite
+        # and paged in as the user scrolls
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            # Always fetch all columns needed for processing
-            cursor.execute("PRAGMA table_info(measuredValues)")
-            all_mv_cols = [row[1] for row in cursor.fetchall()]
-            fetch_cols = set(columns) & set(all_mv_cols)
-            fetch_cols.update(["parameterName", "value"])
-            fetch_cols = list(fetch_cols)
-            col_str = ", ".join([f'"{col}"' for col in fetch_cols])
-            cursor.execute(f"SELECT {col_str} FROM measuredValues")
-            rows = cursor.fetchall()
-            desc = [d[0] for d in cursor.description]
-            conn.close()
+            query = open_report(ReportFilter(), columns, archives=False)
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Error fetching measuredValues data: {e}")
+            messagebox.showerror("Database Error", f"Error fetching measurement data: {e}")
             win.destroy()
             return
 
-        # Helper to extract voltage/resistance from parameterName/value
-        def extract_param_value(param_name, value, target):
-            # param_name, value: both may be comma separated
-            if not param_name or not value:
-                return "n/a"
-            names = [n.strip().lower() for n in str(param_name).split(",")]
-            vals = [v.strip() for v in str(value).split(",")]
-            result = []
-            for n, v in zip(names, vals):
-                if target in n:
-                    result.append(v if v else "n/a")
-            return ", ".join(result) if result else "n/a"
-
-        for row in rows:
-            row_dict = dict(zip(desc, row))
-            display_row = []
-            for col in columns:
-                if col.lower() in ("voltage", "resistance"):
-                    val = extract_param_value(
-                        row_dict.get("parameterName", ""), row_dict.get("value", ""), col.lower()
-                    )
-                    display_row.append(val)
-                else:
-                    v = row_dict.get(col, None)
-                    display_row.append(v if v not in (None, "",) else "n/a")
-            tree.insert("", "end", values=display_row)
+        VirtualTable(
+            win, columns, query, bg="white",
+            values=lambda index, row: [v if v not in (None, "") else "n/a" for v in row]
+        ).pack(fill="both", expand=True, padx=10, pady=10)
 
     def open_com_port_popup(self):
         """Open a popup window for Baud Rate and COM Port settings."""
         popup = tk.Toplevel(self.root)
         popup.title("Communication")
-        popup.geometry("300x200")
+        popup.geometry("480x200")
         popup.configure(bg="white")
 
         tk.Label(popup, text="Baud Rate:", bg="white", font=("Arial", 10)).pack(anchor="w", pady=5, padx=10)
@@ -168,13 +135,13 @@ class HamburgerMenuApp:
 
         tk.Label(popup, text="COM Port:", bg="white", font=("Arial", 10)).pack(anchor="w", pady=5, padx=10)
         com_port_var = tk.StringVar(value="Select COM Port")
-        com_port_dropdown = ttk.Combobox(popup, textvariable=com_port_var, state="readonly", width=18)
+        com_port_dropdown = ttk.Combobox(popup, textvariable=com_port_var, state="readonly", width=45)
         com_port_dropdown.pack(fill="x", padx=10, pady=5)
 
-        # Populate COM ports
+        # Populate COM ports from the port registry cache (enumerated in the background)
         try:
-            import serial.tools.list_ports
-            com_ports = [port.device for port in serial.tools.list_ports.comports()]
+            from port_registry import get_registry
+            com_ports = get_registry().labels()
             com_port_dropdown["values"] = com_ports
             if com_ports:
                 com_port_var.set(com_ports[0])  # Set the first COM port as default
@@ -307,11 +274,10 @@ class HamburgerMenuApp:
     def populate_orders(self):
         """Populate the Component dropdown on page load."""
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("SELECT DISTINCT componentName FROM orders")
             components = cursor.fetchall()
-            conn.close()
 
             if components:
                 self.component_dropdown["values"] = [component[0] for component in components]
@@ -331,11 +297,10 @@ class HamburgerMenuApp:
             return
 
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("SELECT partNumber FROM orders WHERE componentName = ?", (component,))
             part_numbers = [row[0] for row in cursor.fetchall()]
-            conn.close()
 
             if part_numbers:
                 self.part_number_dropdown["values"] = part_numbers
@@ -356,7 +321,7 @@ class HamburgerMenuApp:
             return
 
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_connection()
             cursor = conn.cursor()
             # Fetch orderId for the selected component and part number
             cursor.execute(
@@ -367,7 +332,6 @@ class HamburgerMenuApp:
             if not result:
                 self.parameter_dropdown["values"] = []
                 self.parameter_var.set("No Parameters Available")
-                conn.close()
                 return
 
             order_id = result[0]
@@ -378,7 +342,6 @@ class HamburgerMenuApp:
                 (order_id,)
             )
             parameters = [row[0] for row in cursor.fetchall()]
-            conn.close()
 
             if parameters:
                 self.parameter_dropdown["values"] = parameters
@@ -402,33 +365,28 @@ class HamburgerMenuApp:
             return
 
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            # Fetch orderId for the selected component and part number
-            cursor.execute(
-                "SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?",
-                (component, part_number)
-            )
-            result = cursor.fetchone()
+            with transaction() as conn:
+                cursor = conn.cursor()
+                # Fetch orderId for the selected component and part number
+                cursor.execute(
+                    "SELECT orderId FROM orders WHERE componentName = ? AND partNumber = ?",
+                    (component, part_number)
+                )
+                result = cursor.fetchone()
+                if result:
+                    # Update the parametersDetails table
+                    cursor.execute(
+                        """
+                        UPDATE parametersDetails
+                        SET low = ?, high = ?
+                        WHERE orderId = ? AND parameterName = ?
+                        """,
+                        (low_value, high_value, result[0], parameter)
+                    )
             if not result:
                 messagebox.showerror("Error", "Invalid Component or Part Number selection.")
-                conn.close()
                 return
 
-            order_id = result[0]
-
-            # Update the parametersDetails table
-            cursor.execute(
-                """
-                UPDATE parametersDetails
-                SET low = ?, high = ?
-                WHERE orderId = ? AND parameterName = ?
-                """,
-                (low_value, high_value, order_id, parameter)
-            )
-            conn.commit()
-            conn.close()
-
             messagebox.showinfo("Values Saved", f"Component: {component}\nPart Number: {part_number}\nParameter: {parameter}\nLow Value: {low_value}\nHigh Value: {high_value}")
             self.populate_table()  # Refresh the table
         except sqlite3.Error as e:
@@ -464,30 +422,36 @@ class HamburgerMenuApp:
         messagebox.showinfo("Create User", "Create User functionality would go here")
 
     def generate_report(self):
-        """Open a popup to select filters and display filtered measuredValues with restricted columns."""
+        """Open a popup to select filters and display filtered measurements with restricted columns."""
         popup = tk.Toplevel(self.root)
         popup.title("Generate Report")
-        popup.geometry("400x350")
+        popup.geometry("400x400")
         popup.config(bg="white")
 
         # --- Filter fields ---
-        tk.Label(popup, text="Start Date (YYYY-MM-DD):", bg="white").pack(pady=(15, 2))
+        tk.Label(popup, text="Start (YYYY-MM-DD or YYYY-MM-DD HH:MM):", bg="white").pack(pady=(15, 2))
         start_date_var = tk.StringVar()
         tk.Entry(popup, textvariable=start_date_var).pack()
 
-        tk.Label(popup, text="End Date (YYYY-MM-DD):", bg="white").pack(pady=(15, 2))
+        tk.Label(popup, text="End (YYYY-MM-DD or YYYY-MM-DD HH:MM):", bg="white").pack(pady=(15, 2))
         end_date_var = tk.StringVar()
         tk.Entry(popup, textvariable=end_date_var).pack()
 
+        # Quick sub-day ranges, e.g. for a shift report
+        def set_recent(hours):
+            start, end = recent_range(hours)
+            start_date_var.set(start)
+            end_date_var.set(end)
+
+        range_frame = tk.Frame(popup, bg="white")
+        range_frame.pack(pady=(8, 0))
+        tk.Button(range_frame, text="Last 2 h", command=lambda: set_recent(2)).pack(side="left", padx=5)
+        tk.Button(range_frame, text="Last 8 h", command=lambda: set_recent(8)).pack(side="left", padx=5)
+        tk.Button(range_frame, text="Last 24 h", command=lambda: set_recent(24)).pack(side="left", padx=5)
+
         # Fetch operator names and part numbers for dropdowns
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT DISTINCT operatorName FROM measuredValues")
-            operator_names = [row[0] for row in cursor.fetchall()]
-            cursor.execute("SELECT DISTINCT partNumber FROM measuredValues")
-            part_numbers = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            operator_names, part_numbers = filter_choices()
         except Exception:
             operator_names = []
             part_numbers = []
@@ -505,11 +469,7 @@ class HamburgerMenuApp:
         def show_report():
             # Fetch restricted columns from user_database
             try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("SELECT column_name FROM user_database")
-                columns = [row[0] for row in cursor.fetchall()]
-                conn.close()
+                columns = user_columns()
             except Exception:
                 columns = []
 
@@ -518,22 +478,17 @@ class HamburgerMenuApp:
                 popup.destroy()
                 return
 
-            # Build SQL query based on selected filters
-            query = "SELECT * FROM measuredValues WHERE 1=1"
-            params = []
-            if start_date_var.get():
-                query += " AND date >= ?"
-                params.append(start_date_var.get())
-            if end_date_var.get():
-                query += " AND date <= ?"
-                params.append(end_date_var.get())
-            if operator_var.get():
-                query += " AND operatorName = ?"
-                params.append(operator_var.get())
-            if partno_var.get():
-                query += " AND partNumber = ?"
-                params.append(partno_var.get())
-            query += " ORDER BY date, time, operatorName, partNumber, parameterName"
+            # One row per unit, pivoted by SQLite; only the archive months inside the date
+            # range are attached, and reopening the same report reuses it
+            filters = ReportFilter(start_date_var.get(), end_date_var.get(), operator_var.get(), partno_var.get())
+            try:
+                query = open_report(filters, columns)
+            except ValueError as e:
+                messagebox.showerror("Invalid Date", str(e), parent=popup)
+                return
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Error fetching report data: {e}", parent=popup)
+                return
 
             # Display results in a new window
             result_win = tk.Toplevel(self.root)
@@ -541,112 +496,60 @@ class HamburgerMenuApp:
             result_win.geometry("1100x500")
             result_win.config(bg="white")
 
-            # Treeview for data
-            tree = ttk.Treeview(result_win, columns=columns, show="headings")
-            for col in columns:
-                tree.heading(col, text=col)
-                tree.column(col, anchor="center", width=140)
-            tree.pack(fill="both", expand=True, padx=10, pady=10)
-
-            # Fetch and display filtered data
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("PRAGMA table_info(measuredValues)")
-                all_mv_cols = [row[1] for row in cursor.fetchall()]
-                fetch_cols = set(columns) & set(all_mv_cols)
-                fetch_cols.update(["parameterName", "value"])
-                fetch_cols = list(fetch_cols)
-                col_str = ", ".join([f'"{col}"' for col in fetch_cols])
-                cursor.execute(query.replace("SELECT *", f"SELECT {col_str}"), params)
-                rows = cursor.fetchall()
-                desc = [d[0] for d in cursor.description]
-                conn.close()
-            except Exception:
-                rows = []
-                desc = []
-
-            # Helper to extract voltage/resistance from parameterName/value
-            def extract_param_value(param_name, value, target):
-                if not param_name or not value:
-                    return "n/a"
-                names = [n.strip().lower() for n in str(param_name).split(",")]
-                vals = [v.strip() for v in str(value).split(",")]
-                result = []
-                for n, v in zip(names, vals):
-                    if target in n:
-                        result.append(v if v else "n/a")
-                return ", ".join(result) if result else "n/a"
-
-            for row in rows:
-                row_dict = dict(zip(desc, row))
-                display_row = []
-                for col in columns:
-                    if col.lower() in ("voltage", "resistance"):
-                        val = extract_param_value(
-                            row_dict.get("parameterName", ""), row_dict.get("value", ""), col.lower()
-                        )
-                        display_row.append(val)
-                    else:
-                        v = row_dict.get(col, None)
-                        display_row.append(v if v not in (None, "",) else "n/a")
-                tree.insert("", "end", values=display_row)
+            # Paged in as the user scrolls
+            table = VirtualTable(
+                result_win, columns, query, bg="white",
+                values=lambda index, row: [v if v not in (None, "") else "n/a" for v in row]
+            )
+            table.pack(fill="both", expand=True, padx=10, pady=10)
 
-            # --- Print Button ---
+            # --- Print Button: the rows are streamed from the database into a temp workbook ---
             def print_report():
                 import tempfile
                 import platform
                 import subprocess
-                try:
-                    import openpyxl
-                except ImportError:
-                    messagebox.showerror("Missing Library", "openpyxl is required for printing as Excel.\nInstall it with: pip install openpyxl")
-                    return
-
-                # Create Excel file in temp
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.append(columns)
-                for item in tree.get_children():
-                    vals = tree.item(item, "values")
-                    ws.append(list(vals))
                 with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as f:
                     temp_path = f.name
-                    wb.save(temp_path)
 
-                # Open system print dialog for the Excel file
-                if platform.system() == "Windows":
-                    # This will open the default associated app's print dialog (usually Excel)
-                    os.startfile(temp_path, "print")
-                elif platform.system() == "Darwin":
-                    subprocess.run(["open", temp_path])
-                else:
-                    subprocess.run(["xdg-open", temp_path])
+                def open_print_dialog(count):
+                    # Open system print dialog for the Excel file
+                    if platform.system() == "Windows":
+                        # This will open the default associated app's print dialog (usually Excel)
+                        os.startfile(temp_path, "print")
+                    elif platform.system() == "Darwin":
+                        subprocess.run(["open", temp_path])
+                    else:
+                        subprocess.run(["xdg-open", temp_path])
+
+                save_table(table, columns, temp_path, on_done=open_print_dialog)
 
             # --- Save as Excel Button ---
             def save_as_excel():
-                try:
-                    import openpyxl
-                    from tkinter import filedialog
-                    wb = openpyxl.Workbook()
-                    ws = wb.active
-                    ws.append(columns)
-                    for item in tree.get_children():
-                        vals = tree.item(item, "values")
-                        ws.append(list(vals))
-                    file_path = filedialog.asksaveasfilename(
-                        defaultextension=".xlsx",
-                        filetypes=[("Excel files", "*.xlsx"), ("All files", "*")]
+                from tkinter import filedialog
+                file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=XLSX_FILE_TYPES)
+                if file_path:
+                    save_table(table, columns, file_path,
+                               on_done=lambda count: messagebox.showinfo("Saved", f"Report saved as {file_path}"))
+
+            # --- Export Parquet Button: typed columns, streamed from the database rather than the table ---
+            def export_parquet():
+                from tkinter import filedialog
+                file_path = filedialog.asksaveasfilename(defaultextension=".parquet", filetypes=EXPORT_FILE_TYPES)
+                if not file_path:
+                    return
+
+                def export(conn, progress, cancel):
+                    return export_pivot(
+                        file_path, columns, query.where, query.params, filters.start_date, filters.end_date,
+                        conn, progress, cancel
                     )
-                    if file_path:
-                        wb.save(file_path)
-                        messagebox.showinfo("Saved", f"Report saved as {file_path}")
-                except ImportError:
-                    messagebox.showerror("Missing Library", "openpyxl is required to save as Excel.\nInstall it with: pip install openpyxl")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to save Excel file:\n{e}")
-
-            # Button frame for Print and Save as Excel
+
+                ExportDialog(
+                    table, export, query.total, title="Exporting Parquet File",
+                    on_done=lambda count: messagebox.showinfo("Exported", f"{count} rows exported to {file_path}")
+                )
+
+            # Button frame for Print, Save as Excel and Export Parquet
             btn_frame = tk.Frame(result_win, bg="white")
             btn_frame.pack(side="bottom", pady=10)
 
@@ -662,6 +565,12 @@ class HamburgerMenuApp:
             )
             save_excel_btn.pack(side="left", padx=10)
 
+            export_btn = tk.Button(
+                btn_frame, text="Export Parquet", bg="#6C757D", fg="white", font=("Arial", 11),
+                command=export_parquet
+            )
+            export_btn.pack(side="left", padx=10)
+
             popup.destroy()
 
         tk.Button(popup, text="Show Report", bg="#28A745", fg="white", font=("Arial", 11), command=show_report).pack(pady=25)
@@ -674,7 +583,7 @@ class HamburgerMenuApp:
     def populate_table(self):
         """Fetch and display data in the main frame table."""
         try:
-            conn = sqlite3.connect(DB_PATH)  # Ensure this path is correct
+            conn = get_connection()
             cursor = conn.cursor()
             # Join orders and parametersDetails tables to fetch required data
             query = """
@@ -684,7 +593,6 @@ class HamburgerMenuApp:
             """
             cursor.execute(query)
             rows = cursor.fetchall()
-            conn.close()
 
             # Clear existing rows in the table
             for item in self.tree.get_children():
@@ -732,19 +640,16 @@ class HamburgerMenuApp:
             return
 
         try:
-            conn = sqlite3.connect(DB_PATH)  # Ensure this path is correct
-            cursor = conn.cursor()
-            # Update the database
-            cursor.execute(
-                """
-                UPDATE parametersDetails
-                SET low = ?, high = ?
-                WHERE orderId = ? AND componentName = ? AND parameterName = ?
-                """,
-                (low_value, high_value, order_id, component_name, parameter_name)
-            )
-            conn.commit()
-            conn.close()
+            with transaction() as conn:
+                # Update the database
+                conn.execute(
+                    """
+                    UPDATE parametersDetails
+                    SET low = ?, high = ?
+                    WHERE orderId = ? AND componentName = ? AND parameterName = ?
+                    """,
+                    (low_value, high_value, order_id, component_name, parameter_name)
+                )
 
             # Update the table row
             self.tree.item(selected_item[0], values=(order_id, component_name, parameter_name, low_value, high_value))
@@ -755,6 +660,7 @@ class HamburgerMenuApp:
 
 
 if __name__ == "__main__":
+    migrate()  # Bring the schema up to date if this screen was started without the login window
     root = tk.Tk()
     app = HamburgerMenuApp(root)
     root.mainloop()
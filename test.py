@@ -1,5 +1,15 @@
 import serial
+import threading
 import time
+from contextlib import contextmanager
+
+from metrics import record_command, record_open
+
+# Open handles keyed by (port, baudrate); opening a USB-serial adapter is slow and
+# can reset the instrument, so handles are kept open for the life of the process.
+_connections = {}
+_connection_locks = {}
+_pool_lock = threading.Lock()
 
 def list_ports():
     import serial.tools.list_ports
@@ -7,21 +17,199 @@ def list_ports():
     return [port.device for port in ports]
 
 def connect_serial(port, baudrate):
+    start = time.perf_counter()
     try:
-        ser = serial.Serial(port, baudrate, timeout=1)
+        # serial_for_url also accepts URLs such as socket://localhost:5025 (see simulator.py)
+        ser = serial.serial_for_url(port, baudrate, timeout=1)
+        record_open(port, time.perf_counter() - start)
         print(f"Connected to {port} at {baudrate} baud.")
         return ser
     except Exception as e:
+        record_open(port, time.perf_counter() - start, error=True)
         print(f"Failed to connect: {e}")
         return None
 
-def send_command(ser, command):
-    full_command = f"{command}\r\n".encode()
-    ser.write(full_command)
-    time.sleep(0.2)
-    response = ser.read_all().decode().strip()
+def is_healthy(ser):
+    """Return True if the handle is open and the adapter is still present."""
+    try:
+        return ser.is_open and ser.in_waiting >= 0
+    except (serial.SerialException, OSError):
+        return False
+
+def get_connection(port, baudrate):
+    """Return the pooled handle for (port, baudrate), reconnecting if it has gone bad."""
+    key = (port, int(baudrate))
+    with _pool_lock:
+        ser = _connections.get(key)
+        if ser is not None and not is_healthy(ser):
+            print(f"Connection to {port} lost, reconnecting.")
+            _close_handle(_connections.pop(key))
+            ser = None
+        if ser is None:
+            ser = connect_serial(port, int(baudrate))
+            if ser is None:
+                return None
+            _connections[key] = ser
+            _connection_locks.setdefault(key, threading.Lock())
+        return ser
+
+@contextmanager
+def borrow_connection(port, baudrate):
+    """Borrow the pooled handle for exclusive use; a handle that errors is dropped from the pool."""
+    ser = get_connection(port, baudrate)
+    if ser is None:
+        raise serial.SerialException(f"Failed to connect to {port} at {baudrate} baud.")
+    key = (port, int(baudrate))
+    with _connection_locks[key]:
+        try:
+            yield ser
+        except TimeoutError:
+            raise  # A missed reply is not a broken port; keep the handle
+        except (serial.SerialException, OSError):
+            close_connection(port, baudrate)
+            raise
+
+def close_connection(port, baudrate):
+    """Close and forget the pooled handle for (port, baudrate), if any."""
+    with _pool_lock:
+        ser = _connections.pop((port, int(baudrate)), None)
+    reset_compound(port)
+    if ser is not None:
+        _close_handle(ser)
+
+def close_all_connections():
+    """Close every pooled handle (on logout or exit)."""
+    with _pool_lock:
+        handles = list(_connections.values())
+        _connections.clear()
+    reset_compound()
+    for ser in handles:
+        _close_handle(ser)
+
+def _close_handle(ser):
+    try:
+        ser.close()
+    except (serial.SerialException, OSError):
+        pass
+
+TERMINATOR = b"\n"  # Instruments end every response frame with CR LF
+DEFAULT_TIMEOUT = 2.0  # Seconds allowed for a complete response frame
+
+def _set_timeout(ser, remaining):
+    # A timeout of 0 makes pyserial return at once with whatever has arrived
+    ser.timeout = max(remaining, 0)
+
+def send_command(ser, command, timeout=DEFAULT_TIMEOUT, opc=False, deadline=None):
+    """Send a SCPI command and return its response frame, read up to the line terminator.
+
+    Commands that are not queries return "" straight after the write. With opc=True
+    the command is followed by *OPC? and the call blocks until the instrument reports
+    that it has finished; the trailing OPC field is removed from the returned frame.
+    A deadline (a time.perf_counter() value) caps the timeout, so several commands
+    can share one budget. Raises TimeoutError if no complete frame arrives in time.
+    Every exchange is timed (write, time to first byte, total, bytes) and recorded
+    in metrics.
+    """
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.perf_counter())
+        if timeout <= 0:
+            raise TimeoutError(f"No time left to send {command}.")
+    is_query = command.rstrip().endswith("?")
+    if opc:
+        command = f"{command};*OPC?"
+    data = f"{command}\r\n".encode()
+    if not is_query and not opc:
+        start = time.perf_counter()
+        ser.write(data)
+        elapsed = time.perf_counter() - start
+        record_command(ser.port, command, elapsed, 0.0, elapsed, len(data), 0)
+        return ""
+
+    ser.reset_input_buffer()  # Drop stale bytes left behind by an earlier timed-out query
+    start = time.perf_counter()
+    deadline = start + timeout  # One budget for the whole exchange, not one per read
+    ser.write(data)
+    written = time.perf_counter()
+    _set_timeout(ser, deadline - written)
+    frame = ser.read(1)
+    first_byte = time.perf_counter()
+    if frame and frame != TERMINATOR:
+        _set_timeout(ser, deadline - first_byte)
+        frame += ser.read_until(TERMINATOR)
+    complete = frame.endswith(TERMINATOR)
+    record_command(
+        ser.port, command, written - start, first_byte - written, time.perf_counter() - start,
+        len(data), len(frame), error=not complete
+    )
+    if not complete:
+        raise TimeoutError(f"No complete response to {command} within {timeout:.3g} s (received {frame!r}).")
+
+    response = frame.decode().strip()
+    if opc:
+        response, _, done = response.rpartition(";")
+        if not is_query:
+            response = ""
+        if done.strip() != "1":
+            raise serial.SerialException(f"Instrument did not confirm completion of {command} (got {done!r}).")
     return response
 
+# Ports whose instrument could not answer a compound query -> sequential cycles left before the
+# compound query is tried again (a single missed reply must not cost the speedup for good)
+_sequential_ports = {}
+COMPOUND_RETRY_CYCLES = 50
+
+def reset_compound(port=None):
+    """Try compound queries on port (or every port) again, e.g. after its settings or handle changed."""
+    if port is None:
+        _sequential_ports.clear()
+    else:
+        _sequential_ports.pop(port, None)
+
+def measure_command(parameter):
+    """Return the SCPI query that measures the given parameter."""
+    if parameter.lower() == "voltage":
+        return ":MEAS:VOLT?"
+    elif parameter.lower() == "resistance":
+        return ":MEAS:RES?"
+    return f":MEAS:{parameter.upper()}?"
+
+def query_parameters(ser, parameters, timeout=DEFAULT_TIMEOUT, compound=True, profile=None, deadline=None):
+    """Measure every parameter and return a {parameter: response} dict.
+
+    With compound=True the queries are sent as one compound query
+    (":MEAS:VOLT?;:MEAS:RES?") so N parameters cost a single round trip. An
+    instrument that times out or answers with the wrong number of fields is
+    queried with sequential commands for the next COMPOUND_RETRY_CYCLES calls (or
+    until reset_compound()), then the compound query is tried again. A profile from
+    instruments.identify() supplies the instrument's own commands and whether it
+    supports compound queries at all. A deadline bounds the whole call (see send_command).
+    """
+    if profile is not None:
+        commands = [profile.command_for(parameter) for parameter in parameters]
+        compound = compound and profile.compound
+    else:
+        commands = [measure_command(parameter) for parameter in parameters]
+    cycles_left = _sequential_ports.get(ser.port)
+    if cycles_left is not None:
+        compound = False
+        if cycles_left <= 1:
+            _sequential_ports.pop(ser.port, None)
+        else:
+            _sequential_ports[ser.port] = cycles_left - 1
+    if compound and len(commands) > 1:
+        try:
+            fields = send_command(ser, ";".join(commands), timeout=timeout * len(commands), deadline=deadline).split(";")
+        except TimeoutError:
+            fields = []
+        if len(fields) == len(commands):
+            return {parameter: field.strip() for parameter, field in zip(parameters, fields)}
+        print(f"{ser.port} did not answer the compound query, falling back to sequential commands.")
+        _sequential_ports[ser.port] = COMPOUND_RETRY_CYCLES
+    return {
+        parameter: send_command(ser, command, timeout=timeout, deadline=deadline)
+        for parameter, command in zip(parameters, commands)
+    }
+
 def main():
     print("Available COM Ports:")
     ports = list_ports()
@@ -49,10 +237,9 @@ def main():
         response = send_command(ser, ":MEAS:RES?")
         print("Resistance:", response)
     elif choice == "3":
-        res = send_command(ser, ":MEAS:RES?")
-        volt = send_command(ser, ":MEAS:VOLT?")
-        print("Resistance:", res)
-        print("Voltage:", volt)
+        responses = query_parameters(ser, ["resistance", "voltage"])
+        print("Resistance:", responses["resistance"])
+        print("Voltage:", responses["voltage"])
     else:
         print("Invalid choice.")
 
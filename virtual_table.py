@@ -0,0 +1,219 @@
+"""A Treeview that shows millions of rows by holding only the visible ones.
+
+PagedQuery counts a report's rows up front and fetches them a page at a time
+with keyset pagination (WHERE key > last key of the previous page), across the
+archive months it covers and then the live tables. VirtualTable keeps one
+Treeview item per visible row (plus a small margin) and refills their values as
+the user scrolls, so opening a window costs a COUNT(*) and one page.
+"""
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+from archive import ARCHIVE_SCHEMA, archive_dir, attach, detach, months_for_range
+from db import get_connection
+
+PAGE_ROWS = 500  # Rows fetched per query
+CACHED_PAGES = 8  # Pages kept in memory (most recently used)
+MARGIN_ROWS = 5  # Treeview items kept beyond the visible rows
+EXPORT_CHUNK_ROWS = 5000  # Rows per page when a whole table is read for printing or saving
+RESULT_CACHE_ROWS = 20000  # Results up to this size are kept whole once read through, e.g. by a save
+
+
+class PagedQuery:
+    """Random access to the rows of an ordered report query, a page at a time.
+
+    select is the SELECT list and source the FROM clause, both with a {schema}
+    placeholder (e.g. measurements.LONG_FORMAT_SELECT and LONG_FORMAT_FROM); where
+    and params are the filters (measurements.unit_filters), select_params any
+    parameters of the SELECT list, and key the unique ORDER BY columns
+    (measurements.LONG_FORMAT_KEY or UNIT_KEY). Archive months in the
+    start_date..end_date range come first, as in archive.iter_report.
+    """
+
+    def __init__(self, select, source, where, params, key, select_params=(), start_date="", end_date="",
+                 archives=True, conn=None):
+        self.select = select
+        self.source = source
+        self.where = where
+        self.params = list(params)
+        self.select_params = list(select_params)
+        self.key = key
+        self.conn = conn or get_connection()
+        self.pages = OrderedDict()  # (segment, page) -> rows
+        self.bookmarks = {}  # (segment, page) -> key of the page's last row
+        self.all_rows = None  # Every row, once iter_rows has read a small result to the end
+        # One segment per archive month, then the live tables: [(month or None, first row, row count)]
+        self.segments = []
+        total = 0
+        for month in (months_for_range(start_date, end_date, archive_dir(self.conn)) if archives else []) + [None]:
+            count = self._run(month, f"SELECT COUNT(*){source}{where}", self.params)[0][0]
+            if count:
+                self.segments.append((month, total, count))
+                total += count
+        self.total = total
+
+    def _run(self, month, sql, params, conn=None):
+        conn = conn or self.conn
+        schema = ARCHIVE_SCHEMA if month else "main"
+        if month is None:
+            return conn.execute(sql.format(schema=schema), params).fetchall()
+        attach(conn, month)
+        try:
+            return conn.execute(sql.format(schema=schema), params).fetchall()
+        finally:
+            detach(conn)
+
+    def _page(self, segment, page):
+        if (segment, page) in self.pages:
+            self.pages.move_to_end((segment, page))
+            return self.pages[(segment, page)]
+
+        # Continue from the nearest earlier page whose last key is known; OFFSET only skips the pages between
+        previous = next((p for p in range(page - 1, -1, -1) if (segment, p) in self.bookmarks), None)
+        where, params = self.where, list(self.params)
+        if previous is not None:
+            where += f" AND ({', '.join(self.key)}) > ({', '.join('?' * len(self.key))})"
+            params += self.bookmarks[(segment, previous)]
+        skip = (page - (previous + 1 if previous is not None else 0)) * PAGE_ROWS
+        sql = (f"{self.select}, {', '.join(self.key)}{self.source}{where}"
+               f" ORDER BY {', '.join(self.key)} LIMIT {PAGE_ROWS} OFFSET {skip}")
+        rows = self._run(self.segments[segment][0], sql, self.select_params + params)
+
+        if rows:
+            self.bookmarks[(segment, page)] = list(rows[-1][-len(self.key):])
+        rows = [row[:-len(self.key)] for row in rows]
+        self.pages[(segment, page)] = rows
+        if len(self.pages) > CACHED_PAGES:
+            self.pages.popitem(last=False)
+        return rows
+
+    def rows(self, start, stop):
+        """Return rows start..stop-1 of the whole report."""
+        if self.all_rows is not None:
+            return self.all_rows[start:stop]
+        rows = []
+        for segment, (_, first, count) in enumerate(self.segments):
+            low, high = max(start - first, 0), min(stop - first, count)
+            for page in range(low // PAGE_ROWS, (high - 1) // PAGE_ROWS + 1 if high > low else 0):
+                page_rows = self._page(segment, page)
+                offset = page * PAGE_ROWS
+                rows += page_rows[max(low - offset, 0):high - offset]
+        return rows
+
+    def iter_rows(self, conn=None):
+        """Yield every row in order without filling the page cache (for printing and saving).
+
+        conn lets a worker thread read with its own connection (see xlsx_export). A
+        result of up to RESULT_CACHE_ROWS rows is kept once read through, so saving or
+        printing it again, or scrolling it, does not query the database.
+        """
+        if self.all_rows is not None:
+            yield from self.all_rows
+            return
+        kept = [] if self.total <= RESULT_CACHE_ROWS else None
+        for segment, (month, _, count) in enumerate(self.segments):
+            last = None
+            while True:
+                where, params = self.where, list(self.params)
+                if last is not None:
+                    where += f" AND ({', '.join(self.key)}) > ({', '.join('?' * len(self.key))})"
+                    params += last
+                sql = (f"{self.select}, {', '.join(self.key)}{self.source}{where}"
+                       f" ORDER BY {', '.join(self.key)} LIMIT {EXPORT_CHUNK_ROWS}")
+                chunk = self._run(month, sql, self.select_params + params, conn)
+                for row in chunk:
+                    row = row[:-len(self.key)]
+                    if kept is not None:
+                        kept.append(row)
+                    yield row
+                if len(chunk) < EXPORT_CHUNK_ROWS:
+                    break
+                last = list(chunk[-1][-len(self.key):])
+        if kept is not None:
+            self.all_rows = kept  # Only once complete, so a cancelled save keeps nothing
+
+
+class VirtualTable(tk.Frame):
+    """Treeview over a PagedQuery holding only the visible rows; scrolls through all of them.
+
+    values(index, row) turns a row into the displayed values (e.g. to add a Sr.No.
+    column) and tags(index) gives the item tags (e.g. alternating row colours).
+    """
+
+    def __init__(self, parent, columns, query, values=None, tags=None, style=None, column_width=140, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.query = query
+        self.values = values or (lambda index, row: row)
+        self.tags = tags or (lambda index: ())
+        self.first = 0  # Index of the top visible row
+        self.visible = 1
+
+        options = {"style": style} if style else {}
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", **options)
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, anchor="center", width=column_width, stretch=True)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.status = tk.Label(self, anchor="w", bg="white", fg="#555555")
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.status.grid(row=1, column=0, columnspan=2, sticky="ew")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", lambda event: self.render())
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(self.first - event.delta // 40))  # Windows
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.first - 3))  # X11 wheel up
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.first + 3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_to(self.first - self.visible))
+        self.tree.bind("<Next>", lambda event: self.scroll_to(self.first + self.visible))
+        self.tree.bind("<Control-Home>", lambda event: self.scroll_to(0))
+        self.tree.bind("<Control-End>", lambda event: self.scroll_to(self.query.total))
+        self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.query.total))
+        elif unit == "pages":
+            self.scroll_to(self.first + int(amount) * self.visible)
+        else:
+            self.scroll_to(self.first + int(amount))
+
+    def scroll_to(self, first):
+        self.first = max(0, min(first, self.query.total - self.visible))
+        self.render()
+        return "break"
+
+    def render(self):
+        """Refill the Treeview items with the rows from self.first on."""
+        row_height = ttk.Style().lookup(self.tree.cget("style") or "Treeview", "rowheight") or 20
+        self.visible = max(1, self.tree.winfo_height() // int(row_height) - 1)  # Less the heading
+        self.first = max(0, min(self.first, self.query.total - self.visible))
+        rows = self.query.rows(self.first, self.first + self.visible + MARGIN_ROWS)
+
+        # Reuse the existing items: changing values is much cheaper than deleting and inserting
+        items = self.tree.get_children()
+        for item in items[len(rows):]:
+            self.tree.delete(item)
+        for offset, row in enumerate(rows):
+            index = self.first + offset
+            values, tags = self.values(index, row), self.tags(index)
+            if offset < len(items):
+                self.tree.item(items[offset], values=values, tags=tags)
+            else:
+                self.tree.insert("", "end", values=values, tags=tags)
+
+        total = self.query.total
+        if total:
+            self.scrollbar.set(self.first / total, min(self.first + self.visible, total) / total)
+            self.status.config(text=f"Rows {self.first + 1:,}-{min(self.first + self.visible, total):,} of {total:,}")
+        else:
+            self.scrollbar.set(0, 1)
+            self.status.config(text="No rows")
+
+    def iter_values(self, conn=None):
+        """Yield every row of the table as displayed, for printing and saving."""
+        for index, row in enumerate(self.query.iter_rows(conn)):
+            yield self.values(index, row)
@@ -0,0 +1,150 @@
+"""Streaming .xlsx export of the database and report tables.
+
+The table's query is re-run on a worker thread with its own connection and the
+rows go straight from the cursor into an openpyxl write-only workbook, which
+spools each row to disk as it is appended, so memory stays flat however many
+rows the report has. The Tk thread only polls the row count for the progress
+bar; Cancel stops the worker at the next chunk of rows. ExportDialog runs the
+Parquet/Arrow exports (export.py) the same way.
+"""
+import os
+import threading
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from db import close_connection, get_connection
+
+PROGRESS_ROWS = 1000  # Rows written between progress updates and cancel checks
+POLL_INTERVAL_MS = 100  # How often the progress dialog reads the worker's row count
+MAX_SHEET_ROWS = 1048575  # Excel's row limit, less the heading; longer exports continue on a new sheet
+
+FILE_TYPES = [("Excel files", "*.xlsx"), ("All files", "*")]
+
+
+class ExportCancelled(Exception):
+    """The user cancelled an export; nothing was written."""
+
+
+def write_xlsx(path, columns, rows, progress=None, cancel=None):
+    """Write a heading and rows to a write-only workbook at path and return the row count.
+
+    progress(count) is called every PROGRESS_ROWS rows and cancel (a threading.Event)
+    is checked as often, raising ExportCancelled. The workbook is saved next to path
+    and renamed into place, so a failed or cancelled export leaves no partial file.
+    Raises ImportError without openpyxl.
+    """
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = None
+    count = 0
+    partial = path + ".partial"
+    try:
+        try:
+            for row in rows:
+                if count % MAX_SHEET_ROWS == 0:
+                    sheet = workbook.create_sheet(f"Sheet{count // MAX_SHEET_ROWS + 1}")
+                    sheet.append(list(columns))
+                sheet.append(list(row))
+                count += 1
+                if count % PROGRESS_ROWS == 0:
+                    if cancel is not None and cancel.is_set():
+                        raise ExportCancelled()
+                    if progress is not None:
+                        progress(count)
+        finally:
+            if sheet is None:
+                workbook.create_sheet("Sheet1").append(list(columns))
+            # Saving is what closes the sheets and removes their temporary files, so a
+            # cancelled or failed export is still saved and then discarded
+            workbook.save(partial)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return count
+
+
+class ExportDialog(tk.Toplevel):
+    """Progress bar and Cancel button for one export running on a worker thread.
+
+    export(conn, progress, cancel) writes the file using the worker's connection,
+    calling progress(count) as it goes and raising ExportCancelled once cancel is
+    set, and returns the row count. total is the expected row count
+    (VirtualTable.query.total) and on_done(count) runs on the Tk thread after
+    the file has been written.
+    """
+
+    def __init__(self, parent, export, total, on_done=None, title="Saving Excel File"):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("360x130")
+        self.config(bg="white")
+        self.resizable(False, False)
+        self.transient(parent.winfo_toplevel())
+        self.protocol("WM_DELETE_WINDOW", self.cancel_export)
+        self.bind("<Destroy>", lambda event: self.cancel.set())  # e.g. the report window was closed
+
+        self.total = total
+        self.on_done = on_done
+        self.cancel = threading.Event()
+        self.count = 0  # Written by the worker, read by the Tk thread
+        self.result = None  # ("ok", count) or ("error", exception) once the worker has finished
+
+        self.label = tk.Label(self, text=f"Saving 0 of {total:,} rows...", bg="white")
+        self.label.pack(pady=(15, 5))
+        self.progress = ttk.Progressbar(self, length=320, mode="determinate", maximum=max(total, 1))
+        self.progress.pack(padx=20)
+        self.cancel_button = tk.Button(self, text="Cancel", command=self.cancel_export)
+        self.cancel_button.pack(pady=10)
+
+        self.thread = threading.Thread(target=self._run, args=(export,), name="export", daemon=True)
+        self.thread.start()
+        self.after(POLL_INTERVAL_MS, self._poll)
+
+    def _run(self, export):
+        # SQLite connections belong to the thread that opened them, so the worker reads with its own
+        try:
+            count = export(get_connection(), self._progress, self.cancel)
+            self.result = ("ok", count)
+        except Exception as e:
+            self.result = ("error", e)
+        finally:
+            close_connection()
+
+    def _progress(self, count):
+        self.count = count
+
+    def cancel_export(self):
+        self.cancel.set()
+        self.cancel_button.config(state="disabled")
+        self.label.config(text="Cancelling...")
+
+    def _poll(self):
+        if not self.winfo_exists():
+            return
+        if self.result is None:
+            if not self.cancel.is_set():
+                self.progress["value"] = self.count
+                self.label.config(text=f"Saving {self.count:,} of {self.total:,} rows...")
+            self.after(POLL_INTERVAL_MS, self._poll)
+            return
+
+        self.destroy()
+        status, value = self.result
+        if status == "ok":
+            if self.on_done is not None:
+                self.on_done(value)
+        elif isinstance(value, ImportError):
+            messagebox.showerror("Missing Library", f"{value.name} is required for this export.\nInstall it with: pip install {value.name}")
+        elif not isinstance(value, ExportCancelled):
+            messagebox.showerror("Error", f"Failed to save Excel file:\n{value}")
+
+
+def save_table(table, columns, path, on_done=None):
+    """Export every row of a VirtualTable, as displayed, to path in the background."""
+    def export(conn, progress, cancel):
+        return write_xlsx(path, columns, table.iter_values(conn), progress, cancel)
+
+    return ExportDialog(table, export, table.query.total, on_done)